@@ -0,0 +1,232 @@
+"""
+分块音频读写
+- AudioBlockReader: 按帧区间读取音频，WAV 走内存映射，其他格式用 torchaudio.io.StreamReader 顺序解码
+- WavStreamWriter: 增量写 16/24-bit PCM 或 32-bit float WAV（先写占位头，逐块追加，关闭时回填长度）
+长音频处理时内存只与块大小有关，与文件长度无关
+"""
+import os
+import struct
+
+import numpy as np
+from scipy.io import wavfile
+
+
+def _torchaudio():
+    """用到时才导入 torchaudio（会连带导入 torch，界面启动时不能触发）；未安装时返回 None"""
+    try:
+        import torchaudio
+    except ImportError:
+        return None
+    return torchaudio
+
+
+def pcm_to_float32(block):
+    """整型 PCM -> float32 [-1, 1)，与 torchaudio.load 的归一化一致（除以 2^(bits-1)）"""
+    if np.issubdtype(block.dtype, np.integer):
+        if block.dtype == np.uint8:
+            return (block.astype(np.float32) - 128.0) / 128.0
+        return block.astype(np.float32) / float(-np.iinfo(block.dtype).min)
+    return block.astype(np.float32, copy=False)
+
+
+def probe_duration(path):
+    """不解码音频读取时长（秒）；WAV 读文件头，其他格式需要 torchaudio.info，无法获取时返回 None"""
+    try:
+        if path.lower().endswith(".wav"):
+            sr, data = wavfile.read(path, mmap=True)
+            return len(data) / sr
+        torchaudio = _torchaudio()
+        if torchaudio is not None and hasattr(torchaudio, "info"):
+            info = torchaudio.info(path)
+            return info.num_frames / info.sample_rate
+    except (OSError, ValueError, RuntimeError):
+        pass
+    return None
+
+
+class _StreamDecoder:
+    """torchaudio.io.StreamReader 顺序解码非 WAV 文件：每个读取器只有一个解码器，从头往后解码，
+    保留上一次读取起点之后已解码的帧，相邻窗口的重叠部分不重新解码。
+    向回读到保留区间之前时重新打开文件从头解码（流式分离与逐块导入都只向前读）"""
+
+    def __init__(self, path, chunk_frames=1 << 16):
+        from torchaudio.io import StreamReader
+
+        self._open = lambda: StreamReader(path)
+        self._chunk_frames = chunk_frames
+        probe = self._open()
+        if probe.default_audio_stream is None:
+            raise ValueError(f"文件中没有音频流: {path}")
+        info = probe.get_src_stream_info(probe.default_audio_stream)
+        self.sr, self.channels = int(info.sample_rate), int(info.num_channels)
+        self.frames = int(info.num_frames)
+        if self.frames <= 0:
+            # 容器头里没有帧数（部分 MP3 / OGG）：先顺序解码一遍计数，不保留数据
+            self._restart()
+            self.frames = sum(len(chunk) for (chunk,) in self._chunks if chunk is not None)
+        self._restart()
+
+    def _restart(self):
+        reader = self._open()
+        reader.add_basic_audio_stream(self._chunk_frames, format="fltp")
+        self._chunks = reader.stream()
+        self._pos = 0  # 解码器下一个输出帧
+        self._kept = np.zeros((0, self.channels), dtype=np.float32)
+        self._kept_start = 0
+
+    def read(self, start, stop):
+        if start < self._kept_start:
+            self._restart()
+        parts = [self._kept[start - self._kept_start:]] if start < self._pos else []
+        while self._pos < stop:
+            chunks = next(self._chunks, None)
+            if chunks is None:
+                break
+            if chunks[0] is None:
+                continue
+            block = chunks[0].numpy()  # (frames, channels) float32
+            pos, self._pos = self._pos, self._pos + len(block)
+            if self._pos > start:
+                parts.append(block[max(0, start - pos):])
+        self._kept = np.concatenate(parts) if parts else np.zeros((0, self.channels), dtype=np.float32)
+        self._kept_start = start
+        return self._kept[:stop - start]
+
+
+class AudioBlockReader:
+    """按帧区间读取音频，返回 (frames, channels) float32；WAV 可随机读取，其他格式适合从前往后读"""
+
+    def __init__(self, path):
+        self.path = path
+        self._mmap = None
+        self._decoder = None
+        if path.lower().endswith(".wav"):
+            try:
+                self.sr, data = wavfile.read(path, mmap=True)
+                self._mmap = data if data.ndim == 2 else data[:, None]
+            except ValueError:
+                # 24-bit 等格式 scipy 不支持内存映射，改用 torchaudio
+                self._mmap = None
+
+        if self._mmap is not None:
+            self.frames, self.channels = self._mmap.shape
+            return
+        if _torchaudio() is None:
+            raise ValueError(f"未安装 torchaudio，只能读取 WAV 文件: {path}")
+        self._decoder = _StreamDecoder(path)
+        self.sr, self.frames, self.channels = self._decoder.sr, self._decoder.frames, self._decoder.channels
+
+    @property
+    def duration(self):
+        return self.frames / self.sr
+
+    def read(self, start, stop):
+        start = max(0, start)
+        stop = min(self.frames, stop)
+        if stop <= start:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        if self._mmap is not None:
+            return pcm_to_float32(np.asarray(self._mmap[start:stop]))
+        return self._decoder.read(start, stop)
+
+    def blocks(self, block_frames):
+        """顺序遍历整段音频，每次产出 (start, block)"""
+        for start in range(0, self.frames, block_frames):
+            yield start, self.read(start, start + block_frames)
+
+
+# 采样格式 -> (每样本字节数, WAV 格式码, 整型满幅值；浮点为 None)
+WAV_SAMPLE_FORMATS = {
+    "int16": (2, 1, 32767),
+    "int24": (3, 1, 8388607),
+    "float32": (4, 3, None),
+}
+
+
+def tpdf_dither(shape, rng):
+    """三角分布 (TPDF) 抖动，幅度 ±1 LSB（以 LSB 为单位）"""
+    return rng.random(shape, dtype=np.float32) - rng.random(shape, dtype=np.float32)
+
+
+class WavStreamWriter:
+    """增量写 WAV，write() 接收 [-1, 1] 的 float 块；整型格式可选 TPDF 抖动"""
+
+    def __init__(self, path, sr, channels, sample_format="int16", dither=False):
+        if sample_format not in WAV_SAMPLE_FORMATS:
+            raise ValueError(f"不支持的 WAV 采样格式: {sample_format}")
+        self.path = path
+        self.sr = sr
+        self.channels = channels
+        self.sample_format = sample_format
+        self.width, self._format_tag, self._full_scale = WAV_SAMPLE_FORMATS[sample_format]
+        self._rng = np.random.default_rng() if dither and self._full_scale else None
+        self.frames = 0
+        self._f = open(path, "wb")
+        self._write_header(0)
+
+    def _write_header(self, data_bytes):
+        block_align = self.channels * self.width
+        self._f.write(b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE")
+        self._f.write(b"fmt " + struct.pack("<IHHIIHH", 16, self._format_tag, self.channels, self.sr,
+                                            self.sr * block_align, block_align, self.width * 8))
+        self._f.write(b"data" + struct.pack("<I", data_bytes))
+
+    def _encode(self, block, scale):
+        if self._full_scale is None:
+            return (block * scale).astype("<f4")
+        full = self._full_scale
+        if self._rng is None:
+            # 与原先 (audio * 32767).astype(int16) 相同：向零截断
+            pcm = (block * (scale * full)).astype("<i4")
+        else:
+            x = block * (scale * full) + tpdf_dither(block.shape, self._rng)
+            pcm = np.clip(np.rint(x), -full - 1, full).astype("<i4")
+        if self.width == 2:
+            return pcm.astype("<i2")
+        # 24-bit：取每个小端 int32 的低 3 字节
+        return np.ascontiguousarray(pcm).view(np.uint8).reshape(-1, 4)[:, :3]
+
+    def write(self, block, scale=1.0):
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim == 1:
+            block = block[:, None]
+        self._f.write(self._encode(block, scale).tobytes())
+        self.frames += len(block)
+
+    def close(self):
+        if self._f is None:
+            return
+        self._f.seek(0)
+        self._write_header(self.frames * self.channels * self.width)
+        self._f.close()
+        self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def peak_abs(audio, block_frames=1 << 18):
+    """分块求绝对值峰值，不产生整段临时数组"""
+    peak = 0.0
+    for start in range(0, len(audio), block_frames):
+        block = audio[start:start + block_frames]
+        if len(block):
+            peak = max(peak, float(block.max()), -float(block.min()))
+    return peak
+
+
+def write_wav_chunked(audio, wav_path, sr, peak=None, block_frames=1 << 18, sample_format="int16", dither=False):
+    """把（可能是内存映射的）float 数组分块写成 WAV，不产生整段临时数组；
+    整型格式峰值超过 0.99 时整体压回（与 write_stem_wav 一致），float32 原样写出"""
+    scale = 1.0
+    if WAV_SAMPLE_FORMATS[sample_format][2] is not None:
+        if peak is None:
+            peak = peak_abs(audio, block_frames)
+        scale = 0.99 / peak if peak > 0.99 else 1.0
+    with WavStreamWriter(wav_path, sr, audio.shape[1] if audio.ndim > 1 else 1, sample_format, dither) as writer:
+        for start in range(0, len(audio), block_frames):
+            writer.write(audio[start:start + block_frames], scale)
+    return os.path.getsize(wav_path)
@@ -0,0 +1,316 @@
+"""
+命令行批处理 - 多进程分离农场
+每个工作进程常驻一个 SeparationEngine（各自的模型与 torch 线程预算），
+逐个文件分离并按 {base}_{stem}.wav 写出，最后打印吞吐统计。
+分轨在导出线程池上写盘，与下一个文件的推理重叠。
+--stems 2stems 时只输出人声 + 伴奏两轨，其余分轨不复制、不写盘。
+--batch-size 大于 1 时，每 batch_size 个文件为一组，组内各文件的分段拼成批次一起前向（见 segment_batching）。
+"""
+import concurrent.futures
+import glob
+import multiprocessing
+import os
+import time
+
+from inference_backends import DEFAULT_BACKEND
+from presets import DEFAULT_PRESET, estimate_seconds
+from separation_engine import (AUDIO_EXTENSIONS, DEFAULT_MODEL, DEFAULT_STEMS, STEM_ORDER,
+                               SeparationEngine, load_audio, stem_selection)
+from stem_cache import DEFAULT_MAX_BYTES, StemCache
+from stem_export import DEFAULT_EXPORT_FORMAT, StemExporter
+from tracing import TRACER, summary_line
+
+# 工作进程内的常驻引擎与导出线程池；流式模式下另有按窗口分离的 StreamingSeparator
+_ENGINE = None
+_STREAMER = None
+_EXPORTER = None
+_BATCH_SIZE = 1
+
+
+def is_stem_file(path):
+    """跳过已经是分轨结果的文件（{base}_vocals.wav 等），避免重复分离。
+    只有同目录下确实有对应的源文件 {base}.* 时才算分轨，
+    名字恰好以 _vocals / _bass 等结尾的普通音频照常处理。"""
+    folder, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    for suffix in STEM_ORDER:
+        base = stem[:-len(suffix) - 1]
+        if base and stem.endswith(f"_{suffix}") and any(
+                os.path.isfile(os.path.join(folder, base + ext)) for ext in AUDIO_EXTENSIONS):
+            return True
+    return False
+
+
+def expand_inputs(patterns, recursive=False):
+    """把目录 / 通配符 / 文件展开为去重后的音频文件列表"""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for root, _, names in os.walk(pattern):
+                    files.extend(os.path.join(root, n) for n in names)
+            else:
+                files.extend(os.path.join(pattern, n) for n in os.listdir(pattern))
+        else:
+            matches = glob.glob(pattern, recursive=recursive)
+            files.extend(matches if matches else [pattern])
+
+    seen = set()
+    result = []
+    for f in files:
+        key = os.path.abspath(f)
+        if key in seen or not f.lower().endswith(AUDIO_EXTENSIONS) or is_stem_file(f):
+            continue
+        if not os.path.isfile(f):
+            print(f"⚠ 文件不存在: {f}")
+            continue
+        seen.add(key)
+        result.append(f)
+    return sorted(result)
+
+
+def _init_worker(model_name, use_ai, threads, cache_dir=None, cache_bytes=None, stream_window=None,
+                 export_format=DEFAULT_EXPORT_FORMAT, dither=False, trace=False, preset=DEFAULT_PRESET,
+                 backend=DEFAULT_BACKEND, batch_size=1, stems=DEFAULT_STEMS):
+    """工作进程初始化：设定线程预算并常驻加载模型；各进程共享同一缓存目录"""
+    global _ENGINE, _STREAMER, _EXPORTER, _BATCH_SIZE
+    if trace:
+        TRACER.enable()  # 只在内存中收集，随结果回传给主进程写日志
+    if use_ai and threads:
+        try:
+            import torch
+            torch.set_num_interop_threads(1)
+        except (ImportError, RuntimeError):
+            pass
+    cache = StemCache(cache_dir, cache_bytes or DEFAULT_MAX_BYTES) if cache_dir else None
+    _ENGINE = SeparationEngine(model_name, use_ai=use_ai, num_threads=threads, cache=cache, preset=preset,
+                               backend=backend, stems=stems)
+    _EXPORTER = StemExporter(export_format, dither, log=None)
+    _BATCH_SIZE = batch_size
+    if _ENGINE.use_ai:
+        _ENGINE.inference_model()
+    if stream_window and _ENGINE.use_ai:
+        from streaming_separation import StreamingSeparator
+        _STREAMER = StreamingSeparator(_ENGINE, window_seconds=stream_window, log=lambda msg: None,
+                                       exporter=_EXPORTER)
+
+
+def _start_file(path):
+    """分离并把分轨提交给导出线程池，不等待写盘；返回 (结果摘要, 导出 Future 列表)"""
+    start = time.perf_counter()
+    try:
+        if _STREAMER is not None:
+            res = _STREAMER.separate_file(path)
+            return {"path": path, "ok": True, "seconds": time.perf_counter() - start,
+                    "audio_seconds": res["audio_seconds"], "outputs": res["outputs"],
+                    "cache_hit": res["cache_hit"]}, []
+        stems, sr = _ENGINE.separate_file(path)
+        audio_seconds = len(next(iter(stems.values()))) / sr
+        futures = _EXPORTER.export_stems(path, stems, sr)
+        return {"path": path, "ok": True, "seconds": time.perf_counter() - start,
+                "audio_seconds": audio_seconds, "cache_hit": _ENGINE.last_cache_hit}, futures
+    except Exception as e:
+        return {"path": path, "ok": False, "seconds": time.perf_counter() - start,
+                "audio_seconds": 0.0, "error": f"{type(e).__name__}: {e}"}, []
+
+
+def _start_group(paths):
+    """分段批处理：同组文件一起解码、跨文件拼批推理，分轨提交给导出线程池；
+    返回与 paths 对齐的 [(结果摘要, 导出 Future 列表)]。
+    各文件的推理混在同一批前向里，无法单独计时：组的耗时按音频时长分摊到各文件，结果标记 seconds_estimated"""
+    start = time.perf_counter()
+    started = [None] * len(paths)
+    items, loaded = [], []
+    for i, path in enumerate(paths):
+        try:
+            items.append(load_audio(path))
+            loaded.append(i)
+        except Exception as e:
+            started[i] = ({"path": path, "ok": False, "seconds": 0.0, "audio_seconds": 0.0,
+                           "error": f"{type(e).__name__}: {e}"}, [])
+    try:
+        with TRACER.span("group", files=len(items), batch_size=_BATCH_SIZE):
+            separated = _ENGINE.separate_many(items, _BATCH_SIZE) if items else []
+    except Exception as e:
+        for i in loaded:
+            started[i] = ({"path": paths[i], "ok": False, "seconds": 0.0, "audio_seconds": 0.0,
+                           "error": f"{type(e).__name__}: {e}"}, [])
+        return started
+    elapsed = time.perf_counter() - start
+    total = sum(len(data) / sr for data, sr in items) or 1.0
+    for i, (data, sr), (stems, out_sr), hit in zip(loaded, items, separated, _ENGINE.last_cache_hits):
+        audio_seconds = len(next(iter(stems.values()))) / out_sr
+        started[i] = ({"path": paths[i], "ok": True, "seconds": elapsed * (len(data) / sr) / total,
+                       "seconds_estimated": True, "audio_seconds": audio_seconds, "cache_hit": hit},
+                      _EXPORTER.export_stems(paths[i], stems, out_sr))
+    return started
+
+
+def _finish_file(result, futures):
+    """等待该文件的分轨写完；耗时只计入仍在等待的部分"""
+    start = time.perf_counter()
+    try:
+        if futures:
+            result["outputs"] = [f.result() for f in futures]
+    except Exception as e:
+        result.update(ok=False, error=f"导出失败: {type(e).__name__}: {e}")
+    result["seconds"] += time.perf_counter() - start
+    result["export_bytes_per_second"] = _EXPORTER.bytes_per_second()
+    return result
+
+
+def _process_file(path):
+    """在工作进程内分离单个文件，返回结果摘要（可跨进程传递）"""
+    result = _finish_file(*_start_file(path))
+    if TRACER.enabled:
+        result["trace"] = TRACER.drain()
+    return result
+
+
+def _process_group(paths):
+    """在工作进程内批量分离一组文件，返回与 paths 对齐的结果摘要"""
+    results = [_finish_file(*started) for started in _start_group(paths)]
+    if TRACER.enabled and results:
+        results[0]["trace"] = TRACER.drain()
+    return results
+
+
+def _fmt_duration(s):
+    m, sec = divmod(int(round(s)), 60)
+    h, m = divmod(m, 60)
+    return f"{h:d}:{m:02d}:{sec:02d}" if h else f"{m:d}:{sec:02d}"
+
+
+def _report_file(result, index, total):
+    name = os.path.basename(result["path"])
+    prefix = f"[{index:>{len(str(total))}}/{total}]"
+    if not result["ok"]:
+        print(f"{prefix} ✗ {name}  失败: {result['error']}")
+        return
+    rtf = result["seconds"] / result["audio_seconds"] if result["audio_seconds"] else 0.0
+    approx = "≈" if result.get("seconds_estimated") else ""  # 分组批处理：按组分摊的估计值
+    print(f"{prefix} ✓ {name}  音频 {_fmt_duration(result['audio_seconds'])}  "
+          f"用时 {approx}{result['seconds']:.1f}s  RTF {approx}{rtf:.3f}{'  [缓存命中]' if result.get('cache_hit') else ''}")
+
+
+def summarize(results, wall_seconds):
+    """汇总吞吐：文件/小时与实时率 (RTF = 处理耗时 / 音频时长，越小越快)"""
+    done = [r for r in results if r["ok"]]
+    audio_seconds = sum(r["audio_seconds"] for r in done)
+    return {
+        "files": len(results),
+        "succeeded": len(done),
+        "cache_hits": sum(1 for r in done if r.get("cache_hit")),
+        "failed": len(results) - len(done),
+        "wall_seconds": wall_seconds,
+        "audio_seconds": audio_seconds,
+        "files_per_hour": len(done) / wall_seconds * 3600 if wall_seconds > 0 else 0.0,
+        "realtime_factor": wall_seconds / audio_seconds if audio_seconds > 0 else 0.0,
+        "export_bytes_per_second": max((r.get("export_bytes_per_second", 0.0) for r in done), default=0.0),
+    }
+
+
+def _print_estimate(files, model_name, preset, workers):
+    """按 calibrate 保存的实时率估计总耗时（不计缓存命中）"""
+    from audio_io import probe_duration
+
+    durations = [d for d in map(probe_duration, files) if d is not None]
+    seconds = estimate_seconds(model_name, preset, sum(durations))
+    if seconds is None:
+        print(f"（预设 {preset} 尚未校准，运行 calibrate 后可预估耗时）")
+    elif durations:
+        known = "" if len(durations) == len(files) else f"，仅含 {len(durations)} 个可读取时长的文件"
+        print(f"预计耗时约 {_fmt_duration(seconds / workers)}（音频 {_fmt_duration(sum(durations))}{known}）")
+
+
+def run_batch(inputs, workers=1, threads=None, model_name=DEFAULT_MODEL, use_ai=True,
+              recursive=False, cache_dir=None, cache_bytes=None, stream_window=None,
+              export_format=DEFAULT_EXPORT_FORMAT, dither=False, preset=DEFAULT_PRESET, backend=DEFAULT_BACKEND,
+              batch_size=1, stems=DEFAULT_STEMS):
+    """批量分离入口，返回汇总字典；batch_size > 1 时启用跨文件分段批处理（流式 / 基础模式不适用）"""
+    selection = stem_selection(stems)
+    files = expand_inputs(inputs, recursive=recursive)
+    if not files:
+        print("未找到可分离的音频文件")
+        return summarize([], 0.0)
+
+    workers = max(1, min(workers, len(files)))
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"待处理 {len(files)} 个文件，{workers} 个工作进程 × {threads} 线程，"
+          f"模型 {model_name}{f'，预设 {preset}' if use_ai else ''}"
+          f"{'，分轨 ' + ', '.join(selection) if selection else ''}")
+    if use_ai:
+        _print_estimate(files, model_name, preset, workers)
+    batched = batch_size > 1 and use_ai and not stream_window
+    if batched:
+        print(f"分段批处理：每组 {batch_size} 个文件，每次前向 {batch_size} 个分段")
+
+    init_args = (model_name, use_ai, threads, cache_dir, cache_bytes, stream_window, export_format, dither,
+                 TRACER.enabled, preset, backend, batch_size, stems)
+    results = []
+    start = time.perf_counter()
+    if batched:
+        groups = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+        if workers == 1:
+            _init_worker(*init_args)
+            # 与逐文件模式相同的流水线：上一组的分轨写盘时，下一组已在推理
+            pending = []
+            for group in groups:
+                current = _start_group(group)
+                for started in pending:
+                    results.append(_finish_file(*started))
+                    _report_file(results[-1], len(results), len(files))
+                pending = current
+            for started in pending:
+                results.append(_finish_file(*started))
+                _report_file(results[-1], len(results), len(files))
+            _EXPORTER.shutdown()
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers, mp_context=ctx,
+                    initializer=_init_worker, initargs=init_args) as pool:
+                futures = [pool.submit(_process_group, group) for group in groups]
+                for future in concurrent.futures.as_completed(futures):
+                    for result in future.result():
+                        results.append(result)
+                        TRACER.extend(result.pop("trace", []))
+                        _report_file(result, len(results), len(files))
+    elif workers == 1:
+        _init_worker(*init_args)
+        # 流水线：上一个文件的分轨在后台写盘时，已开始分离下一个文件
+        pending = None
+        for path in files:
+            current = _start_file(path)
+            if pending is not None:
+                results.append(_finish_file(*pending))
+                _report_file(results[-1], len(results), len(files))
+            pending = current
+        results.append(_finish_file(*pending))
+        _report_file(results[-1], len(results), len(files))
+        _EXPORTER.shutdown()
+    else:
+        # spawn：每个进程独立初始化 torch，避免 fork 继承线程池状态
+        ctx = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=ctx,
+                initializer=_init_worker, initargs=init_args) as pool:
+            futures = [pool.submit(_process_file, path) for path in files]
+            for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                results.append(future.result())
+                TRACER.extend(results[-1].pop("trace", []))
+                _report_file(results[-1], i, len(files))
+    summary = summarize(results, time.perf_counter() - start)
+
+    print(f"完成 {summary['succeeded']}/{summary['files']} 个文件"
+          f"（失败 {summary['failed']}，缓存命中 {summary['cache_hits']}），"
+          f"总耗时 {_fmt_duration(summary['wall_seconds'])}，音频总长 {_fmt_duration(summary['audio_seconds'])}")
+    speed = 1 / summary["realtime_factor"] if summary["realtime_factor"] else 0.0
+    print(f"吞吐: {summary['files_per_hour']:.1f} 文件/小时，"
+          f"实时率 RTF {summary['realtime_factor']:.3f}（{speed:.1f}x 实时）")
+    if summary["export_bytes_per_second"]:
+        print(f"导出 ({export_format}{'，抖动' if dither else ''}): {summary['export_bytes_per_second'] / 1e6:.0f} MB/s（单个写线程）")
+    if TRACER.enabled:
+        print(f"各阶段: {summary_line(TRACER.events)}")
+    return summary
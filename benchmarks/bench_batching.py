@@ -0,0 +1,75 @@
+"""
+跨文件分段批处理基准：一批短文件逐个分离（apply_model，每次前向一个分段）
+与 SeparationEngine.separate_many（跨文件拼批）的吞吐对比，并核对每个文件与逐个处理结果的最大偏差。
+需要 torch + demucs；多次平移的偏移由 apply_model 随机抽取，偏差只在 draft（shifts=0）下有意义
+
+用法: python benchmarks/bench_batching.py [--files 16] [--seconds 8] [--batch-sizes 1 4 8 16]
+                                          [-q balanced] [--backend fp32] [-t 线程数]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from presets import DEFAULT_PRESET, PRESETS  # noqa: E402
+from separation_engine import DEFAULT_MODEL, SeparationEngine  # noqa: E402
+
+SR = 44100
+
+
+def make_items(count, seconds):
+    """长度略有不同的短文件（片头、采样一类），合成的和弦加噪声"""
+    rng = np.random.default_rng(0)
+    items = []
+    for i in range(count):
+        t = np.arange(int(seconds * SR * rng.uniform(0.6, 1.0))) / SR
+        tone = sum(np.sin(2 * np.pi * f * (1 + 0.05 * i) * t) for f in (110.0, 220.0, 660.0)) * 0.2
+        audio = tone[:, None] + rng.standard_normal((len(t), 2)) * 0.05
+        items.append((audio.astype(np.float32), SR))
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=8.0, help="每个文件的最大长度（秒）")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL)
+    parser.add_argument("-q", "--preset", default=DEFAULT_PRESET, choices=list(PRESETS))
+    parser.add_argument("--backend", default="fp32", help="推理后端（默认 fp32，避免 auto 先跑一致性检查）")
+    parser.add_argument("-t", "--threads", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    engine = SeparationEngine(args.model, num_threads=args.threads, preset=args.preset, backend=args.backend)
+    if not engine.use_ai:
+        print("需要 torch + demucs")
+        return 1
+    items = make_items(args.files, args.seconds)
+    audio_seconds = sum(len(d) / sr for d, sr in items)
+    engine.separate_demucs(*items[0])  # 预热：加载模型、准备后端
+
+    start = time.perf_counter()
+    reference = [engine.separate_demucs(data, sr)[0] for data, sr in items]
+    base = time.perf_counter() - start
+
+    print(f"{args.files} 个文件，共 {audio_seconds:.0f} 秒音频，预设 {args.preset}，后端 {engine.backend.name}，"
+          f"{engine.thread_count()} 线程")
+    print(f"{'方式':<12} {'耗时 s':>8} {'文件/小时':>10} {'RTF':>8} {'加速':>7} {'最大偏差':>10}")
+    print(f"{'逐个文件':<12} {base:>8.2f} {args.files / base * 3600:>10.0f} {base / audio_seconds:>8.4f} "
+          f"{1.0:>6.2f}x {0.0:>10.2e}")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        results = engine.separate_many(items, batch_size)
+        seconds = time.perf_counter() - start
+        max_abs = max(float(np.max(np.abs(stems[name] - ref[name])))
+                      for (stems, _), ref in zip(results, reference) for name in ref)
+        print(f"{f'批大小 {batch_size}':<12} {seconds:>8.2f} {args.files / seconds * 3600:>10.0f} "
+              f"{seconds / audio_seconds:>8.4f} {base / seconds:>6.2f}x {max_abs:>10.2e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+混音微基准：每个 2048 帧块的混音耗时随片段数量的变化
+对比原先逐片段遍历的 get_mixed_audio_chunk 与 MixEngine（区间索引 + 预分配环形缓冲）
+
+用法: python benchmarks/bench_mix.py [--clips 1 4 16 64 256] [--seconds 30]
+"""
+import argparse
+import os
+import sys
+import time
+import types
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mix_engine import MixEngine  # noqa: E402
+
+SR = 44100
+BLOCK = 2048
+
+
+def legacy_mix(clips, start_time, duration):
+    """原先的实现：每块新建缓冲、遍历全部片段、整块求峰值，再 astype + tobytes"""
+    sr = clips[0].sample_rate
+    num_samples = int(duration * sr)
+    mixed = np.zeros((num_samples, 2), dtype=np.float32)
+    start_sample_global = int(start_time * sr)
+    has_audio = False
+    for clip in clips:
+        if clip.muted or clip.audio_data is None: continue
+        clip_start_sample = int(clip.start_time * sr)
+        clip_end_sample = clip_start_sample + len(clip.audio_data)
+        overlap_start = max(start_sample_global, clip_start_sample)
+        overlap_end = min(start_sample_global + num_samples, clip_end_sample)
+        if overlap_start < overlap_end:
+            has_audio = True
+            buf_start = overlap_start - start_sample_global
+            buf_end = overlap_end - start_sample_global
+            audio_chunk = clip.audio_data[overlap_start - clip_start_sample:overlap_end - clip_start_sample]
+            if len(audio_chunk.shape) == 1:
+                mixed[buf_start:buf_end, 0] += audio_chunk
+                mixed[buf_start:buf_end, 1] += audio_chunk
+            else:
+                mixed[buf_start:buf_end] += audio_chunk
+    if has_audio:
+        peak = np.max(np.abs(mixed))
+        if peak > 1.0: mixed /= peak
+    return mixed.astype(np.float32).tobytes()
+
+
+def make_clips(count, seconds, timeline_seconds):
+    """在时间轴上随机摆放片段，约一半为单声道，模拟分轨 + 素材混排"""
+    rng = np.random.default_rng(0)
+    clips = []
+    for i in range(count):
+        frames = int(seconds * SR)
+        shape = (frames,) if i % 2 else (frames, 2)
+        audio = (rng.standard_normal(shape) * 0.1).astype(np.float32)
+        clips.append(types.SimpleNamespace(
+            audio_data=audio, sample_rate=SR, muted=False,
+            start_time=float(rng.uniform(0, max(timeline_seconds - seconds, 0)))))
+    return clips
+
+
+def time_blocks(fn, blocks):
+    start = time.perf_counter()
+    for b in blocks:
+        fn(b)
+    return (time.perf_counter() - start) / len(blocks) * 1e6
+
+
+def run(clip_counts, seconds, timeline_seconds, blocks=400):
+    rows = []
+    for count in clip_counts:
+        clips = make_clips(count, seconds, timeline_seconds)
+        engine = MixEngine(block_frames=BLOCK)
+        engine.rebuild(clips)
+        positions = np.linspace(0, timeline_seconds * SR - BLOCK, blocks).astype(int)
+        legacy = time_blocks(lambda p: legacy_mix(clips, p / SR, BLOCK / SR), positions)
+        fast = time_blocks(lambda p: engine.mix(clips, int(p), BLOCK), positions)
+        rows.append({"clips": count, "legacy_us": legacy, "engine_us": fast})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, nargs="+", default=[1, 4, 16, 64, 256])
+    parser.add_argument("--seconds", type=float, default=20.0, help="每个片段的长度（秒）")
+    parser.add_argument("--timeline", type=float, default=600.0, help="时间轴长度（秒）")
+    args = parser.parse_args(argv)
+
+    budget = BLOCK / SR * 1e6
+    print(f"块大小 {BLOCK} 帧 @ {SR} Hz，实时预算 {budget:.0f} µs/块")
+    print(f"{'片段数':>6} {'原实现 µs/块':>14} {'MixEngine µs/块':>16} {'加速':>7}")
+    for row in run(args.clips, args.seconds, args.timeline):
+        print(f"{row['clips']:>6} {row['legacy_us']:>14.1f} {row['engine_us']:>16.1f} "
+              f"{row['legacy_us'] / row['engine_us']:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
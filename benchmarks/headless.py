@@ -0,0 +1,140 @@
+"""
+无声卡、无显示器环境下运行主程序代码的替身
+- pyaudio：不打开任何设备的假模块，流由调用方手动驱动回调（pump）
+- Tk 画布：只记录绘制调用的 RecordingCanvas；未安装 tkinter 时注册空壳模块
+- matplotlib 使用 Agg 后端离屏渲染
+"""
+import importlib.util
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class NullStream:
+    """假输出流：不启动线程，pump(n) 同步调用 n 次回调，送出的帧数只计数"""
+
+    def __init__(self, rate=44100, channels=2, frames_per_buffer=2048, stream_callback=None, start=True, **kw):
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = stream_callback
+        self.active = start
+        self.frames_out = 0
+
+    def pump(self, blocks):
+        """驱动回调 blocks 次，返回是否仍在播放"""
+        for _ in range(blocks):
+            data, flag = self.callback(None, self.frames_per_buffer, {}, 0)
+            self.frames_out += len(data) // (4 * self.channels)  # 回调返回 float32 PCM bytes
+            if flag == _pyaudio.paComplete:
+                self.active = False
+                break
+        return self.active
+
+    def start_stream(self):
+        self.active = True
+
+    def stop_stream(self):
+        self.active = False
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self.active = False
+
+
+class NullPyAudio:
+    def open(self, **kw):
+        return NullStream(**kw)
+
+    def terminate(self):
+        pass
+
+
+_pyaudio = types.ModuleType("pyaudio")
+_pyaudio.paFloat32, _pyaudio.paContinue, _pyaudio.paComplete, _pyaudio.paOutputUnderflow = 1, 0, 1, 4
+_pyaudio.PyAudio = NullPyAudio
+
+
+class RecordingCanvas:
+    """tk.Canvas 替身：create_* 返回递增的图元 id，并累计坐标点数；其余方法为空操作"""
+
+    def __init__(self):
+        self.items = 0
+        self.points = 0
+
+    def _create(self, *coords, **kw):
+        if len(coords) == 1 and isinstance(coords[0], (list, tuple)):
+            coords = coords[0]
+        self.items += 1
+        self.points += len(coords) // 2
+        return self.items
+
+    create_rectangle = create_polygon = create_line = create_text = create_oval = _create
+
+    def canvasx(self, x):
+        return x
+
+    def winfo_width(self):
+        return 1200
+
+    def __getattr__(self, name):
+        # tag_bind / delete / move / coords / itemconfig / tag_raise ...
+        return lambda *args, **kw: None
+
+
+class _TkStub(types.ModuleType):
+    """未安装 tkinter 时的空壳：任何属性都是可调用的空对象"""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return type(name, (), {"__init__": lambda self, *a, **kw: None,
+                               "__getattr__": lambda self, n: (lambda *a, **kw: None)})
+
+
+def _install_tk_stub():
+    try:
+        import tkinter  # noqa: F401
+        from tkinter import filedialog, messagebox, ttk  # noqa: F401
+        return False
+    except ImportError:
+        tk = _TkStub("tkinter")
+        for sub in ("filedialog", "messagebox", "ttk"):
+            mod = _TkStub(f"tkinter.{sub}")
+            setattr(tk, sub, mod)
+            sys.modules[mod.__name__] = mod
+        sys.modules["tkinter"] = tk
+        return True
+
+
+def install():
+    """注册替身；必须在导入主程序之前调用。返回 {"tk_stub": bool}"""
+    os.environ["MPLBACKEND"] = "Agg"
+    sys.modules["pyaudio"] = _pyaudio  # 即使装了真 PyAudio 也不碰声卡
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return {"tk_stub": _install_tk_stub()}
+
+
+def load_studio():
+    """以模块方式导入 separation-studio.py（文件名带连字符，不能直接 import）"""
+    if "separation_studio" in sys.modules:
+        return sys.modules["separation_studio"]
+    spec = importlib.util.spec_from_file_location("separation_studio", os.path.join(ROOT, "separation-studio.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def agg_figure(width=1200, height=200, dpi=100):
+    """离屏 Figure 与其 Agg 画布（代替 FigureCanvasTkAgg）"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    return fig, FigureCanvasAgg(fig)
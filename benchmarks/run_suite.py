@@ -0,0 +1,307 @@
+"""
+热点路径基准套件：混音、轨道总线、播放回调、离线混音导出、解码、基础分离、峰值计算与波形绘制
+用合成音频在无声卡、无显示器的环境下计时（替身见 headless.py），
+结果追加到 JSON 历史；任一指标比相同配置的历史基线慢过阈值时返回 1。
+
+用法: python benchmarks/run_suite.py [--seconds 60] [--channels 2] [--clips 4]
+                                     [--only mix draw] [--threshold 0.25] [--no-record]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import headless
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.json")
+BLOCK = 2048
+
+# 指标 -> 单位；全部越小越好
+METRICS = {
+    "mix.chunk_us": "µs/块",            # AudioPlayer.get_mixed_audio_chunk（含轨道总线）
+    "bus.block_us": "µs/块",            # TrackBus：6 条通道条的增益过渡 + 主总线限幅器
+    "playback.block_us": "µs/块",       # AudioPlayer._fill + 回调取块
+    "bounce.rtf": "RTF",                # offline_render.bounce（wav16，含峰值扫描）
+    "decode.wav_ms": "ms",              # _load_wav_file_as_float + 整段转换
+    "decode.load_audio_ms": "ms",       # separation_engine.load_audio
+    "decode.first_block_ms": "ms",      # 导入时打开 AudioBlockReader 并解码第一块（总览与试听可用）
+    "separate.basic_rtf": "RTF",        # SeparationEngine.separate_basic
+    "peaks.build_ms": "ms",             # PeakPyramid.build
+    "draw.waveform_ms": "ms",           # _draw_waveform + Agg 渲染
+    "draw.mini_waveform_us": "µs/片段",  # AudioClip._draw_mini_waveform
+    "draw.timeline_us": "µs/次",         # TimelineGrid.redraw：1 小时时间轴上滚动重绘
+}
+GROUPS = sorted({name.split(".")[0] for name in METRICS})
+# 绘图受 matplotlib 缓存影响抖动较大，放宽阈值
+THRESHOLDS = {"draw.waveform_ms": 0.5}
+
+
+def make_audio(seconds, channels, sr, seed=0):
+    """合成测试音频：几个正弦加噪声，(frames, channels) float32"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr), dtype=np.float32) / sr
+    tone = sum(np.sin(2 * np.pi * f * t) for f in (55.0, 440.0, 3520.0)) * np.float32(0.15)
+    audio = tone[:, None] + rng.standard_normal((len(t), channels)).astype(np.float32) * np.float32(0.05)
+    return audio.astype(np.float32)
+
+
+def timed(fn, repeat):
+    """运行 repeat 次，返回耗时中位数（秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+class Suite:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.sr = args.sr
+        self.studio = headless.load_studio()
+        self.audio = make_audio(args.seconds, args.channels, args.sr)
+        self.wav_path = os.path.join(workdir, "bench.wav")
+        from scipy.io import wavfile
+        wavfile.write(self.wav_path, args.sr, (self.audio * 32767).astype(np.int16))
+
+    def _app(self, clips):
+        """只带混音所需属性的界面替身"""
+        import types
+        end = max(c.start_time + c.duration for c in clips)
+        return types.SimpleNamespace(clips=clips, total_duration=end, root=None, playback_clips=lambda: clips)
+
+    def _clips(self):
+        from clip_audio import PagedAudio
+
+        canvas = headless.RecordingCanvas()
+        clips = []
+        for i in range(self.args.clips):
+            audio = PagedAudio(np.roll(self.audio, i * 997, axis=0), self.sr)
+            clip = self.studio.AudioClip(canvas, i % 4, len(audio) / self.sr, "#ffffff", f"clip{i}",
+                                         audio, self.sr, app=None)
+            clip.start_time = i * 0.5
+            clips.append(clip)
+        return clips
+
+    def bench_mix(self):
+        player = self.studio.AudioPlayer(self._app(self._clips()))
+        positions = np.linspace(0, self.args.seconds - BLOCK / self.sr, self.args.blocks)
+
+        def run():
+            for t in positions:
+                player.get_mixed_audio_chunk(t, BLOCK / self.sr)
+        return {"mix.chunk_us": timed(run, self.args.repeat) / len(positions) * 1e6}
+
+    def bench_bus(self):
+        from track_bus import TrackBus
+
+        bus = TrackBus([t["name"] for t in self.studio.TRACK_CONFIG], self.sr, BLOCK)
+        block = np.empty((BLOCK, 2), dtype=np.float32)
+        sources = [self.audio[i * BLOCK:(i + 1) * BLOCK] * np.float32(4.0) for i in range(self.args.blocks)]
+        sources = [np.ascontiguousarray(np.broadcast_to(s, (BLOCK, 2)) if s.shape[1] == 1 else s[:, :2])
+                   for s in sources if len(s) == BLOCK]
+
+        def run():
+            for i, src in enumerate(sources):
+                # 每块都改一条轨道的增益，始终走过渡分支；输入放大 4 倍，限幅器一直在工作
+                bus.strips[i % len(bus.strips)].gain_db = -(i % 7)
+                bus.block_gains(BLOCK)
+                block[:] = src
+                bus.limiter.process(block)
+        return {"bus.block_us": timed(run, self.args.repeat) / len(sources) * 1e6}
+
+    def bench_playback(self):
+        app = self._app(self._clips())
+        player = self.studio.AudioPlayer(app)
+        stream = player._device().open(rate=self.sr, frames_per_buffer=BLOCK, stream_callback=player._callback)
+        blocks = [0]
+
+        def run():
+            player._restart_at(0)
+            stream.frames_out = 0
+            # 和真实播放一样：生产者补满预缓冲，回调逐块取走，直到时间轴末尾
+            while True:
+                player._fill()
+                if not stream.pump(1) or stream.frames_out >= self.args.blocks * BLOCK:
+                    break
+            stream.active = True
+            blocks[0] = stream.frames_out // BLOCK
+        seconds = timed(run, self.args.repeat)
+        if player.underruns:
+            raise RuntimeError(f"基准播放出现 {player.underruns} 次欠载")
+        return {"playback.block_us": seconds / max(1, blocks[0]) * 1e6}
+
+    def bench_bounce(self):
+        from offline_render import bounce
+
+        clips = self._clips()
+        path = os.path.join(os.path.dirname(self.wav_path), "bounce.wav")
+        seconds = [0.0]
+
+        def run():
+            seconds[0] = bounce(clips, path, self.sr)["seconds"]
+        wall = timed(run, self.args.repeat)
+        return {"bounce.rtf": wall / seconds[0]}
+
+    def bench_decode(self):
+        from audio_io import AudioBlockReader
+        from separation_engine import load_audio
+
+        def wav():
+            _, audio = self.studio.ModernStudioApp._load_wav_file_as_float(None, self.wav_path)
+            audio[0:len(audio)]
+
+        def first_block():
+            reader = AudioBlockReader(self.wav_path)
+            next(reader.blocks(int(reader.sr * self.studio.DECODE_BLOCK_SECONDS)))
+        load_audio(self.wav_path)  # 预热：torchaudio 首次导入不计入
+        return {"decode.wav_ms": timed(wav, self.args.repeat) * 1e3,
+                "decode.load_audio_ms": timed(lambda: load_audio(self.wav_path), self.args.repeat) * 1e3,
+                "decode.first_block_ms": timed(first_block, self.args.repeat) * 1e3}
+
+    def bench_separate(self):
+        from separation_engine import SeparationEngine
+
+        engine = SeparationEngine(use_ai=False)
+        seconds = timed(lambda: engine.separate_basic(self.audio, self.sr), self.args.repeat)
+        return {"separate.basic_rtf": seconds / self.args.seconds}
+
+    def bench_peaks(self):
+        from waveform_peaks import PeakPyramid
+        return {"peaks.build_ms": timed(lambda: PeakPyramid.build(self.audio, self.sr), self.args.repeat) * 1e3}
+
+    def bench_draw(self):
+        from waveform_peaks import PeakPyramid
+
+        studio = self.studio
+        app = studio.ModernStudioApp.__new__(studio.ModernStudioApp)
+        app.fig, app.canvas_wave = headless.agg_figure()
+        app.ax = app.fig.add_subplot()
+        app.peaks = PeakPyramid.build(self.audio, self.sr)
+        app.duration, app.sample_rate = self.args.seconds, self.sr
+
+        def waveform():
+            app._draw_waveform()
+            app.canvas_wave.draw()
+        waveform()  # 预热字体与图元缓存
+        clips = self._clips()
+
+        def mini():
+            for clip in clips:
+                clip._draw_mini_waveform()
+
+        from timeline_view import TimelineGrid
+        canvas = headless.RecordingCanvas()
+        grid = TimelineGrid(canvas, canvas, len(studio.TRACK_CONFIG), studio.TRACK_HEIGHT,
+                            studio.RULER_HEIGHT, studio.COLORS)
+        hour = 3600.0
+        lefts = np.linspace(0, hour * studio.PX_PER_SEC - canvas.winfo_width(), 200)
+
+        def timeline():
+            for left in lefts:
+                grid.redraw(studio.PX_PER_SEC, hour, left, canvas.winfo_width())
+        return {"draw.waveform_ms": timed(waveform, self.args.repeat) * 1e3,
+                "draw.mini_waveform_us": timed(mini, self.args.repeat) / len(clips) * 1e6,
+                "draw.timeline_us": timed(timeline, self.args.repeat) / len(lefts) * 1e6}
+
+    def run(self, groups):
+        results = {}
+        for group in groups:
+            results.update(getattr(self, f"bench_{group}")())
+        return results
+
+
+def config_key(args):
+    """只有配置与环境都相同的历史记录才能互相比较"""
+    from separation_engine import AI_AVAILABLE
+    return {"seconds": args.seconds, "channels": args.channels, "clips": args.clips, "sr": args.sr,
+            "blocks": args.blocks, "machine": platform.node(), "cpus": os.cpu_count(),
+            "python": platform.python_version(), "numpy": np.__version__, "ai": AI_AVAILABLE}
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def baselines(history, config, runs):
+    """相同配置最近 runs 次记录的逐指标中位数"""
+    matching = [h["results"] for h in history if h["config"] == config][-runs:]
+    names = {name for r in matching for name in r}
+    return {name: statistics.median(r[name] for r in matching if name in r) for name in names}
+
+
+def compare(results, base, threshold):
+    """返回 [(指标, 当前值, 基线, 比值, 是否回归)]"""
+    rows = []
+    for name, value in results.items():
+        ref = base.get(name)
+        ratio = value / ref if ref else None
+        limit = 1 + THRESHOLDS.get(name, threshold)
+        rows.append((name, value, ref, ratio, ratio is not None and ratio > limit))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60.0, help="合成音频长度（秒）")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--clips", type=int, default=4, help="时间轴上的片段数")
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--blocks", type=int, default=400, help="混音 / 播放计时的块数")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取中位数")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, help="只运行这些分组")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON 历史文件")
+    parser.add_argument("--baseline-runs", type=int, default=5, help="基线取最近几次记录的中位数")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许变慢的比例（0.25 = 25%%）")
+    parser.add_argument("--no-record", action="store_true", help="只比较，不写入历史")
+    args = parser.parse_args(argv)
+
+    stubs = headless.install()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = Suite(args, workdir).run(args.only or GROUPS)
+
+    config = config_key(args)
+    history = load_history(args.history)
+    rows = compare(results, baselines(history, config, args.baseline_runs), args.threshold)
+
+    print(f"{args.seconds:.0f} 秒 × {args.channels} 声道 @ {args.sr} Hz，{args.clips} 个片段"
+          f"{'，Tk 替身' if stubs['tk_stub'] else ''}")
+    print(f"{'指标':<24} {'当前':>12} {'基线':>12} {'比值':>7}  单位")
+    for name, value, ref, ratio, regressed in rows:
+        ref_text = f"{ref:.4g}" if ref is not None else "-"
+        ratio_text = f"{ratio:.2f}" if ratio is not None else "-"
+        print(f"{name:<24} {value:>12.4g} {ref_text:>12} {ratio_text:>7}  {METRICS[name]}"
+              f"{'  ← 回归' if regressed else ''}")
+
+    if not args.no_record:
+        history.append({"time": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "config": config, "results": results})
+        save_history(args.history, history)
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"性能回归: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+片段音频缓冲 - 内存映射、按需分页
+分轨不再整段读入内存：WAV 直接映射 data chunk，缓存中的 .npy 映射为 float32。
+切片时只读取涉及的帧，并统一转换为 float32 双声道，
+因此播放混音、迷你波形绘制与导出都只会分页载入实际访问到的部分。
+片段编辑（切分、裁剪、复制、滑移）通过 ClipView 引用同一缓冲，不复制音频。
+"""
+import threading
+
+import numpy as np
+from scipy.io import wavfile
+
+
+class PagedAudio:
+    """只读音频缓冲，支持 len() 与切片；切片结果总是 (frames, 2) float32"""
+
+    ndim = 2
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, data, sr, scale=None, path=None):
+        self._data = data if data.ndim == 2 else data[:, None]
+        self.sample_rate = sr
+        # 映射的源文件（波形峰值缓存写在它旁边）
+        self.path = path or getattr(data, "filename", None)
+        if scale is None:
+            # 与 _load_wav_file_as_float 的归一化保持一致
+            scale = 1.0 / float(np.iinfo(data.dtype).max) if np.issubdtype(data.dtype, np.integer) else 1.0
+        self.scale = scale
+
+    @classmethod
+    def open_wav(cls, path):
+        """映射 WAV 的 data chunk；scipy 无法映射的格式（如 24-bit）退化为整段读取"""
+        try:
+            sr, data = wavfile.read(path, mmap=True)
+        except ValueError:
+            sr, data = wavfile.read(path)
+        return cls(data, sr, path=path)
+
+    @classmethod
+    def open_npy(cls, path, sr):
+        return cls(np.load(path, mmap_mode="r"), sr, path=path)
+
+    @property
+    def frames(self):
+        return self._data.shape[0]
+
+    @property
+    def channels(self):
+        return self._data.shape[1]
+
+    @property
+    def shape(self):
+        return (self.frames, 2)
+
+    @property
+    def is_mapped(self):
+        return isinstance(self._data, np.memmap) or isinstance(getattr(self._data, "base", None), np.memmap)
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._convert(self._data[key])
+        if isinstance(key, tuple):
+            return self[key[0]][(slice(None),) + key[1:]]
+        return self._convert(self._data[key:key + 1])[0]
+
+    def read(self, start, stop):
+        return self[max(0, start):max(0, stop)]
+
+    def read_into(self, start, stop, out):
+        """把 [start, stop) 转换后写入调用方预分配的 (stop - start, 2) float32 缓冲"""
+        return self._convert(self._data[start:stop], out)
+
+    def _convert(self, block, out=None):
+        """只对访问到的帧做类型转换与声道扩展"""
+        if out is None:
+            out = np.empty((block.shape[0], 2), dtype=np.float32)
+        if block.shape[1] == 1:
+            np.multiply(block[:, 0], self.scale, out=out[:, 0], casting="unsafe")
+            out[:, 1] = out[:, 0]
+        else:
+            np.multiply(block[:, :2], self.scale, out=out, casting="unsafe")
+        return out
+
+    def to_array(self):
+        return self[:]
+
+    def stereo_array(self):
+        """未映射的缓冲整段规整为 C 连续的 (frames, 2) float32，底层已是这种布局时不复制；
+        映射的缓冲返回 None（仍按需分页转换）"""
+        if self.is_mapped:
+            return None
+        data = self._data
+        if self.scale == 1.0 and data.dtype == np.float32 and data.shape[1] == 2 and data.flags.c_contiguous:
+            return data
+        return self[:]
+
+
+class LazyAudio(PagedAudio):
+    """帧数与采样率已知、第一次读取时才打开文件的缓冲。
+    重新打开工程时用它代替 PagedAudio：时间轴只靠缓存的峰值绘制，播放或导出真正读到时才映射分轨"""
+
+    def __init__(self, path, frames, sr):
+        self.path = path
+        self.sample_rate = sr
+        self._frames = frames
+        self._audio = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open_path(cls, path, sr):
+        """按扩展名映射：.npy 为缓存 / 工程内的 float32 分轨，其余按 WAV 处理"""
+        if path.endswith(".npy"):
+            return PagedAudio.open_npy(path, sr)
+        return PagedAudio.open_wav(path)
+
+    def _open(self):
+        if self._audio is None:
+            with self._lock:
+                if self._audio is None:
+                    audio = self.open_path(self.path, self.sample_rate)
+                    if audio.frames != self._frames:
+                        raise ValueError(f"分轨长度与工程记录不一致: {self.path}")
+                    self._audio = audio
+        return self._audio
+
+    @property
+    def loaded(self):
+        return self._audio is not None
+
+    def stereo_array(self):
+        return None  # 不为混音提前打开文件
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def channels(self):
+        return self._open().channels
+
+    @property
+    def _data(self):
+        return self._open()._data
+
+    @property
+    def scale(self):
+        return self._open().scale
+
+
+class ClipView:
+    """片段对共享只读缓冲的引用 (buffer, offset, length, gain)。
+    切分、裁剪、复制与滑移只产生新的视图，不复制音频；同一缓冲复制多少次都只占一份内存。
+    支持 len() 与切片，切片结果为已乘增益的 (frames, 2) float32"""
+
+    ndim = 2
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, buffer, offset=0, length=None, gain=1.0, sr=None):
+        if isinstance(buffer, ClipView):
+            # 视图的视图直接指向底层缓冲，不形成引用链
+            offset += buffer.offset
+            gain *= buffer.gain
+            buffer = buffer.buffer
+        elif not isinstance(buffer, PagedAudio):
+            buffer = PagedAudio(np.asarray(buffer), sr)
+        self.buffer = buffer
+        self.offset = max(0, min(int(offset), buffer.frames))
+        avail = buffer.frames - self.offset
+        self.length = avail if length is None else max(0, min(int(length), avail))
+        self.gain = float(gain)
+
+    @property
+    def sample_rate(self):
+        return self.buffer.sample_rate
+
+    @property
+    def frames(self):
+        return self.length
+
+    @property
+    def channels(self):
+        return 2
+
+    @property
+    def shape(self):
+        return (self.length, 2)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            block = self.read(start, max(start, stop))
+            return block if step == 1 else block[::step]
+        if isinstance(key, tuple):
+            return self[key[0]][(slice(None),) + key[1:]]
+        if key < 0:
+            key += self.length
+        return self.read(key, key + 1)[0]
+
+    def read(self, start, stop):
+        start, stop = max(0, start), min(self.length, max(0, stop))
+        block = self.buffer.read(self.offset + start, self.offset + max(start, stop))
+        if self.gain != 1.0:
+            np.multiply(block, self.gain, out=block)
+        return block
+
+    def read_into(self, start, stop, out):
+        """与 PagedAudio.read_into 相同，额外乘上片段增益"""
+        out = self.buffer.read_into(self.offset + start, self.offset + stop, out)
+        if self.gain != 1.0:
+            np.multiply(out, self.gain, out=out)
+        return out
+
+    def to_array(self):
+        return self[:]
+
+    # --- 非破坏编辑：都返回新视图，原视图不变 ---
+    def split(self, frame):
+        """在相对帧 frame 处一分为二"""
+        frame = max(0, min(int(frame), self.length))
+        return (ClipView(self.buffer, self.offset, frame, self.gain),
+                ClipView(self.buffer, self.offset + frame, self.length - frame, self.gain))
+
+    def trim(self, start, stop):
+        """只保留相对帧区间 [start, stop)"""
+        start = max(0, min(int(start), self.length))
+        stop = max(start, min(int(stop), self.length))
+        return ClipView(self.buffer, self.offset + start, stop - start, self.gain)
+
+    def slip(self, frames):
+        """长度不变，窗口在底层缓冲中平移 frames 帧（超出缓冲的部分被截住）"""
+        offset = max(0, min(self.offset + int(frames), self.buffer.frames - self.length))
+        return ClipView(self.buffer, offset, self.length, self.gain)
+
+    def with_gain(self, gain):
+        return ClipView(self.buffer, self.offset, self.length, gain)
+
+    def duplicate(self):
+        return ClipView(self.buffer, self.offset, self.length, self.gain)
@@ -0,0 +1,80 @@
+"""
+Linkwitz-Riley 分频滤波器组 - 基础（无 AI）分离
+- 每个分频点用 LR4（两级相同的 2 阶 Butterworth 串联）的二阶节 (SOS) 低通，float32 计算
+- 减法树：低频 = LP1(x)，余量 r = x - 低频，中频 = LP2(r)，高频 = r - 中频，
+  各频段相加严格还原输入（仅有 float32 舍入误差）
+- 一次分块遍历产出全部频段，滤波状态在块之间延续；各声道在线程池中并行
+  （scipy 的 sosfilt 计算时释放 GIL）
+"""
+import concurrent.futures
+import os
+import time
+
+import numpy as np
+
+DEFAULT_CROSSOVERS = (200.0, 2000.0)
+DEFAULT_BANDS = ("bass", "drums", "vocals")
+DEFAULT_BLOCK_FRAMES = 1 << 16
+
+
+def linkwitz_riley_lowpass(cutoff, sr, order=4):
+    """LR(order) 低通的 float32 SOS 系数；order 必须为偶数"""
+    from scipy.signal import butter
+
+    if order % 2:
+        raise ValueError("Linkwitz-Riley 阶数必须为偶数")
+    sos = butter(order // 2, cutoff, btype="low", fs=sr, output="sos")
+    return np.vstack([sos, sos]).astype(np.float32)
+
+
+class CrossoverFilterbank:
+    """把音频分成 len(crossovers) + 1 个频段，频段之和等于输入"""
+
+    def __init__(self, sr, crossovers=DEFAULT_CROSSOVERS, order=4, block_frames=DEFAULT_BLOCK_FRAMES, workers=None):
+        self.sr = sr
+        self.crossovers = tuple(sorted(crossovers))
+        self.order = order
+        self.block_frames = block_frames
+        self.workers = workers or min(2, os.cpu_count() or 1)
+        self.sos = [linkwitz_riley_lowpass(fc, sr, order) for fc in self.crossovers]
+        self.last_seconds = 0.0
+        self.last_rtf = 0.0
+
+    def _split_channel(self, x, outs):
+        """单声道分块滤波，逐块写入 outs（每个频段一个一维数组）"""
+        from scipy.signal import sosfilt
+
+        zi = [np.zeros((len(sos), 2), dtype=np.float32) for sos in self.sos]
+        for start in range(0, len(x), self.block_frames):
+            stop = min(start + self.block_frames, len(x))
+            rest = np.asarray(x[start:stop], dtype=np.float32)
+            for k, sos in enumerate(self.sos):
+                band, zi[k] = sosfilt(sos, rest, zi=zi[k])
+                outs[k][start:stop] = band
+                rest = rest - band
+            outs[-1][start:stop] = rest
+
+    def split(self, audio):
+        """audio: (frames, channels)；返回 len(crossovers) + 1 个 (frames, channels) float32 频段，低频在前"""
+        audio = audio if audio.ndim == 2 else audio[:, None]
+        frames, channels = audio.shape
+        # 按声道连续存放，滤波时每个声道是一段连续内存
+        bands = np.empty((len(self.sos) + 1, channels, frames), dtype=np.float32)
+        start = time.perf_counter()
+        jobs = [(audio[:, c], [bands[k, c] for k in range(len(bands))]) for c in range(channels)]
+        if self.workers > 1 and channels > 1:
+            with concurrent.futures.ThreadPoolExecutor(min(self.workers, channels)) as pool:
+                list(pool.map(lambda job: self._split_channel(*job), jobs))
+        else:
+            for job in jobs:
+                self._split_channel(*job)
+        self.last_seconds = time.perf_counter() - start
+        self.last_rtf = self.last_seconds / (frames / self.sr) if frames else 0.0
+        return [band.T for band in bands]
+
+
+def split_bands(audio, sr, crossovers=DEFAULT_CROSSOVERS, names=DEFAULT_BANDS, order=4):
+    """便捷接口：返回 ({name: band}, 实时率)"""
+    bank = CrossoverFilterbank(sr, crossovers, order)
+    bands = bank.split(audio)
+    return dict(zip(names, bands)), bank.last_rtf
@@ -0,0 +1,288 @@
+"""
+CPU 推理后端
+在不改动 apply_model 分段 / 平移逻辑的前提下替换实际执行模型的方式：
+- fp32：原样 eager 执行
+- int8：动态量化 Linear / LSTM（权重 int8，激活运行时量化）
+- bf16：CPU bfloat16 自动混合精度，仅在支持 avx512_bf16 / amx_bf16 的 CPU 上启用
+- jit：按模型分段长度 trace 成 TorchScript，首次导出后缓存到磁盘
+
+backends 命令在一段测试音频上逐个运行可用后端，与 fp32 输出对比最大偏差（一致性检查），
+在偏差不超过容差的后端中选最快的，并按模型 / torch 版本 / CPU 记住选择；
+auto 只读取这个选择，没有记录时用 fp32，分离时从不自动运行检查。
+各后端的结果分别缓存（缓存键含后端名），int8 等的输出不会顶替 fp32 的结果。
+"""
+import contextlib
+import copy
+import datetime
+import functools
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+import warnings
+
+import numpy as np
+
+BACKENDS = ("fp32", "int8", "bf16", "jit")
+DEFAULT_BACKEND = "auto"
+DEFAULT_TOLERANCE = 2e-2  # 归一化输出上的最大绝对偏差
+_STATE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "separation-studio")
+DEFAULT_JIT_DIR = os.path.join(_STATE_DIR, "jit")
+DEFAULT_CHOICE_PATH = os.path.join(_STATE_DIR, "backends.json")
+
+
+def _torch():
+    import torch
+    return torch
+
+
+def cpu_supports_bf16():
+    """CPU 是否有原生 bf16 指令（没有时 autocast 是软件模拟，反而更慢）"""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/cpuinfo", encoding="utf-8") as f:
+                flags = f.read()
+        except OSError:
+            return False
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+    return platform.machine() == "arm64" and sys.platform == "darwin"
+
+
+def _sub_models(model):
+    return list(model.models) if hasattr(model, "models") else [model]
+
+
+def _map_models(model, fn):
+    """对模型（或 BagOfModels 中的每个子模型）应用 fn，不修改原模型；子模型之外的部分共享"""
+    if not hasattr(model, "models"):
+        return fn(model)
+    bag = copy.copy(model)
+    bag._modules = dict(model._modules)
+    bag.models = _torch().nn.ModuleList([fn(m) for m in model.models])
+    return bag
+
+
+def _segment_frames(sub):
+    n = int(float(sub.segment) * sub.samplerate)
+    return sub.valid_length(n) if hasattr(sub, "valid_length") else n
+
+
+class InferenceBackend:
+    """fp32 eager；子类改写 prepare()（转换模型）或 context()（包住推理调用）"""
+
+    name = "fp32"
+
+    @classmethod
+    def available(cls):
+        """返回 (是否可用, 不可用原因)"""
+        return True, ""
+
+    def prepare(self, model):
+        return model
+
+    def context(self):
+        return contextlib.nullcontext()
+
+
+class Int8Backend(InferenceBackend):
+    name = "int8"
+
+    @classmethod
+    def available(cls):
+        engines = _torch().backends.quantized.supported_engines
+        ok = any(e in engines for e in ("x86", "fbgemm", "qnnpack"))
+        return ok, "" if ok else "torch 未编译量化引擎"
+
+    def prepare(self, model):
+        torch = _torch()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # torch.ao 的迁移提示
+            return _map_models(model, lambda m: torch.ao.quantization.quantize_dynamic(
+                m, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8))
+
+
+class Bf16Backend(InferenceBackend):
+    name = "bf16"
+
+    @classmethod
+    def available(cls):
+        ok = cpu_supports_bf16()
+        return ok, "" if ok else "CPU 不支持 bf16 指令"
+
+    def context(self):
+        torch = _torch()
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+
+
+@functools.lru_cache(maxsize=None)
+def _traced_model_class():
+    """torch 按需导入，nn.Module 子类在第一次用到时才定义"""
+    torch = _torch()
+
+    class TracedModel(torch.nn.Module):
+        """包装 TorchScript 模块，保留 apply_model 需要的属性；输入长度与 trace 时不同则回退 eager"""
+
+        def __init__(self, eager, traced, frames):
+            super().__init__()
+            self.traced = traced
+            self.__dict__["_eager"] = eager  # 不注册为子模块，参数只算一份
+            self.frames = frames
+            for attr in ("samplerate", "sources", "segment", "audio_channels"):
+                setattr(self, attr, getattr(eager, attr))
+
+        def valid_length(self, length):
+            return self._eager.valid_length(length) if hasattr(self._eager, "valid_length") else length
+
+        def forward(self, mix):
+            if mix.shape[0] == 1 and mix.shape[-1] == self.frames:
+                return self.traced(mix)
+            return self._eager(mix)
+
+    return TracedModel
+
+
+class JitBackend(InferenceBackend):
+    name = "jit"
+
+    def __init__(self, cache_dir=DEFAULT_JIT_DIR):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def available(cls):
+        return hasattr(_torch(), "jit"), ""
+
+    def _cache_path(self, sub, frames):
+        """按模型结构与权重摘要命名；只取每个张量开头的一段，避免对整份权重求哈希"""
+        torch = _torch()
+        h = hashlib.sha1(f"{type(sub).__name__}|{frames}|{torch.__version__}".encode())
+        for name, t in sub.state_dict().items():
+            h.update(f"{name}{tuple(t.shape)}".encode())
+            h.update(t.detach().reshape(-1)[:1024].cpu().numpy().tobytes())
+        return os.path.join(self.cache_dir, f"{h.hexdigest()[:20]}.pt")
+
+    def _trace(self, sub):
+        torch = _torch()
+        frames = _segment_frames(sub)
+        path = self._cache_path(sub, frames)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # trace 对形状相关分支的提示、jit 接口的弃用提示
+            if os.path.exists(path):
+                return _traced_model_class()(sub, torch.jit.load(path), frames)
+            with torch.no_grad():
+                traced = torch.jit.trace(sub, torch.zeros(1, sub.audio_channels, frames), check_trace=False)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            torch.jit.save(traced, tmp)
+            os.replace(tmp, path)
+        return _traced_model_class()(sub, traced, frames)
+
+    def prepare(self, model):
+        return _map_models(model, self._trace)
+
+
+_CLASSES = {cls.name: cls for cls in (InferenceBackend, Int8Backend, Bf16Backend, JitBackend)}
+
+
+def make_backend(name):
+    if name not in _CLASSES:
+        raise ValueError(f"未知推理后端: {name}（可选 auto, {', '.join(BACKENDS)}）")
+    return _CLASSES[name]()
+
+
+def available_backends():
+    """{name: (是否可用, 原因)}"""
+    return {name: _CLASSES[name].available() for name in BACKENDS}
+
+
+def _choice_key(model_name):
+    return f"{model_name}|torch {_torch().__version__}|{os.cpu_count()} cpu"
+
+
+def load_choices(path=DEFAULT_CHOICE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def stored_choice(model_name, path=DEFAULT_CHOICE_PATH):
+    """auto 之前为该模型选定的后端；没有记录时返回 None"""
+    entry = load_choices(path).get(_choice_key(model_name))
+    return entry["backend"] if entry else None
+
+
+def _probe_input(model, seconds):
+    sub = _sub_models(model)[0]
+    rng = np.random.default_rng(0)
+    frames = int(seconds * sub.samplerate)
+    return _torch().from_numpy(rng.standard_normal((1, sub.audio_channels, frames)).astype(np.float32))
+
+
+def _run(model, backend, mix):
+    from demucs.apply import apply_model
+
+    torch = _torch()
+    with torch.no_grad(), backend.context():
+        return apply_model(model, mix, shifts=0, split=True).float()
+
+
+def parity_check(model, names=None, seconds=8.0, tolerance=DEFAULT_TOLERANCE, log=print):
+    """在同一段测试输入上运行各后端，返回 [{"backend", "seconds", "speedup", "max_abs", "ok", "error"}]；
+    每个后端先预热一次（含 jit 导出），再计时第二次"""
+    mix = _probe_input(model, seconds)
+    fp32 = InferenceBackend()
+    _run(model, fp32, mix[..., :mix.shape[-1] // 4])
+    start = time.perf_counter()
+    reference = _run(model, fp32, mix)
+    base = time.perf_counter() - start
+    rows = [{"backend": "fp32", "seconds": base, "speedup": 1.0, "max_abs": 0.0, "ok": True, "error": ""}]
+    for name in names or BACKENDS[1:]:
+        ok, reason = _CLASSES[name].available()
+        if not ok:
+            rows.append({"backend": name, "seconds": None, "speedup": None, "max_abs": None, "ok": False,
+                         "error": reason})
+            continue
+        try:
+            backend = make_backend(name)
+            prepared = backend.prepare(model)
+            _run(prepared, backend, mix[..., :mix.shape[-1] // 4])
+            start = time.perf_counter()
+            out = _run(prepared, backend, mix)
+            seconds_taken = time.perf_counter() - start
+            max_abs = float((out - reference).abs().max())
+            rows.append({"backend": name, "seconds": seconds_taken, "speedup": base / seconds_taken,
+                         "max_abs": max_abs, "ok": max_abs <= tolerance, "error": ""})
+        except Exception as e:
+            rows.append({"backend": name, "seconds": None, "speedup": None, "max_abs": None, "ok": False,
+                         "error": f"{type(e).__name__}: {e}"})
+    if log:
+        log(f"{'后端':<6} {'耗时 s':>8} {'加速':>7} {'最大偏差':>10}  结果")
+        for r in rows:
+            if r["seconds"] is None:
+                log(f"{r['backend']:<6} {'-':>8} {'-':>7} {'-':>10}  不可用: {r['error']}")
+            else:
+                log(f"{r['backend']:<6} {r['seconds']:>8.2f} {r['speedup']:>6.2f}x {r['max_abs']:>10.2e}  "
+                    f"{'通过' if r['ok'] else '超出容差'}")
+    return rows
+
+
+def select_backend(model, model_name, seconds=8.0, tolerance=DEFAULT_TOLERANCE, min_speedup=1.05,
+                   path=DEFAULT_CHOICE_PATH, log=print):
+    """运行一致性检查，选出通过检查且最快的后端（至少快 min_speedup 倍，否则用 fp32）并记住"""
+    rows = parity_check(model, seconds=seconds, tolerance=tolerance, log=log)
+    passed = [r for r in rows if r["ok"] and r["speedup"] >= min_speedup]
+    choice = max(passed, key=lambda r: r["speedup"])["backend"] if passed else "fp32"
+    choices = load_choices(path)
+    choices[_choice_key(model_name)] = {"backend": choice, "tolerance": tolerance, "report": rows,
+                                        "time": datetime.datetime.now().isoformat(timespec="seconds")}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(choices, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    if log:
+        log(f"推理后端: {choice}（已记录到 {path}）")
+    return choice
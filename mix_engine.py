@@ -0,0 +1,155 @@
+"""
+实时混音引擎
+- 片段按起始帧排序建立区间索引，只在增删 / 移动 / 静音后重建，
+  每个块用二分查找定位可能重叠的片段，而不是遍历全部片段
+- 内存中的片段（包括 ClipView 底层未映射的缓冲）在建索引时一次性规整为 float32 双声道，
+  已是这种布局时直接引用不复制；内存映射 / 延迟打开的片段按需分页转换
+- 混音直接写入预分配的缓冲槽（播放时是 playback_buffer 的预缓冲槽），不再每块 astype 出新数组；
+  交给 PortAudio 的 bytes 只在回调取块时复制一次
+- ClipView 片段直接从其底层共享缓冲按 offset 读取并乘增益，切分 / 复制出的片段共用同一份规整结果
+- 只做求和：轨道增益 / 声像由调用方按块传入（见 track_bus.TrackBus），防爆音交给主总线限幅器
+"""
+import bisect
+import threading
+
+import numpy as np
+
+from clip_audio import ClipView, PagedAudio
+
+
+def to_stereo_float32(audio):
+    """把内存中的片段音频规整为 C 连续的 (frames, 2) float32；已符合时不复制"""
+    if audio.ndim == 1:
+        audio = np.column_stack((audio, audio))
+    elif audio.shape[1] == 1:
+        audio = np.repeat(audio, 2, axis=1)
+    elif audio.shape[1] > 2:
+        audio = audio[:, :2]
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+class MixEngine:
+    """按块混合时间轴上的片段"""
+
+    def __init__(self, block_frames=2048, slots=4):
+        self.block_frames = block_frames
+        self._ring = np.zeros((slots, block_frames, 2), dtype=np.float32)
+        self._scratch = np.empty((block_frames, 2), dtype=np.float32)
+        self._slot = 0
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._starts = []     # 已排序的起始帧
+        self._entries = []    # 与 _starts 对齐: (start, end, source, offset, gain, track)
+        self._max_len = 0
+        self._stereo = {}     # id(原始缓冲) -> (原始缓冲, 规整后的数组；按需分页时为 None)
+        self.sample_rate = 44100
+
+    def invalidate(self):
+        """片段增删、移动、静音后调用；下一个块混音前重建索引"""
+        self._dirty = True
+
+    def _source_for(self, audio, cache):
+        """内存中的缓冲返回规整后的 ndarray（按缓冲对象缓存，多个视图共用），映射的缓冲原样返回"""
+        key = id(audio)
+        hit = cache.get(key) or self._stereo.get(key)
+        if hit is None or hit[0] is not audio:
+            if isinstance(audio, np.ndarray):
+                hit = (audio, to_stereo_float32(audio))
+            elif isinstance(audio, PagedAudio):
+                hit = (audio, audio.stereo_array())
+            else:
+                hit = (audio, None)
+        cache[key] = hit
+        return audio if hit[1] is None else hit[1]
+
+    def rebuild(self, clips):
+        """重建区间索引（只包含未静音、有音频的片段）"""
+        clips = list(clips)
+        sr = clips[0].sample_rate if clips else 44100
+        cache = {}
+        entries = []
+        for clip in clips:
+            if clip.muted or clip.audio_data is None:
+                continue
+            audio, offset, gain, length = clip.audio_data, 0, 1.0, None
+            if isinstance(audio, ClipView):
+                # 视图只记录窗口与增益，混音时直接读底层缓冲
+                audio, offset, gain, length = audio.buffer, audio.offset, audio.gain, len(audio)
+            source = self._source_for(audio, cache)
+            if length is None:
+                length = len(source)
+            start = int(clip.start_time * sr)
+            entries.append((start, start + length, source, offset, gain, getattr(clip, "track_idx", 0)))
+        entries.sort(key=lambda e: e[0])
+        with self._lock:
+            self.sample_rate = sr
+            self._entries = entries
+            self._starts = [e[0] for e in entries]
+            self._max_len = max((e[1] - e[0] for e in entries), default=0)
+            self._stereo = cache  # 丢弃已移除片段的规整副本
+            self._dirty = False
+
+    @property
+    def end_frame(self):
+        """最后一个未静音片段的结束帧"""
+        return max((e[1] for e in self._entries), default=0)
+
+    def overlapping(self, start, end):
+        """返回与 [start, end) 重叠的索引项：起点落在 [start - 最长片段, end) 内的才可能重叠"""
+        lo = bisect.bisect_right(self._starts, start - self._max_len)
+        hi = bisect.bisect_left(self._starts, end)
+        return [e for e in self._entries[lo:hi] if e[1] > start]
+
+    def mix(self, clips, start_frame, frames=None, out=None, scratch=None, gains=None):
+        """混合 [start_frame, start_frame + frames) 并返回 (buffer, has_audio)。
+        buffer 是环形缓冲中的一个槽，在被再次轮到之前保持有效；
+        给出 out 时直接写入调用方的 (frames, 2) float32 缓冲（如播放预缓冲的槽）。
+        多个线程同时混音（离线渲染）时各自传入 out 与 scratch。
+        gains 按轨道给出本块增益：None 跳过该轨道，(2,) 为左右声道常数，(frames, 2) 为逐帧过渡"""
+        if self._dirty:
+            self.rebuild(clips)
+        frames = frames or (len(out) if out is not None else self.block_frames)
+        if scratch is not None:
+            buf = out[:frames]
+        elif out is not None:
+            buf = out[:frames]
+            scratch = self._scratch if frames <= self.block_frames else np.empty_like(buf)
+        elif frames <= self.block_frames:
+            buf = self._ring[self._slot, :frames]
+            self._slot = (self._slot + 1) % len(self._ring)
+            scratch = self._scratch
+        else:
+            buf = np.empty((frames, 2), dtype=np.float32)
+            scratch = np.empty_like(buf)
+        buf.fill(0.0)
+
+        end_frame = start_frame + frames
+        has_audio = False
+        with self._lock:
+            hits = self.overlapping(start_frame, end_frame)
+        for clip_start, clip_end, source, offset, gain, track in hits:
+            bus_gain = None
+            if gains is not None:
+                bus_gain = gains[min(track, len(gains) - 1)]
+                if bus_gain is None:
+                    continue  # 轨道静音或没有被独奏
+            a = max(start_frame, clip_start)
+            b = min(end_frame, clip_end)
+            dst = buf[a - start_frame:b - start_frame]
+            lo, hi = a - clip_start + offset, b - clip_start + offset
+            if isinstance(source, np.ndarray) and gain == 1.0 and bus_gain is None:
+                np.add(dst, source[lo:hi], out=dst)
+            else:
+                tmp = scratch[:b - a]
+                if isinstance(source, np.ndarray):
+                    np.multiply(source[lo:hi], gain, out=tmp)
+                else:
+                    source.read_into(lo, hi, tmp)
+                    if gain != 1.0:
+                        np.multiply(tmp, gain, out=tmp)
+                if bus_gain is not None:
+                    np.multiply(tmp, bus_gain if bus_gain.ndim == 1 else
+                                bus_gain[a - start_frame:b - start_frame], out=tmp)
+                np.add(dst, tmp, out=dst)
+            has_audio = True
+        return buf, has_audio
@@ -0,0 +1,156 @@
+"""
+离线混音导出（bounce）
+把多轨编辑器当前的片段排布（位置、静音、切分 / 裁剪后的视图）渲染成文件，不经过实时播放：
+- 混音复用 MixEngine 的区间索引，每块 RENDER_BLOCK_FRAMES 帧向量化相加
+- 渲染块在线程池上并行（numpy 的大块运算释放 GIL），写盘按顺序取块并预取后续块，
+  内存只与在途块数有关，与时间轴长度无关
+- 给出 TrackBus 时与实时播放走同一套图：通道条的增益 / 声像 / 独奏在并行混音时乘上，
+  主总线限幅器在写盘线程按顺序处理，并补偿前视延迟；输出不超过限幅器的 ceiling，不需要扫描峰值
+- 不经过总线时，整型格式先并行扫描整段混音的峰值，再以同一个增益写出。float32 原样写出
+- 结束后报告实时倍率（渲染的音频时长 / 耗时）
+"""
+import collections
+import concurrent.futures
+import os
+import threading
+import time
+
+import numpy as np
+
+from mix_engine import MixEngine
+from stem_export import DEFAULT_EXPORT_FORMAT, EXPORT_FORMATS, export_stem
+from tracing import TRACER
+
+RENDER_BLOCK_FRAMES = 1 << 16
+
+
+class ArrangementMix:
+    """时间轴混音的只读“数组”：支持 len() 与连续切片，切片时才渲染。
+    可以直接交给 stem_export.export_stem 分块写出；顺序读取时自动预取后面的块"""
+
+    ndim = 2
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, clips, sr, start=0, stop=None, block_frames=RENDER_BLOCK_FRAMES, workers=None, bus=None):
+        self.engine = MixEngine(block_frames=block_frames)
+        self.engine.rebuild(clips)  # 快照：渲染期间界面上的编辑不影响本次导出
+        self.gains, self.limiter = None, None
+        if bus is not None:
+            bus = bus.snapshot()
+            bus.set_sample_rate(sr)
+            self.gains, self.limiter = bus.static_gains(), bus.limiter
+        self.delay = self.limiter.delay if self.limiter is not None else 0
+        self.sample_rate = sr
+        self.start = max(0, int(start))
+        self.stop = self.engine.end_frame if stop is None else int(stop)
+        self.block_frames = block_frames
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.on_progress = None  # on_progress(fraction)：每交出一块调用一次
+        self._pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="bounce")
+        self._pending = collections.OrderedDict()  # (start, stop) -> Future，按时间顺序
+        self._local = threading.local()
+        self._next = None  # 限幅器已处理到的相对帧
+
+    def __len__(self):
+        return max(0, self.stop - self.start)
+
+    @property
+    def shape(self):
+        return (len(self), 2)
+
+    @property
+    def seconds(self):
+        return len(self) / self.sample_rate
+
+    def render(self, start, stop):
+        """渲染相对帧 [start, stop) 的限幅器输入（已提前 delay 帧）；每个线程使用自己的临时缓冲，可并发调用"""
+        out = np.empty((stop - start, 2), dtype=np.float32)
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None or len(scratch) < len(out):
+            scratch = self._local.scratch = np.empty((max(len(out), self.block_frames), 2), dtype=np.float32)
+        self.engine.mix(None, self.start + start + self.delay, len(out), out=out, scratch=scratch[:len(out)],
+                        gains=self.gains)
+        return out
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("ArrangementMix 只支持步长为 1 的切片")
+        start, stop, _ = key.indices(len(self))
+        stop = max(start, stop)
+        future = self._pending.pop((start, stop), None)
+        if future is None:
+            # 不是按顺序读取：作废预取，从这里重新开始
+            for f in self._pending.values():
+                f.cancel()
+            self._pending.clear()
+            future = self._pool.submit(self.render, start, stop)
+        self._prefetch(stop, stop - start)
+        block = future.result()
+        if self.limiter is not None:
+            if start != self._next:
+                # 从新位置开始：先送入前视长度的音频，之后的输出与 start 对齐
+                self.limiter.reset()
+                if self.delay:
+                    self.limiter.process(self.render(-self.delay, 0))
+            self.limiter.process(block)
+            self._next = stop
+        if self.on_progress is not None and len(self):
+            self.on_progress(stop / len(self))
+        return block
+
+    def _prefetch(self, pos, step):
+        """保持 workers 个后续块在途"""
+        if step <= 0:
+            return
+        last = next(reversed(self._pending))[1] if self._pending else pos
+        while len(self._pending) < self.workers and last < len(self):
+            nxt = min(last + step, len(self))
+            self._pending[(last, nxt)] = self._pool.submit(self.render, last, nxt)
+            last = nxt
+
+    def peak(self):
+        """整段混音（限幅器之前）的绝对值峰值；各块并行渲染，只保留每块的峰值"""
+        def block_peak(start):
+            block = self.render(start, min(start + self.block_frames, len(self)))
+            return max(float(block.max(initial=0.0)), -float(block.min(initial=0.0)))
+        return max(self._pool.map(block_peak, range(0, len(self), self.block_frames)), default=0.0)
+
+    def close(self):
+        for f in self._pending.values():
+            f.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def bounce(clips, path, sr, start_time=0.0, end_time=None, fmt=DEFAULT_EXPORT_FORMAT, dither=False,
+           workers=None, on_progress=None, bus=None):
+    """把片段排布的 [start_time, end_time) 渲染写入 path（end_time 默认为最后一个片段的结尾）。
+    bus 为 TrackBus 时经过通道条与主总线限幅器（使用调用时的参数）。
+    返回 {"path", "seconds", "wall", "realtime", "peak", "bytes"}；realtime 为实时倍率"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未知导出格式: {fmt}（可选 {', '.join(EXPORT_FORMATS)}）")
+    t0 = time.perf_counter()
+    stop = None if end_time is None else int(end_time * sr)
+    with ArrangementMix(clips, sr, int(start_time * sr), stop, workers=workers, bus=bus) as mix:
+        if not len(mix):
+            raise ValueError("时间轴上没有可导出的音频（片段全部静音或范围为空）")
+        peak = None
+        if mix.limiter is not None:
+            peak = mix.limiter.ceiling  # 限幅器保证的上限，整型格式按单位增益写出
+        elif EXPORT_FORMATS[fmt][1] != "float32":
+            # 整型格式需要整段的峰值来决定唯一的输出增益
+            with TRACER.span("scan", frames=len(mix)):
+                peak = mix.peak()
+        mix.on_progress = on_progress
+        with TRACER.span("export", path=path, format=fmt) as span:
+            size = export_stem(mix, path, sr, fmt, dither, peak=peak, block_frames=mix.block_frames)
+            span.set(bytes=size)
+    wall = time.perf_counter() - t0
+    return {"path": path, "seconds": mix.seconds, "wall": wall, "realtime": mix.seconds / max(wall, 1e-9),
+            "peak": peak, "bytes": size}
@@ -0,0 +1,66 @@
+"""
+播放预缓冲 - 单生产者 / 单消费者的块环形缓冲
+生产者（混音线程）只推进写计数，不加锁；消费者（PyAudio 回调）推进读计数。
+每个块记录其在时间轴上的起始帧与所属“代”：定位 / 暂停 / 停止时 flush() 让代数加一，
+并把读位置直接移到写位置，旧块立即让出槽位，生产者马上从新位置重新填充。
+pop() 在释放槽位之前把块复制成 bytes 交给 PortAudio，返回后生产者改写该槽不影响正在送出的数据。
+flush() 可能来自界面线程，与 pop() 之间用一把锁互斥（都只持有几微秒）；生产者正在写的块
+提交时仍带着旧代，会被 pop() 丢弃。
+"""
+import threading
+
+import numpy as np
+
+
+class BlockRingBuffer:
+    """预分配的 float32 块环形缓冲"""
+
+    def __init__(self, capacity, block_frames, channels=2):
+        self.capacity = capacity  # 最多缓冲的块数
+        self.block_frames = block_frames
+        self._blocks = np.zeros((capacity, block_frames, channels), dtype=np.float32)
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self._gens = np.zeros(capacity, dtype=np.int64)
+        self._write = 0  # 只由生产者修改
+        self._read = 0   # 由消费者和 flush() 在锁内修改
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    @property
+    def full(self):
+        return len(self) >= self.capacity
+
+    # --- 生产者 ---
+    def next_slot(self):
+        """返回下一个可写的块缓冲；缓冲已满时返回 None"""
+        if self.full:
+            return None
+        return self._blocks[self._write % self.capacity]
+
+    def commit(self, start_frame, generation):
+        i = self._write % self.capacity
+        self._frames[i] = start_frame
+        self._gens[i] = generation
+        self._write += 1  # 最后一步才发布，消费者看到时数据已写完
+
+    # --- 消费者 ---
+    def pop(self):
+        """取出下一个当前代的块，返回 (PCM bytes, start_frame)；没有可用块时返回 None"""
+        with self._lock:
+            while self._read < self._write:
+                i = self._read % self.capacity
+                if self._gens[i] == self.generation:
+                    item = self._blocks[i].tobytes(), int(self._frames[i])
+                    self._read += 1  # 复制完才让出槽位
+                    return item
+                self._read += 1
+        return None
+
+    def flush(self):
+        """作废已缓冲的块（任意线程调用）"""
+        with self._lock:
+            self.generation += 1
+            self._read = self._write
@@ -0,0 +1,99 @@
+"""
+速度 / 质量预设
+draft / standard / best 决定 apply_model 的 segment、overlap、shifts、split 与 torch 线程数。
+calibrate 在本机测量每个预设的实时率 (RTF = 处理耗时 / 音频时长) 并保存，
+开始分离前据此估计耗时。
+"""
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+
+# segment=None 使用模型自带的分段长度（htdemucs 不能超过训练时的分段）
+# shifts=0 不做随机平移（单遍、结果确定）；shifts=N 做 N 次平移取平均，耗时约 N 倍
+# threads=None 使用 torch 默认（全部核心），命令行 -t 优先
+PRESETS = {
+    "draft": {"segment": None, "overlap": 0.1, "shifts": 0, "split": True, "threads": None, "interop_threads": 1},
+    "standard": {"segment": None, "overlap": 0.25, "shifts": 1, "split": True, "threads": None, "interop_threads": 1},
+    "best": {"segment": None, "overlap": 0.5, "shifts": 2, "split": True, "threads": None, "interop_threads": 1},
+}
+PRESET_LABELS = {"draft": "草稿（最快）", "standard": "标准", "best": "最佳（最慢）"}
+DEFAULT_PRESET = "standard"
+DEFAULT_CALIBRATION_PATH = os.environ.get("SEPARATION_STUDIO_CALIBRATION") or os.path.join(
+    os.path.expanduser("~"), ".cache", "separation-studio", "calibration.json")
+
+
+def preset_params(name):
+    if name not in PRESETS:
+        raise ValueError(f"未知预设: {name}（可选 {', '.join(PRESETS)}）")
+    return PRESETS[name]
+
+
+def load_calibration(path=DEFAULT_CALIBRATION_PATH):
+    """{model: {preset: {"rtf", "threads", "audio_seconds", "time"}}}；没有校准结果时为空"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_calibration(results, path=DEFAULT_CALIBRATION_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def estimate_seconds(model_name, preset, audio_seconds, calibration=None):
+    """按校准的实时率估计分离耗时（秒）；该模型 / 预设未校准时返回 None"""
+    calibration = load_calibration() if calibration is None else calibration
+    entry = calibration.get(model_name, {}).get(preset)
+    return entry["rtf"] * audio_seconds if entry else None
+
+
+def _test_audio(seconds, sr):
+    """校准用音频：几个和弦音加噪声，避免全零输入走捷径"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr), dtype=np.float32) / sr
+    tone = sum(np.sin(2 * np.pi * f * t) for f in (82.4, 196.0, 440.0, 1318.5)) * np.float32(0.1)
+    return (tone[:, None] + rng.standard_normal((len(t), 2)).astype(np.float32) * np.float32(0.05)).astype(np.float32)
+
+
+def calibrate(model_name, presets=None, seconds=30.0, input_path=None, threads=None,
+              path=DEFAULT_CALIBRATION_PATH, log=print):
+    """在本机依次用各预设分离同一段音频，测量实时率并合并写入校准文件；返回 {preset: rtf}"""
+    from separation_engine import SeparationEngine, load_audio
+
+    engine = SeparationEngine(model_name, num_threads=threads)
+    if not engine.use_ai:
+        raise RuntimeError("模型库不可用，无法校准（基础分离没有预设）")
+    model = engine.load_model()
+    if input_path:
+        data, sr = load_audio(input_path)
+        data = data[:int(seconds * sr)]
+    else:
+        sr = model.samplerate
+        data = _test_audio(seconds, sr)
+    audio_seconds = len(data) / sr
+
+    engine.preset = "draft"
+    engine.separate_demucs(data[:sr * 2], sr)  # 预热：首次运行的内核初始化不计入
+    calibration = load_calibration(path)
+    measured = {}
+    for name in presets or list(PRESETS):
+        engine.preset = name
+        start = time.perf_counter()
+        engine.separate_demucs(data, sr)
+        rtf = (time.perf_counter() - start) / audio_seconds
+        measured[name] = rtf
+        calibration.setdefault(model_name, {})[name] = {
+            "rtf": rtf, "threads": engine.thread_count(), "audio_seconds": audio_seconds,
+            "time": datetime.datetime.now().isoformat(timespec="seconds")}
+        log(f"{name:<9} RTF {rtf:.3f}（{1 / rtf:.1f}x 实时）  3 分钟歌曲约 {rtf * 180:.0f}s")
+    save_calibration(calibration, path)
+    log(f"校准结果已保存: {path}")
+    return measured
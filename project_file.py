@@ -0,0 +1,220 @@
+"""
+工程文件 - 保存片段排布，重新打开时立即显示
+<名称>.ssproj         JSON：源音频、分轨引用（路径 + 大小 / 修改时间 + 内容 sha256）、片段排布、通道条参数
+<名称>.ssproj.assets/ 按内容命名的资源，只写一次：
+    peaks/<id>.npz          波形峰值金字塔（总览与每条分轨）
+    audio/<key>-<stem>.npy  来自分轨缓存的分轨：硬链接（跨文件系统时复制）进工程，
+                            缓存淘汰或换一台机器都不影响；缓存键本身就是内容哈希，不再重新哈希
+    audio/<sha>.npy         没有对应文件的分轨（如只在内存中的分离结果）
+打开工程时只读 JSON 与峰值，时间轴立即画出；分轨以 LazyAudio 引用，播放或导出读到时才映射。
+自动保存复用同一个 ProjectStore：已哈希的分轨、已写出的峰值不再处理，JSON 内容没变时不写盘。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from clip_audio import ClipView, LazyAudio
+from waveform_peaks import PeakPyramid
+
+PROJECT_EXT = ".ssproj"
+PROJECT_VERSION = 1
+_HASH_BLOCK = 1 << 20
+
+
+def assets_dir(project_path):
+    return project_path + ".assets"
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _link_or_copy(src, dst):
+    """硬链接到 dst（同一文件系统时不占额外空间），否则复制；先写临时名再原子改名"""
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _write_atomic(path, write):
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class ProjectStore:
+    """读写一个工程文件；同一实例多次 save() 时只写出新增的资源与变化的 JSON"""
+
+    def __init__(self, path, cache=None):
+        self.path = os.path.abspath(path)
+        self.assets = assets_dir(self.path)
+        self.cache = cache  # 可选 StemCache：识别映射自缓存的分轨
+        self._sources = {}  # id(缓冲) -> (缓冲, 源 id, 源条目)
+        self._last_json = None
+        self._lock = threading.Lock()
+
+    # --- 保存 ---
+    def _asset(self, kind, name):
+        folder = os.path.join(self.assets, kind)
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, name)
+
+    def _save_peaks(self, sha, peaks):
+        path = self._asset("peaks", f"{sha}.npz")
+        if peaks is not None and not os.path.exists(path):
+            peaks.save(path)
+        return os.path.relpath(path, os.path.dirname(self.path)) if peaks is not None else None
+
+    def _source_entry(self, buffer, peaks):
+        """分轨缓冲 -> (源 id, 源条目)；同一缓冲只处理一次（文件未变化时）"""
+        hit = self._sources.get(id(buffer))
+        if hit is not None and hit[0] is buffer:
+            entry = hit[2]
+            path = entry["path"]
+            if not os.path.isabs(path) or list(_stamp(path)) == [entry["size"], entry["mtime_ns"]]:
+                return hit[1], entry
+
+        path = getattr(buffer, "path", None)
+        cached = self.cache.locate(path) if self.cache is not None and path else None
+        if cached is not None:
+            # 缓存条目随时可能被淘汰：把分轨链接进工程，按缓存键命名
+            source_id = "-".join(cached)
+            target = self._asset("audio", f"{source_id}.npy")
+            if not os.path.exists(target):
+                _link_or_copy(path, target)
+            entry = {"path": os.path.relpath(target, os.path.dirname(self.path)), "cache_key": cached[0]}
+        elif path and os.path.isfile(path):
+            size, mtime_ns = _stamp(path)
+            source_id = file_sha256(path)
+            entry = {"path": os.path.abspath(path), "size": size, "mtime_ns": mtime_ns, "sha256": source_id}
+        else:
+            # 只在内存中的分轨：按内容哈希写进工程资源目录
+            audio = np.ascontiguousarray(buffer.to_array(), dtype=np.float32)
+            source_id = hashlib.sha256(memoryview(audio).cast("B")).hexdigest()
+            target = self._asset("audio", f"{source_id}.npy")
+            if not os.path.exists(target):
+                _write_atomic(target, lambda f: np.save(f, audio))
+            entry = {"path": os.path.relpath(target, os.path.dirname(self.path)), "sha256": source_id}
+        entry.update(frames=buffer.frames, sr=buffer.sample_rate, peaks=self._save_peaks(source_id, peaks))
+        self._sources[id(buffer)] = (buffer, source_id, entry)
+        return source_id, entry
+
+    def save(self, source, clips, total_duration, tracks=None):
+        """source: {"path", "sample_rate", "duration", "peaks"}；clips 为 AudioClip（或同样属性的对象）；
+        tracks 为 TrackBus.settings() 的通道条参数。返回是否写了 JSON"""
+        with self._lock:
+            os.makedirs(self.assets, exist_ok=True)
+            sources, items = {}, []
+            for clip in clips:
+                view = clip.audio_data
+                if view is None:
+                    continue
+                source_id, entry = self._source_entry(view.buffer, clip.peaks)
+                sources[source_id] = entry
+                items.append({"source": source_id, "name": clip.name, "track": clip.track_idx,
+                              "start": clip.start_time, "offset": view.offset, "length": len(view),
+                              "gain": view.gain, "muted": clip.muted})
+
+            src = None
+            if source and source.get("path"):
+                path = source["path"]
+                src = {"path": os.path.abspath(path), "sample_rate": source["sample_rate"],
+                       "duration": source["duration"]}
+                if os.path.isfile(path):
+                    src["size"], src["mtime_ns"] = _stamp(path)
+                    if source.get("peaks") is not None:
+                        # 总览峰值按源文件的大小 / 修改时间命名，源文件不变就不重写
+                        name = hashlib.sha256(f"{src['path']}:{src['size']}:{src['mtime_ns']}".encode()).hexdigest()
+                        src["peaks"] = self._save_peaks(name, source["peaks"])
+
+            doc = {"version": PROJECT_VERSION, "source": src, "total_duration": total_duration,
+                   "sources": sources, "clips": items, "tracks": tracks or []}
+            text = json.dumps(doc, ensure_ascii=False, indent=1)
+            if text == self._last_json:
+                return False
+            _write_atomic(self.path, lambda f: f.write(text.encode("utf-8")))
+            self._last_json = text
+            return True
+
+    # --- 打开 ---
+    def _resolve(self, entry):
+        """找到分轨文件：原路径；工程目录一起移动时按相对位置；文件被改过时核对哈希。
+        资源目录内的分轨按内容哈希命名、只写一次，存在即可用"""
+        base = os.path.dirname(self.path)
+        if not os.path.isabs(entry["path"]):
+            path = os.path.join(base, entry["path"])
+            return path if os.path.isfile(path) else None
+        for path in (entry["path"], os.path.join(base, os.path.basename(entry["path"]))):
+            if not os.path.isfile(path):
+                continue
+            if list(_stamp(path)) == [entry["size"], entry["mtime_ns"]] or file_sha256(path) == entry["sha256"]:
+                return path
+        return None
+
+    def _load_peaks(self, rel):
+        if not rel:
+            return None
+        return PeakPyramid.load(os.path.join(os.path.dirname(self.path), rel))
+
+    def load(self):
+        """读取工程，返回 {"source", "overview", "total_duration", "clips", "tracks", "missing"}。
+        clips 中每项含 name / track / start / muted / view（指向 LazyAudio 的 ClipView）/ peaks"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            text = f.read()
+        doc = json.loads(text)
+        if doc.get("version") != PROJECT_VERSION:
+            raise ValueError(f"不支持的工程文件版本: {doc.get('version')}")
+
+        buffers, missing = {}, []
+        for source_id, entry in doc["sources"].items():
+            path = self._resolve(entry)
+            if path is None:
+                missing.append(entry["path"])
+                continue
+            buffer = LazyAudio(path, entry["frames"], entry["sr"])
+            buffers[source_id] = (buffer, self._load_peaks(entry.get("peaks")))
+            if os.path.isabs(entry["path"]):
+                entry = dict(entry, path=os.path.abspath(path))
+                entry["size"], entry["mtime_ns"] = _stamp(path)
+            self._sources[id(buffer)] = (buffer, source_id, entry)
+
+        clips = []
+        for item in doc["clips"]:
+            hit = buffers.get(item["source"])
+            if hit is None:
+                continue
+            buffer, peaks = hit
+            clips.append({"name": item["name"], "track": item["track"], "start": item["start"],
+                          "muted": item["muted"], "peaks": peaks,
+                          "view": ClipView(buffer, item["offset"], item["length"], item["gain"])})
+
+        src = doc.get("source")
+        overview = self._load_peaks(src.get("peaks")) if src else None
+        self._last_json = text
+        return {"source": src, "overview": overview, "total_duration": doc["total_duration"],
+                "clips": clips, "tracks": doc.get("tracks", []), "missing": missing}
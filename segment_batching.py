@@ -0,0 +1,187 @@
+"""
+跨文件分段批处理 - 多个排队文件的分段拼成一个批次做前向推理
+apply_model 每次只处理一个文件、每次前向只有一个分段（批大小 1），短文件（片头、广告分轨、采样）
+占不满多核 CPU。SegmentBatcher 不重新实现 demucs 的切分：每个文件在自己的线程里调用 apply_model，
+分段、平移、过渡权重、补齐、center_trim 与 BagOfModels 的合并都由 demucs 完成。
+只有子模型换成了 _BatchedModel 代理：各线程的 model(x) 在 _Rendezvous 汇合，
+同一子模型、同样输入形状的分段拼成一批一次前向，输出按行拆回各自的调用。
+- 组内还在运行的线程都在等前向、或者攒满 batch_size 个分段时才执行一批，同一时刻只有一次前向
+- 批内各样本互不影响：shifts=0（draft）时每个文件的结果与单独处理一致（只差 BLAS 按批大小分块带来的舍入）；
+  shifts>0 时平移偏移照旧由 apply_model 从全局 random 抽取，与单独处理一样每次运行的偏移不同
+jit 后端只 trace 了批大小 1，批量前向时回退到 eager。
+"""
+import functools
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from inference_backends import _map_models
+from presets import preset_params
+from separation_engine import AI_AVAILABLE
+from tracing import TRACER
+
+if AI_AVAILABLE:
+    import torch
+
+DEFAULT_BATCH_SIZE = 8
+
+
+class _Call:
+    """一次 model(x) 调用：等待前向的输入与拆回的输出"""
+
+    def __init__(self, model, mix):
+        self.model = model
+        self.mix = mix
+        self.key = (id(model), tuple(mix.shape[1:]))
+        self.out = None
+        self.error = None
+        self.done = False
+
+
+class _Rendezvous:
+    """各文件线程的前向调用在这里汇合；凑够一批的那个线程释放锁后执行前向，其余线程等待结果"""
+
+    def __init__(self, batch_size, threads, on_batch=None):
+        self.batch_size = batch_size
+        self.active = threads  # 还在运行 apply_model 的线程数
+        self.pending = []      # 等待前向的调用，每个线程最多一个
+        self.busy = False
+        self.on_batch = on_batch
+        self.cond = threading.Condition()
+
+    def _take(self):
+        """可以开始一批时取出同一分组键的调用（最多 batch_size 个），否则返回 None"""
+        if self.busy or not self.pending:
+            return None
+        if len(self.pending) < min(self.batch_size, self.active):
+            return None
+        key = self.pending[0].key
+        batch = [c for c in self.pending if c.key == key][:self.batch_size]
+        self.pending = [c for c in self.pending if c not in batch]
+        return batch
+
+    def _run(self, batch):
+        try:
+            with TRACER.span("batch", size=len(batch), frames=int(batch[0].mix.shape[-1])):
+                out = batch[0].model(torch.cat([c.mix for c in batch]))
+            for b, call in enumerate(batch):
+                call.out = out[b:b + 1]
+        except Exception as e:
+            for call in batch:
+                call.error = e
+        for call in batch:
+            call.done = True
+        if self.on_batch is not None:
+            self.on_batch(len(batch))
+
+    def forward(self, model, mix):
+        call = _Call(model, mix)
+        with self.cond:
+            self.pending.append(call)
+            while not call.done:
+                batch = self._take()
+                if batch is None:
+                    self.cond.wait()
+                    continue
+                self.busy = True
+                self.cond.release()
+                try:
+                    self._run(batch)
+                finally:
+                    self.cond.acquire()
+                    self.busy = False
+                    self.cond.notify_all()
+        if call.error is not None:
+            raise call.error
+        return call.out
+
+    def leave(self):
+        """一个文件的 apply_model 结束（或出错）后调用，剩下的线程不再等它"""
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+
+@functools.lru_cache(maxsize=None)
+def _batched_model_class():
+    """torch 按需导入，nn.Module 子类在第一次用到时才定义"""
+    class _BatchedModel(torch.nn.Module):
+        """子模型的代理：保留 apply_model 需要的属性，前向交给 _Rendezvous 拼批"""
+
+        def __init__(self, inner, rendezvous):
+            super().__init__()
+            self.inner = inner  # 注册为子模块，apply_model 对 BagOfModels 的子模型要读 parameters()
+            self.__dict__["_rendezvous"] = rendezvous
+            for attr in ("samplerate", "sources", "segment", "audio_channels"):
+                setattr(self, attr, getattr(inner, attr))
+
+        def valid_length(self, length):
+            return self.inner.valid_length(length) if hasattr(self.inner, "valid_length") else length
+
+        def forward(self, mix):
+            return self._rendezvous.forward(self.inner, mix)
+
+    return _BatchedModel
+
+
+class SegmentBatcher:
+    """用 SeparationEngine 的常驻模型与当前预设，对多个已归一化的波形做跨文件批量推理"""
+
+    def __init__(self, engine, batch_size=DEFAULT_BATCH_SIZE):
+        if not engine.use_ai:
+            raise RuntimeError("分段批处理需要 Demucs 模型")
+        self.engine = engine
+        self.batch_size = max(1, int(batch_size))
+        self.batches = 0    # 最近一次 run() 的前向次数与分段数
+        self.segments = 0
+
+    def _estimate(self, model, waveforms, params):
+        """进度的分母：按未平移的长度估计分段总数"""
+        subs = list(model.models) if hasattr(model, "models") else [model]
+        total = 0
+        for sub in subs:
+            seg_len = int(sub.samplerate * (params["segment"] or sub.segment)) if params["split"] else None
+            stride = max(1, int((1 - params["overlap"]) * seg_len)) if seg_len else None
+            total += sum(max(1, params["shifts"]) * (math.ceil(w.shape[-1] / stride) if stride else 1)
+                         for w in waveforms)
+        return total or 1
+
+    def run(self, waveforms, on_progress=None):
+        """waveforms: 已归一化的 (channels, frames) 张量列表；返回对应的 (sources, channels, frames) 列表。
+        on_progress(fraction) 在每次前向后调用"""
+        from demucs.apply import apply_model
+
+        params = preset_params(self.engine.preset)
+        self.engine._configure_threads(params)
+        model = self.engine.inference_model()
+        estimate = self._estimate(model, waveforms, params)
+        self.batches = self.segments = 0
+
+        def on_batch(size):
+            self.batches += 1
+            self.segments += size
+            if on_progress is not None:
+                on_progress(min(1.0, self.segments / estimate))
+
+        rendezvous = _Rendezvous(self.batch_size, len(waveforms), on_batch)
+        proxy_class = _batched_model_class()
+        batched = _map_models(model, lambda m: proxy_class(m, rendezvous))
+        backend = self.engine.backend
+
+        def separate(item):
+            try:
+                # no_grad 与 autocast 都是线程局部的，每个文件线程各自进入
+                with torch.no_grad(), backend.context():
+                    return apply_model(batched, waveforms[item][None], shifts=params["shifts"],
+                                       split=params["split"], overlap=params["overlap"],
+                                       segment=params["segment"])[0].float()
+            finally:
+                rendezvous.leave()
+
+        with TRACER.span("inference", model=self.engine.model_name, preset=self.engine.preset,
+                         backend=backend.name, files=len(waveforms), batch_size=self.batch_size):
+            with ThreadPoolExecutor(max_workers=max(1, len(waveforms)), thread_name_prefix="segment-batch") as pool:
+                results = list(pool.map(separate, range(len(waveforms))))
+        if on_progress is not None:
+            on_progress(1.0)
+        return results
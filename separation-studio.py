@@ -4,29 +4,38 @@
 
 依赖: pip install demucs torch torchaudio numpy scipy matplotlib pyaudio
 """
+import time
+_STARTUP_T0 = time.perf_counter()  # --profile-startup 的计时起点
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import numpy as np
-from scipy.io import wavfile
-from scipy.signal import butter, lfilter
+import argparse
 import os
+import sys
 import threading
-import time
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-# --- 尝试导入大模型 ---
-try:
-    import torch
-    import torchaudio
-    from demucs.pretrained import get_model
-    from demucs.apply import apply_model
-
-    AI_AVAILABLE = True
-    print("Demucs大模型支持已就绪")
-except ImportError as e:
-    AI_AVAILABLE = False
-    print(f"⚠ 模型库未安装，将使用基础频段分离算法: {e}")
+import types
+
+# --- 分离核心（torch / demucs 由引擎按需导入，界面启动后在后台预热） ---
+from separation_engine import (AI_LOADING, AI_PENDING, AI_UNAVAILABLE, DEFAULT_MODEL, DEFAULT_STEMS,
+                               STEM_MODE_LABELS, STEM_MODES, STEM_ORDER, SeparationEngine, ai_state,
+                               ensure_ai, load_audio, stem_selection)
+from stem_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, StemCache
+from audio_io import AudioBlockReader
+from clip_audio import ClipView, PagedAudio
+from mix_engine import MixEngine
+from track_bus import GAIN_RANGE_DB, TrackBus
+from playback_buffer import BlockRingBuffer
+from waveform_peaks import PeakBuilder, PeakPyramid, load_cached_peaks, load_or_build_peaks, save_peaks
+from timeline_view import TimelineGrid
+from ui_scheduler import UIScheduler
+from separation_daemon import DEFAULT_SOCKET, DaemonClient, daemon_available
+from stem_export import DEFAULT_EXPORT_FORMAT, EXPORT_FORMATS, StemExporter, available_formats
+from offline_render import bounce
+from project_file import PROJECT_EXT, ProjectStore
+from tracing import TRACER, summary_line
+from presets import DEFAULT_PRESET, PRESET_LABELS, PRESETS, estimate_seconds
+from inference_backends import BACKENDS, DEFAULT_BACKEND
 
 # --- 尝试导入音频播放 ---
 try:
@@ -36,9 +45,19 @@ except ImportError:
     PYAUDIO_AVAILABLE = False
     print("⚠ PyAudio 未安装，播放功能不可用。请安装: pip install pyaudio")
 
-# --- Matplotlib 字体与样式配置 ---
-plt.rcParams["font.sans-serif"] = ["Microsoft YaHei", "SimHei", "Arial", "DejaVu Sans"]
-plt.rcParams["axes.unicode_minus"] = False
+_STARTUP_IMPORTS_DONE = time.perf_counter()
+
+
+def _import_matplotlib():
+    """matplotlib 导入较慢，窗口显示后在后台线程导入；返回 (Figure, FigureCanvasTkAgg)"""
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+    # --- Matplotlib 字体与样式配置 ---
+    matplotlib.rcParams["font.sans-serif"] = ["Microsoft YaHei", "SimHei", "Arial", "DejaVu Sans"]
+    matplotlib.rcParams["axes.unicode_minus"] = False
+    return Figure, FigureCanvasTkAgg
 
 # --- 现代 DAW 配色方案 ---
 COLORS = {
@@ -75,27 +94,41 @@ TRACK_CONFIG = [
 TRACK_HEIGHT = 70
 TRACK_HEADER_WIDTH = 140
 PX_PER_SEC = 60  # 时间轴缩放比例
+MINI_WAVE_MAX_COLS = 4096  # 片段缩略波形的最大列数
 RULER_HEIGHT = 30  # 时间标尺高度（给数字留出空间，避免被遮挡）
+FRAME_STATS_MS = 500  # UI 帧时间显示的刷新间隔
+RESIZE_DEBOUNCE_MS = 80  # 窗口拖动缩放时，停下这么久才重绘时间轴
+AUTOSAVE_MS = 30000  # 工程自动保存间隔
+DECODE_BLOCK_SECONDS = 4.0  # 导入音频时每次解码的长度
+DECODE_UPDATE_MS = 250  # 解码过程中刷新总览波形与已载入时长的最短间隔
+AUTOSAVE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "separation-studio", "autosave")
 
 
 class AudioClip:
-    """可拖拽音频片段类"""
-    def __init__(self, canvas, track_idx, duration, color, name, audio_data, sample_rate, app):
+    """可拖拽音频片段类
+    audio_data 是指向共享缓冲的 ClipView；切分、裁剪、复制、滑移只替换视图，不复制音频。
+    peaks 覆盖整个底层缓冲，各视图按自己的 offset / length 取包络"""
+    def __init__(self, canvas, track_idx, duration, color, name, audio_data, sample_rate, app, peaks=None,
+                 start_time=0.0, muted=False):
         self.canvas = canvas
         self.app = app
         self.track_idx = track_idx
-        self.duration = duration
         self.color = color
         self.name = name
-        self.audio_data = audio_data
+        self.audio_data = None if audio_data is None else ClipView(audio_data, sr=sample_rate)
         self.sample_rate = sample_rate
+        self.duration = len(self.audio_data) / sample_rate if self.audio_data is not None else duration
+        # 峰值金字塔只算一次，静音切换 / 重绘 / 复制出的片段直接取对应层
+        if peaks is None and self.audio_data is not None:
+            peaks = PeakPyramid.build(self.audio_data.buffer, sample_rate)
+        self.peaks = peaks
 
-        self.muted = False
-        self.start_time = 0
+        self.muted = muted
+        self.start_time = start_time
 
-        self.x = 0
+        self.x = start_time * PX_PER_SEC
         self.y = track_idx * TRACK_HEIGHT
-        self.width = duration * PX_PER_SEC
+        self.width = self.duration * PX_PER_SEC
         self.height = TRACK_HEIGHT - 6 
 
         self._draw()
@@ -131,31 +164,38 @@ class AudioClip:
         self._draw_mute_icon()
 
     def _draw_mini_waveform(self):
-        if self.audio_data is None: return
-        
-        # 简化采样
-        samples = 150
-        step = max(1, len(self.audio_data) // samples)
-        data = self.audio_data[::step]
-        if len(data.shape) > 1: data = data[:, 0]
-        
-        max_val = np.max(np.abs(data)) if np.max(np.abs(data)) > 0 else 1
-        data = data / max_val
+        self.wave_id = None
+        points = self._wave_points()
+        if points is None: return
+
+        self.wave_id = self.canvas.create_polygon(
+            points,
+            fill="#333333" if not self.muted else "#555555",
+            outline="",
+            tags=("clip", f"clip_{id(self)}")
+        )
+
+    def _wave_points(self):
+        """视图窗口内的 min/max 包络多边形顶点；没有峰值时返回 None"""
+        if self.peaks is None or self.peaks.frames == 0 or self.audio_data is None: return None
+
+        # 每两个像素一列，按列取 min/max 包络（不会漏掉瞬态）
+        view = self.audio_data
+        cols = max(2, min(int(self.width // 2), MINI_WAVE_MAX_COLS))
+        mins, maxs, _ = self.peaks.envelope(view.offset, view.offset + len(view), cols)
+        half = self.height * 0.4
+        scale = half * view.gain / (self.peaks.peak or 1.0)
 
         center_y = self.y + 3 + self.height / 2
-        points = []
-        for i, val in enumerate(data[:samples]):
-            px = self.x + (i / samples) * self.width
-            py = center_y - val * (self.height * 0.4)
-            points.extend([px, py])
-
-        if len(points) >= 4:
-            self.wave_id = self.canvas.create_line(
-                points,
-                fill="#333333" if not self.muted else "#555555",
-                width=1,
-                tags=("clip", f"clip_{id(self)}")
-            )
+        xs = self.x + (np.arange(cols) + 0.5) * (self.width / cols)
+        top = np.column_stack((xs, center_y - np.clip(maxs.max(axis=1) * scale, -half, half)))
+        bottom = np.column_stack((xs, center_y - np.clip(mins.min(axis=1) * scale, -half, half)))[::-1]
+        return np.concatenate((top, bottom)).ravel().tolist()
+
+    def _refresh_wave(self):
+        """视图变化后只移动已有多边形的顶点"""
+        if self.wave_id is not None:
+            self.canvas.coords(self.wave_id, self._wave_points())
 
     def _draw_mute_icon(self):
         icon_x = self.x + self.width - 20
@@ -175,6 +215,9 @@ class AudioClip:
         self.canvas.tag_bind(tag, "<B1-Motion>", self.on_drag)
         self.canvas.tag_bind(tag, "<ButtonRelease-1>", self.on_release)
         self.canvas.tag_bind(tag, "<Button-3>", self.on_right_click)
+        # Shift + 拖动：滑移片段内容，位置与长度不变
+        self.canvas.tag_bind(tag, "<Shift-Button-1>", self.on_slip_press)
+        self.canvas.tag_bind(tag, "<Shift-B1-Motion>", self.on_slip_drag)
 
     def on_press(self, event):
         self.drag_start_x = event.x
@@ -199,6 +242,7 @@ class AudioClip:
         self.track_idx = new_track
         # 拖动过程中实时更新 start_time，播放时可即时响应
         self.start_time = self.x / PX_PER_SEC
+        self.app.on_clips_changed()
 
     def on_release(self, event):
         grid_sec = 0.1
@@ -209,88 +253,182 @@ class AudioClip:
         self.canvas.move(f"clip_{id(self)}", move_x, 0)
         self.x = snapped_x
         self.start_time = self.x / PX_PER_SEC
-        
+        self.app.on_clips_changed()
+
         self.app.update_status(f"片段移动至: 轨道 {self.track_idx+1}, 时间 {self.start_time:.2f}s")
 
+    def on_slip_press(self, event):
+        self.drag_start_x = event.x
+        self.slip_view = self.audio_data
+
+    def on_slip_drag(self, event):
+        # 内容跟随鼠标：向右拖时窗口在缓冲中左移
+        frames = -int((event.x - self.drag_start_x) / PX_PER_SEC * self.sample_rate)
+        self.audio_data = self.slip_view.slip(frames)
+        self._refresh_wave()
+        self.app.on_clips_changed()
+
     def on_right_click(self, event):
         menu = tk.Menu(self.canvas, tearoff=0, bg=COLORS["panel"], fg=COLORS["text"])
         # 根据当前状态动态显示菜单文案
         mute_label = "🔈 取消静音" if self.muted else "🔇 静音"
         menu.add_command(label=mute_label, command=lambda: self.toggle_mute(None))
         menu.add_separator()
+        t = self.app.player.current_time
+        menu.add_command(label="✂️ 在播放头处切分", command=lambda: self.split_at(t))
+        menu.add_command(label="⇤ 裁掉播放头之前", command=lambda: self.trim_at(t, keep_after=True))
+        menu.add_command(label="⇥ 裁掉播放头之后", command=lambda: self.trim_at(t, keep_after=False))
+        menu.add_command(label="⧉ 复制片段", command=self.duplicate)
+        menu.add_command(label="🔊 增益 +3 dB", command=lambda: self.change_gain(3.0))
+        menu.add_command(label="🔉 增益 -3 dB", command=lambda: self.change_gain(-3.0))
+        menu.add_separator()
         menu.add_command(label="🗑️ 删除", command=self.delete)
         menu.tk_popup(event.x_root, event.y_root)
 
+    # --- 非破坏编辑：新片段引用同一缓冲，只是视图不同 ---
+    def _frame_at(self, t):
+        """时间轴时间 -> 片段内的相对帧；不在片段内部时返回 None"""
+        frame = int(round((t - self.start_time) * self.sample_rate))
+        return frame if 0 < frame < len(self.audio_data) else None
+
+    def _spawn(self, view, start_time, track_idx=None):
+        return AudioClip(self.canvas, self.track_idx if track_idx is None else track_idx, 0, self.color,
+                         self.name, view, self.sample_rate, self.app, peaks=self.peaks,
+                         start_time=start_time, muted=self.muted)
+
+    def _replace_with(self, clips):
+        self.canvas.delete(f"clip_{id(self)}")
+        if self in self.app.clips:
+            self.app.clips.remove(self)
+        self.app.clips.extend(clips)
+        self.app.on_clips_changed()
+
+    def split_at(self, t):
+        frame = self._frame_at(t)
+        if frame is None:
+            self.app.update_status("播放头不在该片段内，无法切分")
+            return
+        left, right = self.audio_data.split(frame)
+        self._replace_with([self._spawn(left, self.start_time),
+                            self._spawn(right, self.start_time + frame / self.sample_rate)])
+        self.app.update_status(f"{self.name} 已在 {t:.2f}s 处切分")
+
+    def trim_at(self, t, keep_after):
+        frame = self._frame_at(t)
+        if frame is None:
+            self.app.update_status("播放头不在该片段内，无法裁剪")
+            return
+        if keep_after:
+            clip = self._spawn(self.audio_data.trim(frame, len(self.audio_data)), self.start_time + frame / self.sample_rate)
+        else:
+            clip = self._spawn(self.audio_data.trim(0, frame), self.start_time)
+        self._replace_with([clip])
+        self.app.update_status(f"{self.name} 已裁剪为 {clip.duration:.2f}s")
+
+    def duplicate(self):
+        """复制到同一轨道、紧接在原片段之后"""
+        clip = self._spawn(self.audio_data.duplicate(), self.start_time + self.duration)
+        self.app.clips.append(clip)
+        self.app.on_clips_changed()
+        self.app.update_status(f"已复制 {self.name} 至 {clip.start_time:.2f}s")
+
+    def change_gain(self, db):
+        view = self.audio_data
+        self.audio_data = view.with_gain(view.gain * 10 ** (db / 20))
+        self._refresh_wave()
+        self.app.on_clips_changed()
+        self.app.update_status(f"{self.name} 增益 {20 * np.log10(max(self.audio_data.gain, 1e-6)):+.1f} dB")
+
     def toggle_mute(self, event):
         self.muted = not self.muted
         self.canvas.delete(f"clip_{id(self)}")
         self._draw()
         self._bind_events()
+        self.app.on_clips_changed()
         self.app.update_status(f"{self.name} {'已静音' if self.muted else '已取消静音'}")
 
     def delete(self):
         self.canvas.delete(f"clip_{id(self)}")
         if self in self.app.clips:
             self.app.clips.remove(self)
+            self.app.on_clips_changed()
 
 
 class AudioPlayer:
-    """音频播放器 - 逻辑修复版"""
-    def __init__(self, app):
+    """音频播放器 - 回调驱动 + 预缓冲
+    PyAudio 回调只从环形缓冲取出混好的块（不混音、不加锁、不碰 Tk），
+    混音线程始终提前 prebuffer_blocks 个块填充；播放头取自回调实际送出的帧数。
+    每块经过轨道总线（通道条 + 主总线限幅器），离线导出使用同一个总线的快照"""
+    BLOCK_FRAMES = 2048
+    PREBUFFER_BLOCKS = 8
+
+    def __init__(self, app, prebuffer_blocks=None):
         self.app = app
-        self.p = pyaudio.PyAudio() if PYAUDIO_AVAILABLE else None
+        self.p = None  # PortAudio 初始化要枚举设备，推迟到第一次播放
         self.stream = None
         self.playing = False
         self.paused = False
-        self.current_time = 0.0
         self.stop_event = threading.Event()
         self.play_thread = None
+        self.mixer = MixEngine(block_frames=self.BLOCK_FRAMES)
+        self.bus = TrackBus([t["name"] for t in TRACK_CONFIG], block_frames=self.BLOCK_FRAMES)
+        self._chunk = None
+        self.ring = BlockRingBuffer(prebuffer_blocks or self.PREBUFFER_BLOCKS, self.BLOCK_FRAMES)
+        self._silence = bytes(self.BLOCK_FRAMES * 2 * 4)  # PortAudio 回调只接受 bytes
+        self._played_frame = 0    # 回调已送出的帧位置（播放头）
+        self._played_gen = 0      # 最近送出的块所属的代
+        self._restart_frame = 0   # 定位 / 暂停后生产者重新开始的位置
+        self._produce_frame = 0
+        self._produce_gen = 0
+        self._eof_gen = -1        # 生产者已混到时间轴末尾的代
+        self.underruns = 0        # 缓冲已空、回调只能输出静音的次数
+        self.device_underflows = 0  # PortAudio 报告的输出欠载次数
+        self.mix_blocks = 0       # 本次播放混好的块数与混音耗时
+        self.mix_seconds = 0.0
+        self.mix_max = 0.0
+
+    @property
+    def sample_rate(self):
+        clips = self.app.playback_clips()
+        return clips[0].sample_rate if clips else 44100
+
+    @property
+    def current_time(self):
+        # 定位后新位置的块尚未送出时，以定位目标为准
+        frame = self._played_frame if self._played_gen == self.ring.generation else self._restart_frame
+        return frame / self.sample_rate
+
+    @property
+    def xruns(self):
+        return self.underruns + self.device_underflows
+
+    def playback_stats(self):
+        """每块混音耗时与欠载计数"""
+        return {"blocks": self.mix_blocks,
+                "mix_us_avg": self.mix_seconds / self.mix_blocks * 1e6 if self.mix_blocks else 0.0,
+                "mix_us_max": self.mix_max * 1e6,
+                "underruns": self.underruns, "device_underflows": self.device_underflows}
 
     def get_mixed_audio_chunk(self, start_time, duration):
-        if not self.app.clips:
+        clips = self.app.playback_clips()
+        if not clips:
             return None, 44100
 
-        sr = self.app.clips[0].sample_rate if self.app.clips else 44100
-        num_samples = int(duration * sr)
-        mixed = np.zeros((num_samples, 2), dtype=np.float32)
-        start_sample_global = int(start_time * sr)
-        has_audio = False
-        
-        for clip in self.app.clips:
-            if clip.muted or clip.audio_data is None: continue
-            
-            clip_start_sample = int(clip.start_time * sr)
-            clip_end_sample = clip_start_sample + len(clip.audio_data)
-            
-            overlap_start = max(start_sample_global, clip_start_sample)
-            overlap_end = min(start_sample_global + num_samples, clip_end_sample)
-            
-            if overlap_start < overlap_end:
-                has_audio = True
-                buf_start = overlap_start - start_sample_global
-                buf_end = overlap_end - start_sample_global
-                src_start = overlap_start - clip_start_sample
-                src_end = overlap_end - clip_start_sample
-                
-                audio_chunk = clip.audio_data[src_start:src_end]
-                
-                if len(audio_chunk.shape) == 1:
-                    mixed[buf_start:buf_end, 0] += audio_chunk
-                    mixed[buf_start:buf_end, 1] += audio_chunk
-                elif audio_chunk.shape[1] == 1:
-                    mixed[buf_start:buf_end, 0] += audio_chunk[:, 0]
-                    mixed[buf_start:buf_end, 1] += audio_chunk[:, 0]
-                else:
-                    mixed[buf_start:buf_end] += audio_chunk
-
-        if has_audio:
-            peak = np.max(np.abs(mixed))
-            if peak > 1.0: mixed /= peak
-                
-        return mixed, sr
+        sr = clips[0].sample_rate
+        # 区间索引见 MixEngine；通道条与限幅器见 TrackBus。返回的缓冲在下一次调用前有效
+        frames = int(round(duration * sr))
+        if self._chunk is None or len(self._chunk) != frames:
+            self._chunk = np.empty((frames, 2), dtype=np.float32)
+        self.bus.set_sample_rate(sr)
+        return self.bus.render(self.mixer, clips, int(start_time * sr), self._chunk), sr
+
+    def _device(self):
+        if self.p is None and PYAUDIO_AVAILABLE:
+            self.p = pyaudio.PyAudio()
+        return self.p
 
     def play(self):
-        if not self.p:
+        if not self._device():
             messagebox.showerror("错误", "未检测到播放设备 (PyAudio)")
             return
         if self.playing and self.paused:
@@ -300,38 +438,98 @@ class AudioPlayer:
 
         self.playing = True
         self.paused = False
+        self.underruns = 0
+        self.device_underflows = 0
+        self.mix_blocks, self.mix_seconds, self.mix_max = 0, 0.0, 0.0
+        self.bus.set_sample_rate(self.sample_rate)
         self.stop_event.clear()
-        self.play_thread = threading.Thread(target=self._playback_loop, daemon=True)
+        self.play_thread = threading.Thread(target=self._producer_loop, daemon=True)
         self.play_thread.start()
 
-    def _playback_loop(self):
-        CHUNK_SIZE = 2048
-        sr = self.app.clips[0].sample_rate if self.app.clips else 44100
-             
+    def _restart_at(self, frame):
+        """作废预缓冲，生产者从 frame 处重新填充"""
+        self._restart_frame = frame
+        self.ring.flush()
+
+    def _fill(self):
+        """把环形缓冲补满，返回本次混了多少块"""
+        ring = self.ring
+        block = ring.block_frames
+        end_frame = int(self.app.total_duration * self.sample_rate)
+        produced = 0
+        while not self.stop_event.is_set():
+            gen = ring.generation
+            if gen != self._produce_gen:
+                self._produce_gen = gen
+                self._produce_frame = self._restart_frame
+            if self._produce_frame >= end_frame:
+                self._eof_gen = gen
+                break
+            slot = ring.next_slot()
+            if slot is None:
+                break
+            t0 = time.perf_counter()
+            self.bus.render(self.mixer, self.app.playback_clips(), self._produce_frame, slot)
+            dt = time.perf_counter() - t0
+            self.mix_blocks += 1
+            self.mix_seconds += dt
+            self.mix_max = max(self.mix_max, dt)
+            ring.commit(self._produce_frame, gen)
+            self._produce_frame += block
+            produced += 1
+        return produced
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """PortAudio 回调：frames_per_buffer 固定，frame_count 总是等于块大小"""
+        if status & pyaudio.paOutputUnderflow:
+            self.device_underflows += 1
+        if self.stop_event.is_set():
+            return self._silence, pyaudio.paComplete
+        if self.paused:
+            return self._silence, pyaudio.paContinue
+
+        gen = self.ring.generation
+        item = self.ring.pop()
+        if item is None:
+            if self._eof_gen == gen:
+                return self._silence, pyaudio.paComplete
+            if self._played_gen == gen:
+                self.underruns += 1  # 定位后的重新填充不计入欠载
+            return self._silence, pyaudio.paContinue
+
+        data, start = item
+        self._played_frame = start + frame_count
+        self._played_gen = gen
+        return data, pyaudio.paContinue
+
+    def _producer_loop(self):
+        sr = self.sample_rate
+        idle = self.ring.block_frames / sr / 4
+        last_t = None
+        last_counter = 0.0
+
         try:
             self.stream = self.p.open(
                 format=pyaudio.paFloat32, channels=2, rate=sr, output=True,
-                frames_per_buffer=CHUNK_SIZE
+                frames_per_buffer=self.ring.block_frames,
+                stream_callback=self._callback, start=False
             )
-            
-            while not self.stop_event.is_set():
-                if self.paused:
-                    time.sleep(0.05)
-                    continue
-                
-                if self.current_time >= self.app.total_duration:
-                    break
-
-                duration = CHUNK_SIZE / sr
-                mixed_chunk, _ = self.get_mixed_audio_chunk(self.current_time, duration)
-                
-                if mixed_chunk is not None:
-                    self.stream.write(mixed_chunk.astype(np.float32).tobytes())
-                else:
-                    self.stream.write(np.zeros((CHUNK_SIZE, 2), dtype=np.float32).tobytes())
-                
-                self.current_time += duration
-                self.app.root.after(0, lambda t=self.current_time: self.app.update_playhead_ui(t))
+            # 先预填充再启动，开头不会欠载
+            self._fill()
+            self.stream.start_stream()
+
+            while not self.stop_event.is_set() and self.stream.is_active():
+                produced = self._fill()
+                t = self.current_time
+                if t != last_t:
+                    last_t = t
+                    # 只保留最新位置，由界面调度器按帧刷新
+                    self.app.ui.post("playhead", self.app.update_playhead_ui, t)
+                if TRACER.enabled and time.perf_counter() - last_counter > 1.0:
+                    last_counter = time.perf_counter()
+                    TRACER.counter("playback", **self.playback_stats())
+                if not produced:
+                    time.sleep(idle)
 
         except Exception as e:
             print(f"Play Error: {e}")
@@ -341,41 +539,144 @@ class AudioPlayer:
                 self.stream.stop_stream()
                 self.stream.close()
                 self.stream = None
+            if self.xruns:
+                print(f"播放欠载: 缓冲 {self.underruns} 次, 设备 {self.device_underflows} 次")
+            TRACER.counter("playback", **self.playback_stats())
             self.app.root.after(0, self.app.on_playback_stopped)
 
-    def pause(self): self.paused = True
+    def pause(self):
+        # 回调立即改为输出静音；预缓冲从暂停位置重新填充，继续播放时反映暂停期间的编辑
+        self.paused = True
+        self._restart_at(int(self.current_time * self.sample_rate))
+
     def stop(self):
         self.stop_event.set()
         self.playing = False
         self.paused = False
-        self.current_time = 0
+        self._restart_at(0)
         self.app.update_playhead_ui(0)
-    def seek(self, t): self.current_time = t
+
+    def seek(self, t):
+        self._restart_at(int(t * self.sample_rate))
+
     def cleanup(self):
         self.stop()
         if self.p: self.p.terminate()
 
 class ModernStudioApp:
-    def __init__(self, root):
+    def __init__(self, root, profile=None):
         self.root = root
+        self.profile = profile
         self.root.title("音频分离工作站")
         self.root.geometry("1400x950")
         self.root.configure(bg=COLORS["bg"])
         
         self.file_path = ""
         self.audio_data = None
+        self.peaks = None
         self.sample_rate = 44100
         self.duration = 0
         self.clips = []
+        self._source_preview = []  # 还没有分轨片段时试听源音频（解码中的缓冲）
+        self._load_gen = 0  # 每次导入 / 打开工程加一，作废仍在进行的解码
         self.total_duration = 60
-        self.demucs_model = None
+        self.engine = SeparationEngine(DEFAULT_MODEL, cache=self._open_stem_cache())
+        self.cached_stems = None  # 导入时按音频内容查到的缓存分轨
+        self.exporter = StemExporter(DEFAULT_EXPORT_FORMAT)  # 分轨在写线程池上后台写盘
+        self.export_summary = ""
+        self.trace_summary = ""  # --trace 时分离各阶段耗时的一行摘要
         self.scrubbing = False  # 时间轴拖动
+        self._model_warming = False
+        self.project = None  # 当前工程（ProjectStore）；未保存过时自动保存到 AUTOSAVE_DIR
+        self._project_dirty = False
+        self._saving = threading.Lock()
 
         self.player = AudioPlayer(self)
+        self.ui = UIScheduler(root)  # 工作线程的播放头 / 进度更新按帧合并
+        self._playhead = None  # (标尺三角, 时间轴竖线)，创建一次后只移动
+        self._playhead_x = None
+        self._time_text = None
         self._init_styles()
         self._init_ui()
+        self.ui.start()
+        self.root.after(FRAME_STATS_MS, self._show_frame_time)
         
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # 窗口先显示，空闲后再在后台导入绘图库与模型库
+        self.root.after_idle(self._start_background_imports)
+        self.root.after(AUTOSAVE_MS, self._autosave)
+
+    def _mark(self, stage):
+        if self.profile is not None:
+            self.profile.mark(stage)
+
+    def _start_background_imports(self):
+        self._mark("窗口首次显示")
+        threading.Thread(target=self._background_imports, daemon=True).start()
+
+    def _background_imports(self):
+        try:
+            figure_cls, canvas_cls = _import_matplotlib()
+            self._mark("绘图库导入完成")
+            self.root.after(0, lambda: self._attach_waveform_canvas(figure_cls, canvas_cls))
+        except ImportError as e:
+            print(f"⚠ matplotlib 不可用，波形预览已禁用: {e}")
+
+        self.root.after(0, self._refresh_ai_status)
+        if ensure_ai():
+            print("Demucs大模型支持已就绪")
+        else:
+            from separation_engine import AI_IMPORT_ERROR
+            print(f"⚠ 模型库未安装，将使用基础频段分离算法: {AI_IMPORT_ERROR}")
+        self._mark("模型库导入完成")
+        self.root.after(0, self._refresh_ai_status)
+        if self.profile is not None:
+            self.root.after(0, self._finish_startup_profile)
+
+    def _finish_startup_profile(self):
+        self.profile.report()
+        self.on_close()
+
+    def _refresh_ai_status(self):
+        """工具栏上的模型状态：待加载 → 导入中 → 已就绪 / 基础模式，导入音频后预热模型"""
+        state = ai_state()
+        if state == AI_UNAVAILABLE:
+            text, color = "基础模式", "#ff9800"
+        elif state in (AI_PENDING, AI_LOADING):
+            text, color = "模型库加载中...", COLORS["text_dim"]
+        elif self._model_warming:
+            text, color = "模型预热中...", COLORS["accent"]
+        elif self.engine.model_ready:
+            backend = f" · {self.engine.backend.name}" if self.engine.backend else ""
+            text, color = f"Demucs大模型已就绪{backend}", "#4caf50"
+        else:
+            text, color = "模型库已就绪", "#4caf50"
+        self.lbl_ai_status.config(text=f"  [{text}]", fg=color)
+
+    def _warm_up_model(self):
+        """导入音频后预先加载模型，点击“开始分离”时不必再等待"""
+        if self._model_warming or self.engine.model_ready or ai_state() == AI_UNAVAILABLE:
+            return
+        self._model_warming = True
+        self._refresh_ai_status()
+        threading.Thread(target=self._warm_up_thread, daemon=True).start()
+
+    def _warm_up_thread(self):
+        try:
+            if self.engine.use_ai:
+                self.engine.inference_model()  # 同时准备推理后端
+        except Exception as e:
+            print(f"⚠ 模型预热失败: {e}")
+        finally:
+            self._model_warming = False
+            self.root.after(0, self._refresh_ai_status)
+
+    def _open_stem_cache(self):
+        try:
+            return StemCache(DEFAULT_CACHE_DIR)
+        except OSError as e:
+            print(f"⚠ 分轨缓存不可用: {e}")
+            return None
 
     def _init_styles(self):
         style = ttk.Style()
@@ -402,12 +703,14 @@ class ModernStudioApp:
         tk.Label(toolbar, text="人声音频分离", font=("Segoe UI", 16, "bold"), bg=COLORS["bg"], fg="#ffffff").pack(side="left")
         tk.Label(toolbar, text=" studio", font=("Segoe UI", 16, "bold"), bg=COLORS["bg"], fg=COLORS["accent"]).pack(side="left")
         
-        status_text = "Demus大模型已就绪" if AI_AVAILABLE else "基础模式"
-        status_color = "#4caf50" if AI_AVAILABLE else "#ff9800"
-        tk.Label(toolbar, text=f"  [{status_text}]", font=("Consolas", 9), bg=COLORS["bg"], fg=status_color).pack(side="left", padx=10, pady=5)
+        self.lbl_ai_status = tk.Label(toolbar, font=("Consolas", 9), bg=COLORS["bg"])
+        self.lbl_ai_status.pack(side="left", padx=10, pady=5)
+        self._refresh_ai_status()
 
         btn_frame = tk.Frame(toolbar, bg=COLORS["bg"])
         btn_frame.pack(side="right")
+        self._make_button(btn_frame, "📁 打开工程", self.open_project, bg=COLORS["panel_light"])
+        self._make_button(btn_frame, "💾 保存工程", self.save_project, bg=COLORS["panel_light"])
         self._make_button(btn_frame, "📂 导入音频", self.load_file, bg=COLORS["panel_light"])
     def _make_button(self, parent, text, command, bg=COLORS["panel_light"]):
         btn = tk.Button(parent, text=text, command=command, bg=bg, fg=COLORS["text"], 
@@ -422,11 +725,24 @@ class ModernStudioApp:
         header.pack(fill="x")
         tk.Label(header, text="  📊 波形预览", bg=COLORS["panel_light"], fg=COLORS["text_dim"], font=("Segoe UI", 9, "bold")).pack(side="left", pady=5)
         
-        self.fig, self.ax = plt.subplots(facecolor=COLORS["panel"])
+        # 绘图库在后台导入完成后才创建画布，先放一个占位
+        self.fig = self.ax = self.canvas_wave = None
+        self._wave_container = container
+        self._wave_placeholder = tk.Label(container, text="波形组件加载中...", bg=COLORS["bg"], fg=COLORS["text_dim"])
+        self._wave_placeholder.pack(fill="both", expand=True)
+
+    def _attach_waveform_canvas(self, figure_cls, canvas_cls):
+        self._wave_placeholder.destroy()
+        self.fig = figure_cls(facecolor=COLORS["panel"])
+        self.ax = self.fig.add_subplot()
         self.fig.subplots_adjust(left=0.04, right=0.99, top=0.95, bottom=0.25)
-        self.canvas_wave = FigureCanvasTkAgg(self.fig, master=container)
+        self.canvas_wave = canvas_cls(self.fig, master=self._wave_container)
         self.canvas_wave.get_tk_widget().pack(fill="both", expand=True)
-        self._setup_ax_style(show_text=True)
+        if self.peaks is not None:
+            self._draw_waveform()
+        else:
+            self._setup_ax_style(show_text=True)
+        self._mark("波形画布就绪")
 
     def _setup_ax_style(self, show_text=False):
         self.ax.set_facecolor(COLORS["bg"])
@@ -438,7 +754,7 @@ class ModernStudioApp:
         self.ax.set_xlim(0, 10)
         if show_text:
             self.ax.text(5, 0, "导入音频以显示波形", ha='center', va='center', color=COLORS['text_dim'], fontsize=12)
-        if hasattr(self, 'canvas_wave'): self.canvas_wave.draw()
+        if self.canvas_wave is not None: self.canvas_wave.draw()
 
     def _create_track_panel(self, parent):
         container = ttk.Frame(parent, style="Panel.TFrame")
@@ -452,6 +768,34 @@ class ModernStudioApp:
                                       bg=COLORS["accent"], fg="white", font=("Segoe UI", 9, "bold"),
                                       relief="flat", state="disabled")
         self.btn_separate.pack(side="right", padx=10, pady=5)
+        self.btn_bounce = tk.Button(header, text="🎧 导出混音", command=self.run_bounce,
+                                    bg=COLORS["panel"], fg=COLORS["text"], font=("Segoe UI", 9),
+                                    relief="flat")
+        self.btn_bounce.pack(side="right", pady=5)
+
+        # 速度 / 质量预设、导出格式与抖动（下次分离时生效）
+        self.var_dither = tk.BooleanVar(value=False)
+        tk.Checkbutton(header, text="抖动", variable=self.var_dither, command=self._on_export_options,
+                       bg=COLORS["panel_light"], fg=COLORS["text_dim"], selectcolor=COLORS["panel"],
+                       activebackground=COLORS["panel_light"], font=("Segoe UI", 9)).pack(side="right", pady=5)
+        self.var_format = tk.StringVar(value=DEFAULT_EXPORT_FORMAT)
+        fmt_box = ttk.Combobox(header, textvariable=self.var_format, values=available_formats(),
+                               state="readonly", width=8)
+        fmt_box.pack(side="right", padx=5, pady=5)
+        fmt_box.bind("<<ComboboxSelected>>", lambda e: self._on_export_options())
+        tk.Label(header, text="导出格式", bg=COLORS["panel_light"], fg=COLORS["text_dim"], font=("Segoe UI", 9)).pack(side="right")
+        self.var_preset = tk.StringVar(value=DEFAULT_PRESET)
+        preset_box = ttk.Combobox(header, textvariable=self.var_preset, values=list(PRESETS),
+                                  state="readonly", width=9)
+        preset_box.pack(side="right", padx=5, pady=5)
+        preset_box.bind("<<ComboboxSelected>>", lambda e: self._on_preset_changed())
+        tk.Label(header, text="质量", bg=COLORS["panel_light"], fg=COLORS["text_dim"], font=("Segoe UI", 9)).pack(side="right")
+        self.var_stems = tk.StringVar(value=DEFAULT_STEMS)
+        stems_box = ttk.Combobox(header, textvariable=self.var_stems, values=list(STEM_MODES),
+                                 state="readonly", width=7)
+        stems_box.pack(side="right", padx=5, pady=5)
+        stems_box.bind("<<ComboboxSelected>>", lambda e: self._on_stems_changed())
+        tk.Label(header, text="分轨", bg=COLORS["panel_light"], fg=COLORS["text_dim"], font=("Segoe UI", 9)).pack(side="right")
 
         content = tk.Frame(container, bg=COLORS["bg"])
         content.pack(fill="both", expand=True)
@@ -469,6 +813,12 @@ class ModernStudioApp:
         self.track_headers = tk.Canvas(left_panel, width=TRACK_HEADER_WIDTH, bg=COLORS["panel"], highlightthickness=0)
         self.track_headers.pack(fill="y", expand=True)
         self._draw_track_headers()
+        # 通道条：M / S 按钮点击切换；滚轮调增益，Shift + 滚轮调声像，双击复位
+        self.track_headers.bind("<ButtonPress-1>", self._on_header_click)
+        self.track_headers.bind("<Double-Button-1>", self._on_header_reset)
+        self.track_headers.bind("<MouseWheel>", lambda e: self._on_header_wheel(e, 1 if e.delta > 0 else -1))
+        self.track_headers.bind("<Button-4>", lambda e: self._on_header_wheel(e, 1))
+        self.track_headers.bind("<Button-5>", lambda e: self._on_header_wheel(e, -1))
 
         timeline_frame = tk.Frame(content, bg=COLORS["bg"])
         timeline_frame.pack(side="left", fill="both", expand=True)
@@ -480,9 +830,15 @@ class ModernStudioApp:
 
         h_scroll = ttk.Scrollbar(timeline_frame, orient="horizontal", command=self._on_scroll)
         h_scroll.pack(fill="x")
-        self.timeline.configure(xscrollcommand=h_scroll.set)
-        
-        self.timeline.bind("<Configure>", lambda e: self._draw_timeline())
+        self._h_scroll = h_scroll
+        self.timeline.configure(xscrollcommand=self._on_xview_changed)
+
+        # 网格与标尺只绘制视口附近，滚动时复用图元；缩放窗口时去抖
+        self.grid = TimelineGrid(self.timeline, self.time_ruler, len(TRACK_CONFIG), TRACK_HEIGHT,
+                                 RULER_HEIGHT, COLORS)
+        self._resize_job = None
+        self._viewport_job = None
+        self.timeline.bind("<Configure>", self._on_timeline_configure)
 
         # 按住拖动时间轴可连续定位（scrub）
         self.timeline.bind("<ButtonPress-1>", self._on_timeline_press)
@@ -495,39 +851,80 @@ class ModernStudioApp:
 
     def _draw_track_headers(self):
         self.track_headers.delete("all")
+        strips = self.player.bus.strips
         for i, track in enumerate(TRACK_CONFIG):
             y = i * TRACK_HEIGHT
+            strip = strips[i]
             self.track_headers.create_rectangle(0, y, TRACK_HEADER_WIDTH, y+TRACK_HEIGHT, fill=COLORS["panel"], outline=COLORS["border"])
             self.track_headers.create_rectangle(0, y, 6, y+TRACK_HEIGHT, fill=track["color"], outline="")
-            self.track_headers.create_text(20, y+35, text=f"{track['icon']} {track['name']}", anchor="w", fill=COLORS["text"], font=("Segoe UI", 9, "bold"))
-    def _draw_timeline(self):
-        self.timeline.delete("grid")
-        self.time_ruler.delete("all")
-        w = max(self.timeline.winfo_width(), int(self.total_duration * PX_PER_SEC))
-        h = len(TRACK_CONFIG) * TRACK_HEIGHT
-        self.timeline.configure(scrollregion=(0, 0, w, h))
+            self.track_headers.create_text(20, y+22, text=f"{track['icon']} {track['name']}", anchor="w", fill=COLORS["text"], font=("Segoe UI", 9, "bold"))
+            for x, label, on, color in ((20, "M", strip.mute, COLORS["muted"]), (44, "S", strip.solo, COLORS["playhead"])):
+                self.track_headers.create_rectangle(x, y+40, x+20, y+58, fill=color if on else COLORS["panel_light"], outline=COLORS["border"])
+                self.track_headers.create_text(x+10, y+49, text=label, fill="#000000" if on else COLORS["text_dim"], font=("Segoe UI", 8, "bold"))
+            pan = "C" if abs(strip.pan) < 0.05 else f"{'L' if strip.pan < 0 else 'R'}{abs(strip.pan) * 100:.0f}"
+            self.track_headers.create_text(72, y+49, text=f"{strip.gain_db:+.1f}dB  {pan}", anchor="w", fill=COLORS["text_dim"], font=("Segoe UI", 8))
+
+    def _header_strip(self, event):
+        i = int(self.track_headers.canvasy(event.y) // TRACK_HEIGHT)
+        return self.player.bus.strips[i] if 0 <= i < len(TRACK_CONFIG) else None
+
+    def _on_header_click(self, event):
+        strip = self._header_strip(event)
+        y = self.track_headers.canvasy(event.y) % TRACK_HEIGHT
+        if strip is None or not 40 <= y <= 58:
+            return
+        if 20 <= event.x <= 40:
+            strip.mute = not strip.mute
+        elif 44 <= event.x <= 64:
+            strip.solo = not strip.solo
+        else:
+            return
+        self._on_strip_changed()
 
-        for i in range(len(TRACK_CONFIG)):
-            y = i * TRACK_HEIGHT
-            bg = "#161616" if i % 2 == 0 else "#121212"
-            self.timeline.create_rectangle(0, y, w, y+TRACK_HEIGHT, fill=bg, outline="", tags="grid")
-            self.timeline.create_line(0, y+TRACK_HEIGHT, w, y+TRACK_HEIGHT, fill=COLORS["border"], tags="grid")
+    def _on_header_wheel(self, event, step):
+        strip = self._header_strip(event)
+        if strip is None:
+            return
+        if event.state & 0x1:  # Shift
+            strip.pan = round(min(1.0, max(-1.0, strip.pan + 0.1 * step)), 2)
+        else:
+            lo, hi = GAIN_RANGE_DB
+            strip.gain_db = min(hi, max(lo, strip.gain_db + step))
+        self._on_strip_changed()
+
+    def _on_header_reset(self, event):
+        strip = self._header_strip(event)
+        if strip is not None and event.x > 64:
+            strip.gain_db, strip.pan = 0.0, 0.0
+            self._on_strip_changed()
+
+    def _on_strip_changed(self):
+        """通道条参数由混音线程下一块读取并平滑过渡，这里只重画表头"""
+        self._project_dirty = True
+        self._draw_track_headers()
+    def _draw_timeline(self):
+        self._update_viewport()
+        self._draw_playhead_ui(self.player.current_time)
 
-        for sec in range(int(self.total_duration) + 1):
-            x = sec * PX_PER_SEC
-            self.timeline.create_line(x, 0, x, h, fill=COLORS["grid"], tags="grid")
-            self.time_ruler.create_line(x, RULER_HEIGHT-12, x, RULER_HEIGHT-1, fill=COLORS["text_dim"])
-            self.time_ruler.create_text(x+2, 2, text=f"{sec}s", fill=COLORS["text_dim"], font=("Segoe UI", 8), anchor="n")
-            sub_x = x + (PX_PER_SEC / 2)
-            if sub_x < w: self.timeline.create_line(sub_x, 0, sub_x, h, fill="#1e1e1e", dash=(2,4), tags="grid")
+    def _update_viewport(self):
+        """重绘可见范围内的网格与标尺，耗时与时间轴总长度无关"""
+        self._viewport_job = None
+        self.grid.redraw(PX_PER_SEC, self.total_duration, self.timeline.canvasx(0), self.timeline.winfo_width())
 
-        # 时间标尺底部边框（增强分隔感，避免“遮挡标尺”的观感）
-        self.time_ruler.create_line(0, RULER_HEIGHT-1, w, RULER_HEIGHT-1, fill=COLORS["border"])
+    def _on_timeline_configure(self, event):
+        if self._resize_job is not None:
+            self.root.after_cancel(self._resize_job)
+        self._resize_job = self.root.after(RESIZE_DEBOUNCE_MS, self._on_resize_settled)
 
-        # 确保网格在最底层，避免覆盖音频片段（修复“分离后音轨消失”）
-        self.timeline.tag_lower("grid")
+    def _on_resize_settled(self):
+        self._resize_job = None
+        self._draw_timeline()
 
-        self._draw_playhead_ui(self.player.current_time)
+    def _on_xview_changed(self, first, last):
+        """时间轴视图变化（滚动条、播放头跟随）：同步滚动条，空闲时补画新露出的刻度"""
+        self._h_scroll.set(first, last)
+        if self._viewport_job is None:
+            self._viewport_job = self.root.after_idle(self._update_viewport)
 
     def _create_transport_bar(self):
         bar = tk.Frame(self.root, bg=COLORS["panel"], height=80)
@@ -555,6 +952,8 @@ class ModernStudioApp:
         tk.Label(info_frame, text=" / ", bg=COLORS["panel"], fg=COLORS["text_dim"]).pack(side="left")
         self.lbl_total = tk.Label(info_frame, text="00:00.00", font=("Consolas", 12), bg=COLORS["panel"], fg=COLORS["text_dim"])
         self.lbl_total.pack(side="left", pady=(6,0))
+        self.lbl_frame = tk.Label(info_frame, text="", font=("Consolas", 9), bg=COLORS["panel"], fg=COLORS["text_dim"])
+        self.lbl_frame.pack(side="left", padx=(15, 0), pady=(6,0))
 
         self.status_label = tk.Label(self.root, text="就绪 - 请导入音频文件", bg=COLORS["bg"], fg=COLORS["text_dim"], font=("Segoe UI", 9), anchor="w")
         self.status_label.pack(side="bottom", fill="x", padx=5)
@@ -563,231 +962,473 @@ class ModernStudioApp:
         path = filedialog.askopenfilename(filetypes=[("音频文件", "*.wav *.mp3 *.flac *.ogg")])
         if not path: return
         self.file_path = path
+        self._load_gen += 1
         self.update_status("正在加载音频...")
-        threading.Thread(target=self._load_audio_thread, daemon=True).start()
+        threading.Thread(target=self._load_audio_thread, args=(path, self._load_gen), daemon=True).start()
 
-    def _load_audio_thread(self):
+    def _load_audio_thread(self, path, gen):
+        """分块解码：读出文件头就画出时间轴，之后每解码一段更新总览波形与已载入时长；
+        解码过程中即可从头试听（未解码的部分为静音）。WAV 走内存映射，其他格式用 torchaudio 顺序解码"""
         try:
-            if AI_AVAILABLE:
-                waveform, sr = torchaudio.load(self.file_path)
-                self.audio_data = waveform.numpy().T
-                self.sample_rate = sr
-            else:
-                sr, data = wavfile.read(self.file_path)
-                if data.dtype != np.float32:
-                    norm_factor = np.iinfo(data.dtype).max if data.dtype != np.float32 else 1.0
-                    data = data.astype(np.float32) / norm_factor
-                self.audio_data = data
-                self.sample_rate = sr
-            
-            self.duration = len(self.audio_data) / self.sample_rate
-            self.total_duration = max(60, self.duration + 5)
-            self.root.after(0, self._on_audio_loaded)
+            with TRACER.span("decode", path=path, mode="progressive"):
+                reader = AudioBlockReader(path)
+                sr, frames = reader.sr, reader.frames
+                # np.zeros 的页在写入时才真正分配；试听读到未解码的部分就是静音
+                buffer = np.zeros((frames, reader.channels), dtype=np.float32)
+                peaks = load_cached_peaks(path, frames)
+                builder = None if peaks is not None else PeakBuilder(reader.channels)
+                self.root.after(0, self._on_audio_opened, gen, buffer, sr, peaks)
+                last = time.perf_counter()
+                for start, block in reader.blocks(max(1, int(sr * DECODE_BLOCK_SECONDS))):
+                    if gen != self._load_gen:
+                        return  # 已经导入了其他文件
+                    done = start + len(block)
+                    buffer[start:done] = block
+                    if builder is not None:
+                        builder.feed(block)
+                    now = time.perf_counter()
+                    if done < frames and now - last >= DECODE_UPDATE_MS / 1000:
+                        last = now
+                        self.ui.post("decode", self._on_decode_progress, gen, done,
+                                     None if builder is None else builder.pyramid(sr))
+            if builder is not None:
+                peaks = builder.pyramid(sr)
+                save_peaks(peaks, path)
+
+            # 在后台线程按内容哈希查缓存，避免界面卡顿；命中的分轨以内存映射打开，不整段读入
+            try:
+                cached = self.engine.lookup_cache(buffer, sr, mmap=True)
+            except Exception as e:
+                print(f"⚠ 查询分轨缓存失败: {e}")
+                cached = None
+            self.root.after(0, self._on_audio_loaded, gen, buffer, peaks, cached)
         except Exception as e:
             self.root.after(0, lambda: messagebox.showerror("加载失败", str(e)))
 
-    def _on_audio_loaded(self):
-        # 载入新音频时，先清理旧片段（避免旧音轨残留/错乱）
+    def _on_audio_opened(self, gen, buffer, sr, peaks):
+        """文件头已读出：按完整时长画出时间轴，源音频立即可以试听"""
+        if gen != self._load_gen:
+            return
+        # 载入新音频时，先清理旧片段（避免旧音轨残留/错乱）；新音频开始新的工程
+        self.player.stop()
         self._clear_clips_ui()
+        self.project = None
+        self.audio_data = None  # 解码完成后才用于分离
+        self.cached_stems = None
+        self.sample_rate = sr
+        self.duration = len(buffer) / sr
+        self.total_duration = max(60, self.duration + 5)
+        self.peaks = peaks if peaks is not None else PeakBuilder(buffer.shape[1]).pyramid(sr)
+        # 试听片段走第一条轨道的通道条；有了分轨片段后不再参与混音
+        self._source_preview = [types.SimpleNamespace(audio_data=PagedAudio(buffer, sr), sample_rate=sr,
+                                                      start_time=0.0, muted=False, track_idx=0)]
+        self.player.mixer.invalidate()
 
         self._draw_waveform()
         self._draw_timeline()
+        self.btn_separate.config(state="disabled")
+        self.lbl_total.config(text=self._fmt_time(0))
+        self.update_status(f"正在加载: {os.path.basename(self.file_path)}（解码过程中即可从头播放）")
+
+    def _on_decode_progress(self, gen, done, peaks):
+        if gen != self._load_gen:
+            return
+        if peaks is not None:
+            self.peaks = peaks
+            self._draw_waveform()
+        self.lbl_total.config(text=self._fmt_time(done / self.sample_rate))
+        self.update_status(f"正在加载音频... {done / self.sample_rate / max(self.duration, 1e-9):.0%}")
+
+    def _on_audio_loaded(self, gen, buffer, peaks, cached):
+        if gen != self._load_gen:
+            return
+        self.ui.discard("decode")  # 还没执行的进度更新已经过时
+        self.audio_data = buffer
+        self.peaks = peaks
+        self.cached_stems = cached
+
+        self._draw_waveform()
         self.btn_separate.config(state="normal")
         self.lbl_total.config(text=self._fmt_time(self.duration))
 
-        # 若检测到已存在的分离结果（同级目录 *_vocals.wav 等），自动加载，避免每次都重新分离
+        # 若缓存中已有这段音频的分离结果，自动加载，避免每次都重新分离
         if self._try_load_existing_stems():
-            self.update_status("检测到已分离文件：已自动载入分轨（无需重新分离）")
+            self.update_status("检测到已分离结果：已自动载入分轨（无需重新分离）")
         else:
-            self.update_status(f"已加载: {os.path.basename(self.file_path)}")
-
+            self.update_status(f"已加载: {os.path.basename(self.file_path)}  {self._estimate_text()}")
+            # 很可能接着就要分离，提前在后台加载模型
+            self._warm_up_model()
 
+    def playback_clips(self):
+        """播放混音用的片段：有分轨片段时就是它们，否则试听源音频"""
+        return self.clips or self._source_preview
 
     def _clear_clips_ui(self):
         """清理当前工程里的片段与画布元素"""
         self.clips.clear()
+        self.on_clips_changed()
         if hasattr(self, "timeline") and self.timeline is not None:
             self.timeline.delete("clip")
 
-    def _load_wav_file_as_float(self, wav_path):
-        """读取 wav 并统一转为 float32 [-1, 1] 的双声道数组"""
-        sr, data = wavfile.read(wav_path)
-        if np.issubdtype(data.dtype, np.integer):
-            max_val = float(np.iinfo(data.dtype).max)
-            data = data.astype(np.float32) / max_val
-        else:
-            data = data.astype(np.float32)
-
-        # 统一为双声道
-        if data.ndim == 1:
-            data = np.column_stack((data, data))
-        elif data.ndim == 2 and data.shape[1] == 1:
-            data = np.column_stack((data[:, 0], data[:, 0]))
+    def on_clips_changed(self):
+        """片段增删、移动、静音后调用，让混音引擎在下一个块前重建区间索引"""
+        self.player.mixer.invalidate()
+        self._project_dirty = True
+        if self._playhead is not None:
+            self.timeline.tag_raise(self._playhead[1])  # 新建 / 拖动的片段不遮住播放头
+
+    # --- 工程文件 ---
+    def save_project(self):
+        initial = os.path.splitext(os.path.basename(self.file_path))[0] if self.file_path else "project"
+        path = filedialog.asksaveasfilename(defaultextension=PROJECT_EXT, initialfile=initial + PROJECT_EXT,
+                                            filetypes=[("工程文件", f"*{PROJECT_EXT}")])
+        if not path: return
+        self.project = ProjectStore(path, cache=self.engine.cache)
+        self._save_project_async(self.project, announce=True)
 
-        return sr, data
+    def _project_source(self):
+        return {"path": self.file_path, "sample_rate": self.sample_rate, "duration": self.duration,
+                "peaks": self.peaks}
 
-    def _try_load_existing_stems(self):
-        """若检测到同级目录已有分离结果，则自动载入（避免反复分离）"""
-        if not self.file_path:
-            return False
+    def _save_project_async(self, store, announce=False):
+        """在界面线程取片段快照，哈希与写盘放到后台线程；上一次保存未结束时跳过"""
+        if not self._saving.acquire(blocking=False):
+            return
+        self._project_dirty = False
+        source, clips, total = self._project_source(), list(self.clips), self.total_duration
+        tracks = self.player.bus.settings()
 
-        base = os.path.splitext(self.file_path)[0]
-        # 与保存逻辑保持一致：{base}_{stem}.wav
-        stem_order = ["vocals", "drums", "bass", "other"]
-        found = []
-        for stem in stem_order:
-            p = f"{base}_{stem}.wav"
-            if os.path.exists(p):
-                found.append((stem, p))
+        def work():
+            try:
+                store.save(source, clips, total, tracks)
+                if announce:
+                    self.root.after(0, lambda: self.update_status(f"工程已保存: {store.path}"))
+            except Exception as e:
+                self._project_dirty = True
+                print(f"⚠ 保存工程失败: {e}")
+                if announce:
+                    self.root.after(0, lambda: messagebox.showerror("保存失败", str(e)))
+            finally:
+                self._saving.release()
+        threading.Thread(target=work, daemon=True).start()
+
+    def _autosave(self):
+        """定时保存：只写新增的分轨哈希 / 峰值与变化的 JSON；从未保存过的工程写到 AUTOSAVE_DIR"""
+        self.root.after(AUTOSAVE_MS, self._autosave)
+        if not self._project_dirty or not self.clips:
+            return
+        if self.project is None:
+            name = os.path.splitext(os.path.basename(self.file_path))[0] if self.file_path else "untitled"
+            os.makedirs(AUTOSAVE_DIR, exist_ok=True)
+            self.project = ProjectStore(os.path.join(AUTOSAVE_DIR, name + PROJECT_EXT), cache=self.engine.cache)
+        self._save_project_async(self.project)
+
+    def open_project(self):
+        path = filedialog.askopenfilename(filetypes=[("工程文件", f"*{PROJECT_EXT}")])
+        if not path: return
+        self.update_status("正在打开工程...")
+        store = ProjectStore(path, cache=self.engine.cache)
 
-        if not found:
-            return False
+        def work():
+            try:
+                data = store.load()
+                self.root.after(0, lambda: self._on_project_loaded(store, data))
+            except Exception as e:
+                self.root.after(0, lambda: messagebox.showerror("打开工程失败", str(e)))
+        threading.Thread(target=work, daemon=True).start()
 
-        # 清理旧片段并重新加载
+    def _on_project_loaded(self, store, data):
+        """只用缓存的峰值画出总览与全部片段；源音频在分离时才解码，分轨在播放 / 导出读到时才映射"""
+        self.player.stop()
+        self._load_gen += 1
+        self._source_preview = []
         self._clear_clips_ui()
+        src = data["source"] or {}
+        self.project = store
+        self.file_path = src.get("path", "")
+        self.audio_data = None
+        self.cached_stems = None
+        self.sample_rate = src.get("sample_rate", 44100)
+        self.duration = src.get("duration", 0)
+        self.peaks = data["overview"]
+        self.total_duration = data["total_duration"]
+        self.player.bus.apply_settings(data["tracks"])
+        self._draw_track_headers()
 
-        max_dur = 0.0
-        loaded = []
+        if self.peaks is not None:
+            self._draw_waveform()
+        self._draw_timeline()
+        self.lbl_total.config(text=self._fmt_time(self.duration))
+        self.btn_separate.config(state="normal" if os.path.isfile(self.file_path) else "disabled")
+
+        for item in data["clips"]:
+            view = item["view"]
+            track_cfg = TRACK_CONFIG[min(item["track"], len(TRACK_CONFIG) - 1)]
+            self.clips.append(AudioClip(self.timeline, item["track"], 0, track_cfg["color"], item["name"],
+                                        view, view.sample_rate, self, peaks=item["peaks"],
+                                        start_time=item["start"], muted=item["muted"]))
+        self.on_clips_changed()
+        self._project_dirty = False
+        msg = f"已打开工程: {os.path.basename(store.path)}（{len(self.clips)} 个片段）"
+        if data["missing"]:
+            msg += f"，{len(data['missing'])} 个分轨文件缺失或已被修改"
+            print("⚠ 工程中缺失的分轨:\n  " + "\n  ".join(data["missing"]))
+        self.update_status(msg)
 
-        for stem, p in found:
-            try:
-                sr, audio = self._load_wav_file_as_float(p)
-            except Exception as e:
-                print(f"⚠ 读取分离文件失败: {p} -> {e}")
-                continue
+    def _load_wav_file_as_float(self, wav_path):
+        """以内存映射方式打开 wav；切片时才按需转为 float32 [-1, 1] 的双声道数据"""
+        audio = PagedAudio.open_wav(wav_path)
+        return audio.sample_rate, audio
 
-            dur = len(audio) / sr
-            max_dur = max(max_dur, dur)
-            loaded.append((stem, sr, audio))
+    def _try_load_existing_stems(self):
+        """载入已有分离结果：优先按音频内容命中缓存；否则回退到比源文件更新的同级分轨文件"""
+        if not self.file_path:
+            return False
+
+        if self.cached_stems is not None:
+            stems, sr = self.cached_stems
+            loaded = [(stem, sr, PagedAudio(audio, sr)) for stem, audio in stems.items()]
+        else:
+            loaded = self._load_sidecar_stems()
 
         if not loaded:
             return False
 
+        # 清理旧片段并重新加载
+        self._clear_clips_ui()
+        max_dur = max(len(audio) / sr for _, sr, audio in loaded)
+
         # 需要更长时间轴时，扩展并重绘
         if max_dur + 5 > self.total_duration:
             self.total_duration = max(60, max_dur + 5)
             self._draw_timeline()
 
-        idx_map = {"vocals": 0, "drums": 1, "bass": 2, "other": 3}
         for stem, sr, audio in loaded:
-            self._add_clip_safe(audio, sr, stem, idx_map.get(stem, 0))
+            self._add_clip_safe(audio, sr, stem, 0)
 
         return True
 
-    def _draw_waveform(self):
+    def _load_sidecar_stems(self):
+        """旧版结果：同级目录 {base}_{stem}.wav，仅当比源文件新时才视为有效（源文件编辑后不再误用）"""
+        base = os.path.splitext(self.file_path)[0]
+        src_mtime = os.path.getmtime(self.file_path)
+        loaded = []
+        # 只载入当前分轨选择中的分轨
+        for stem in stem_selection(self.engine.stems) or STEM_ORDER[:4]:
+            p = f"{base}_{stem}.wav"
+            if not os.path.exists(p) or os.path.getmtime(p) < src_mtime:
+                continue
+            try:
+                sr, audio = self._load_wav_file_as_float(p)
+            except Exception as e:
+                print(f"⚠ 读取分离文件失败: {p} -> {e}")
+                continue
+            loaded.append((stem, sr, audio))
+        return loaded
+
+    def _draw_waveform(self, start_time=0.0, end_time=None):
+        """从峰值金字塔取与画布宽度相同列数的 min/max/RMS 包络，耗时只与像素数有关"""
+        if self.ax is None: return  # 画布就绪后会补画
         self.ax.clear()
-        step = max(1, len(self.audio_data) // 8000)
-        data = self.audio_data[::step]
-        x = np.linspace(0, self.duration, len(data))
-        
-        if len(data.shape) > 1:
-            self.ax.fill_between(x, data[:,0], alpha=0.8, color=COLORS["accent"], label="L")
-            self.ax.fill_between(x, data[:,1], alpha=0.4, color="#ffffff", label="R")
-        else:
-            self.ax.fill_between(x, data, alpha=0.8, color=COLORS["accent"])
-            
+        end_time = self.duration if end_time is None else end_time
+        sr = self.sample_rate
+        cols = max(100, int(self.fig.bbox.width))
+        mins, maxs, rms = self.peaks.envelope(int(start_time * sr), int(end_time * sr), cols)
+        x = np.linspace(start_time, end_time, cols)
+
+        styles = [(COLORS["accent"], 0.8, "L"), ("#ffffff", 0.4, "R")]
+        for ch in range(min(2, mins.shape[1])):
+            color, alpha, label = styles[ch]
+            self.ax.fill_between(x, mins[:, ch], maxs[:, ch], alpha=alpha, color=color, label=label, linewidth=0)
+            self.ax.fill_between(x, -rms[:, ch], rms[:, ch], alpha=alpha, color=color, linewidth=0)
+
         self._setup_ax_style(show_text=False)
-        self.ax.set_xlim(0, self.duration)
+        self.ax.set_xlim(start_time, end_time)
+
+    def _estimate_text(self):
+        """按 calibrate 保存的实时率估计当前音频的分离耗时"""
+        if not self.duration or ai_state() == AI_UNAVAILABLE:
+            return ""
+        preset = self.engine.preset
+        seconds = estimate_seconds(self.engine.model_name, preset, self.duration)
+        if seconds is None:
+            return f"[{PRESET_LABELS[preset]}：未校准，运行 calibrate 后可预估耗时]"
+        return f"[{PRESET_LABELS[preset]}：预计约 {self._fmt_time(seconds)}]"
+
+    def _on_preset_changed(self):
+        self.engine.preset = self.var_preset.get()
+        self.update_status(f"分离预设: {PRESET_LABELS[self.engine.preset]}  {self._estimate_text()}")
+
+    def _on_stems_changed(self):
+        # 两轨模式只生成、写出并载入人声与伴奏；缓存按分轨选择分别存放，换了选择要重新查缓存
+        self.engine.stems = self.var_stems.get()
+        self.update_status(f"分离输出: {STEM_MODE_LABELS[self.engine.stems]}")
+        if self.audio_data is not None:
+            threading.Thread(target=self._recheck_cache_thread,
+                             args=(self.audio_data, self.sample_rate, self._load_gen, self.engine.stems),
+                             daemon=True).start()
+
+    def _recheck_cache_thread(self, buffer, sr, gen, stems):
+        """在后台线程按新的分轨选择查缓存（要对整段音频求哈希）"""
+        try:
+            cached = self.engine.lookup_cache(buffer, sr, mmap=True)
+        except Exception as e:
+            print(f"⚠ 查询分轨缓存失败: {e}")
+            cached = None
+        self.root.after(0, self._on_cache_rechecked, gen, stems, cached)
+
+    def _on_cache_rechecked(self, gen, stems, cached):
+        if gen != self._load_gen or stems != self.engine.stems:
+            return  # 已经导入了其他文件，或者选择又变了
+        self.cached_stems = cached
+        # 命中时直接换成缓存的分轨；未命中时保留现有片段，分离时按新选择运行
+        if cached is not None and self._try_load_existing_stems():
+            self.update_status(f"分离输出: {STEM_MODE_LABELS[stems]}（已从缓存载入分轨）")
 
     def run_separation(self):
         self.btn_separate.config(state="disabled", text="⏳ 处理中...")
-        self.update_status("正在分离中 (这也将保存分轨文件到本地)...")
+        self.update_status(f"正在分离中 (这也将保存分轨文件到本地)... {self._estimate_text()}")
         threading.Thread(target=self._separation_thread, daemon=True).start()
 
     def _separation_thread(self):
+        mark = TRACER.mark()
         try:
-            if AI_AVAILABLE: self._separate_demucs()
-            else: self._separate_basic()
+            self._separate_stems()
+            self.trace_summary = summary_line(TRACER.since(mark))
             self.root.after(0, self._on_sep_done)
         except Exception as e:
             self.root.after(0, lambda: messagebox.showerror("错误", str(e)))
             self.root.after(0, lambda: self.btn_separate.config(state="normal", text="⚡ 开始分离"))
 
-    def _separate_demucs(self):
-        if self.demucs_model is None:
-            self.demucs_model = get_model("htdemucs")
-            
-        waveform, sr = torchaudio.load(self.file_path)
-        if sr != self.demucs_model.samplerate:
-            waveform = torchaudio.transforms.Resample(sr, self.demucs_model.samplerate)(waveform)
-        if waveform.shape[0] == 1: waveform = waveform.repeat(2, 1)
-        
-        ref = waveform.mean(0)
-        waveform = (waveform - ref.mean()) / ref.std()
-        
-        with torch.no_grad():
-            sources = apply_model(self.demucs_model, waveform[None], progress=True)[0]
-            
-        sources = sources * ref.std() + ref.mean()
-        source_names = ["drums", "bass", "other", "vocals"]
-        
-        self.root.after(0, self.clips.clear)
-        self.root.after(0, lambda: self.timeline.delete("clip"))
-
-        # --- 恢复的功能：保存文件 ---
-        base_name = os.path.splitext(self.file_path)[0]
-
-        for i, name in enumerate(source_names):
-            audio = sources[i].cpu().numpy().T
-            
-            # 保存文件 (float32 -> int16)
-            save_path = f"{base_name}_{name}.wav"
-            # 简单的防止爆音限制
-            max_val = np.max(np.abs(audio))
-            if max_val > 0.99:
-                 audio_norm = audio / max_val * 0.99
-            else:
-                 audio_norm = audio
-            
-            wavfile.write(save_path, self.demucs_model.samplerate, (audio_norm * 32767).astype(np.int16))
-            print(f"已保存: {save_path}")
-
-            self._add_clip_safe(audio, self.demucs_model.samplerate, name, i)
-
-    def _separate_basic(self):
-        data = self.audio_data
-        if len(data.shape) == 1: data = np.column_stack((data, data))
-        
-        nyq = 0.5 * self.sample_rate
-        def get_filter(cutoff, btype):
-            b, a = butter(4, cutoff/nyq, btype=btype)
-            return lfilter(b, a, data, axis=0)
-
-        stems = {
-            "bass": get_filter(200, 'low'),
-            "drums": get_filter(2000, 'low') - get_filter(200, 'low'),
-            "vocals": get_filter(2000, 'high')
-        }
-        
-        self.root.after(0, self.clips.clear)
-        self.root.after(0, lambda: self.timeline.delete("clip"))
-        
-        # --- 保存文件 ---
-        base_name = os.path.splitext(self.file_path)[0]
+    def _separate_stems(self):
+        # 守护进程在运行时交给它（模型常驻其中），界面只是瘦客户端
+        if daemon_available():
+            return self._separate_via_daemon()
+
+        if self.audio_data is None:
+            # 从工程打开时源音频尚未解码
+            self.audio_data, self.sample_rate = load_audio(self.file_path)
+
+        # 引擎内部先查内容缓存，命中时不运行模型
+        stems, sr = self.engine.separate(self.audio_data, self.sample_rate, progress=True)
+
+        self.root.after(0, self._clear_clips_ui)
+
+        # --- 保存文件：在写线程池上后台进行，片段优先由缓存映射创建，不等写盘 ---
+        written = self.exporter.bytes_written
+        start = time.perf_counter()
+        futures = self.exporter.export_stems(self.file_path, stems, sr)
+        buffers = self._open_stem_buffers(list(stems), futures, sr, arrays=stems)
+        for i, (name, audio) in enumerate(buffers):
+            self._add_clip_safe(audio, sr, name, i)
+        for f in futures:
+            f.result()
+        del stems
+        size = self.exporter.bytes_written - written
+        self.export_summary = f"导出 {size / 1e6:.1f} MB，{size / 1e6 / max(time.perf_counter() - start, 1e-9):.0f} MB/s"
+
+    def _on_export_options(self):
+        self.exporter.fmt = self.var_format.get()
+        self.exporter.dither = self.var_dither.get()
+
+    def run_bounce(self):
+        """把当前片段排布（位置、静音、编辑后的视图）离线渲染成一个文件，使用工具栏的导出格式"""
+        if not any(not c.muted for c in self.clips):
+            self.update_status("时间轴上没有可导出的片段")
+            return
+        fmt = self.var_format.get()
+        ext = EXPORT_FORMATS[fmt][0]
+        base = os.path.splitext(os.path.basename(self.file_path))[0] if self.file_path else "mix"
+        path = filedialog.asksaveasfilename(defaultextension=ext, initialfile=f"{base}_mix{ext}",
+                                            filetypes=[(fmt, f"*{ext}")])
+        if not path: return
+        self.btn_bounce.config(state="disabled")
+        self.update_status("正在导出混音...")
+        threading.Thread(target=self._bounce_thread, args=(list(self.clips), path, fmt), daemon=True).start()
 
-        for i, (name, audio) in enumerate(stems.items()):
-            save_path = f"{base_name}_{name}.wav"
-            max_val = np.max(np.abs(audio))
-            if max_val > 0.99: audio = audio / max_val * 0.99
-            wavfile.write(save_path, self.sample_rate, (audio * 32767).astype(np.int16))
-            
-            self._add_clip_safe(audio, self.sample_rate, name, i)
+    def _bounce_thread(self, clips, path, fmt):
+        def on_progress(frac):
+            self.ui.post("status", self.update_status, f"正在导出混音... {frac:.0%}")
+        try:
+            result = bounce(clips, path, clips[0].sample_rate, fmt=fmt, dither=self.var_dither.get(),
+                            on_progress=on_progress, bus=self.player.bus)
+            msg = (f"混音已导出: {os.path.basename(path)}（{self._fmt_time(result['seconds'])}，"
+                   f"{result['realtime']:.0f} 倍实时）")
+            self.ui.post("status", self.update_status, msg)
+        except Exception as e:
+            self.root.after(0, lambda: messagebox.showerror("导出失败", str(e)))
+        finally:
+            self.root.after(0, lambda: self.btn_bounce.config(state="normal"))
+
+    def _separate_via_daemon(self):
+        self.export_summary = ""
+        def on_event(e):
+            if e["event"] == "queued":
+                msg = f"已提交到分离守护进程（队列第 {e['position']} 位）"
+            elif e["event"] == "progress":
+                msg = f"守护进程分离中... {e['fraction']:.0%}"
+            else:
+                return
+            self.ui.post("status", self.update_status, msg)
+
+        # 界面发起的任务优先于命令行批量提交
+        final = DaemonClient().submit(self.file_path, model=self.engine.model_name, priority=10,
+                                      preset=self.engine.preset, stems=self.engine.stems, on_event=on_event)
+        if final["event"] == "error":
+            raise RuntimeError(f"守护进程分离失败: {final['message']}")
+
+        self.root.after(0, self._clear_clips_ui)
+        buffers = self._open_stem_buffers(final["stems"], final["outputs"], final["sr"], final.get("cache_key") or "")
+        for i, (name, audio) in enumerate(buffers):
+            self._add_clip_safe(audio, final["sr"], name, i)
+
+    def _open_stem_buffers(self, names, outputs, sr, cache_key=None, arrays=None):
+        """优先映射缓存中的 float32 分轨，没有缓存时映射写出的 WAV（outputs 可以是导出 Future）；
+        其他格式无法映射，直接使用内存中的分离结果"""
+        cached = None
+        if cache_key is None:
+            cache_key = self.engine.last_cache_key
+        if self.engine.cache is not None and cache_key:
+            cached = self.engine.cache.load(cache_key, mmap=True)
+        if cached is not None:
+            stems, sr = cached
+            return [(name, PagedAudio(stems[name], sr)) for name in names]
+        buffers = []
+        for name, out in zip(names, outputs):
+            path = out.result() if hasattr(out, "result") else out
+            if path.endswith(".wav") or arrays is None:
+                buffers.append((name, PagedAudio.open_wav(path)))
+            else:
+                buffers.append((name, PagedAudio(arrays[name], sr)))
+        return buffers
 
     def _add_clip_safe(self, audio, sr, name, idx):
         duration = len(audio) / sr
-        track_map = {"vocals":0, "drums":1, "bass":2, "other":3}
+        # 伴奏放在 OTHER 轨道
+        track_map = {"vocals":0, "drums":1, "bass":2, "other":3, "accompaniment":3}
         mapped_idx = track_map.get(name.lower().split()[0], idx)
         track_cfg = TRACK_CONFIG[min(mapped_idx, len(TRACK_CONFIG)-1)]
         
-        self.root.after(0, lambda: self.clips.append(
-            AudioClip(self.timeline, mapped_idx, duration, track_cfg["color"], 
-                     name.upper(), audio, sr, self)
+        # 峰值在调用线程中读取 / 计算，并缓存到分轨文件旁
+        peaks = load_or_build_peaks(audio, sr, getattr(audio, "path", None))
+
+        self.root.after(0, lambda: self._append_clip(
+            AudioClip(self.timeline, mapped_idx, duration, track_cfg["color"],
+                     name.upper(), audio, sr, self, peaks=peaks)
         ))
 
+    def _append_clip(self, clip):
+        self.clips.append(clip)
+        self.on_clips_changed()
+
     def _on_sep_done(self):
+        self._refresh_ai_status()
         self.btn_separate.config(state="normal", text="⚡ 开始分离")
-        self.update_status("分离完成！分轨文件已保存在原目录。")
-        messagebox.showinfo("完成", "音轨分离已完成。\n\nwav文件已保存在源音频同级目录下。")
+        summary = f"（{self.export_summary}）" if self.export_summary else ""
+        if self.trace_summary:
+            summary += f" {self.trace_summary}"
+        self.update_status(f"分离完成！分轨文件已保存在原目录。{summary}")
+        messagebox.showinfo("完成", "音轨分离已完成。\n\n分轨文件已保存在源音频同级目录下。")
 
     def play_pause(self):
         if self.player.playing:
@@ -812,6 +1453,10 @@ class ModernStudioApp:
     def on_playback_stopped(self):
         self.btn_play.config(text="▶")
         self.update_playhead_ui(0)
+        if TRACER.enabled:
+            s = self.player.playback_stats()
+            self.update_status(f"播放: {s['blocks']} 块，混音平均 {s['mix_us_avg']:.0f} µs/块"
+                               f"（最大 {s['mix_us_max']:.0f} µs），欠载 {s['underruns']} / 设备 {s['device_underflows']}")
 
     def rewind(self):
         t = max(0, self.player.current_time - 5)
@@ -848,17 +1493,29 @@ class ModernStudioApp:
         self.scrubbing = False
 
     def update_playhead_ui(self, t):
-        self.lbl_time.config(text=self._fmt_time(t))
+        self.ui.discard("playhead")
+        text = self._fmt_time(t)
+        if text != self._time_text:
+            self._time_text = text
+            self.lbl_time.config(text=text)
         self._draw_playhead_ui(t)
 
     def _draw_playhead_ui(self, t):
-        self.timeline.delete("playhead")
-        self.time_ruler.delete("playhead")
+        """播放头图元只创建一次，之后用 coords 移动；位置没变时不碰画布"""
         x = t * PX_PER_SEC
         h = len(TRACK_CONFIG) * TRACK_HEIGHT
-        self.time_ruler.create_polygon(x-6, RULER_HEIGHT-12, x+6, RULER_HEIGHT-12, x, RULER_HEIGHT-1, fill=COLORS["playhead"], tags="playhead")
-        self.timeline.create_line(x, 0, x, h, fill=COLORS["playhead"], width=2, tags="playhead")
-        
+        if self._playhead is None:
+            self._playhead = (
+                self.time_ruler.create_polygon(x-6, RULER_HEIGHT-12, x+6, RULER_HEIGHT-12, x, RULER_HEIGHT-1, fill=COLORS["playhead"], tags="playhead"),
+                self.timeline.create_line(x, 0, x, h, fill=COLORS["playhead"], width=2, tags="playhead"))
+        elif x != self._playhead_x:
+            marker, line = self._playhead
+            self.time_ruler.coords(marker, x-6, RULER_HEIGHT-12, x+6, RULER_HEIGHT-12, x, RULER_HEIGHT-1)
+            self.timeline.coords(line, x, 0, x, h)
+        else:
+            return
+        self._playhead_x = x
+
         view_left = self.timeline.canvasx(0)
         view_width = self.timeline.winfo_width()
         if x > view_left + view_width - 50 or x < view_left:
@@ -866,12 +1523,26 @@ class ModernStudioApp:
             self.timeline.xview_moveto(pos)
             self.time_ruler.xview_moveto(pos)
 
+    def _show_frame_time(self):
+        """在播放栏显示 UI 帧时间（每帧处理合并后的更新的耗时）与主总线限幅器的压低量"""
+        self.root.after(FRAME_STATS_MS, self._show_frame_time)
+        s = self.ui.stats()
+        if s["frames"]:
+            text = f"UI {s['frame_ms']:.1f} ms（最大 {s['frame_max_ms']:.1f}）"
+            limiter = self.player.bus.limiter
+            if self.player.playing and limiter is not None and limiter.reduction < 0.999:
+                text += f"  限幅 {20 * np.log10(max(limiter.reduction, 1e-6)):.1f} dB"
+            self.lbl_frame.config(text=text)
+            if TRACER.enabled:
+                TRACER.counter("ui", **s)
+
     def _fmt_time(self, s):
         m = int(s // 60)
         sec = s % 60
         return f"{m:02d}:{sec:05.2f}"
 
     def update_status(self, text):
+        self.ui.discard("status")  # 直接设置的状态优先于尚未刷新的进度
         self.status_label.config(text=f" {text}")
 
     def _on_scroll(self, *args):
@@ -880,15 +1551,202 @@ class ModernStudioApp:
 
     def on_close(self):
         self.player.cleanup()
+        TRACER.close()
         self.root.destroy()
         os._exit(0)
 
-if __name__ == "__main__":
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="人声音频分离工作站（无参数时启动图形界面）")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="启动界面并打印各阶段耗时（窗口显示、绘图库、模型库就绪），随后退出")
+    parser.add_argument("--trace", metavar="LOG", default=None,
+                        help="记录分离各阶段的耗时 / CPU / 峰值内存，逐行写入 JSON 日志")
+    parser.add_argument("--trace-chrome", metavar="JSON", default=None,
+                        help="退出时把阶段记录导出为 Chrome trace（chrome://tracing / Perfetto）")
+    sub = parser.add_subparsers(dest="command")
+
+    batch = sub.add_parser("batch", help="无界面批量分离目录或通配符匹配的音频文件")
+    batch.add_argument("inputs", nargs="+", help="音频文件、目录或通配符，例如 \"music/**/*.mp3\"")
+    batch.add_argument("-j", "--workers", type=int, default=1, help="工作进程数（每个进程常驻一个模型）")
+    batch.add_argument("-t", "--threads", type=int, default=None, help="每个进程的 torch 线程数（默认均分 CPU 核心）")
+    batch.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Demucs 模型名称")
+    batch.add_argument("-r", "--recursive", action="store_true", help="递归搜索子目录 / 支持 ** 通配符")
+    batch.add_argument("--basic", action="store_true", help="强制使用基础频段分离（不加载大模型）")
+    batch.add_argument("-q", "--preset", default=DEFAULT_PRESET, choices=list(PRESETS),
+                       help="速度 / 质量预设（segment、overlap、shifts、线程数）")
+    batch.add_argument("--backend", default=DEFAULT_BACKEND, choices=(DEFAULT_BACKEND,) + BACKENDS,
+                       help="CPU 推理后端（auto：用 backends 命令记下的选择，没有时用 fp32）")
+    batch.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="分轨缓存目录（可被多个进程共享）")
+    batch.add_argument("--cache-size", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3, help="缓存容量上限 (GB)，超出按 LRU 淘汰")
+    batch.add_argument("--no-cache", action="store_true", help="不读写分轨缓存")
+    batch.add_argument("--stream", action="store_true", help="流式分离：按窗口处理长录音，内存占用与文件长度无关")
+    batch.add_argument("--stream-window", type=float, default=120.0, help="流式分离的窗口长度（秒）")
+    batch.add_argument("-f", "--format", default=DEFAULT_EXPORT_FORMAT, choices=list(EXPORT_FORMATS),
+                       help="分轨导出格式（flac 需要 soundfile）")
+    batch.add_argument("--dither", action="store_true", help="整型格式导出时加 TPDF 抖动")
+    batch.add_argument("-b", "--batch-size", type=int, default=1,
+                       help="跨文件分段批处理：每次前向的分段数，同时也是每组的文件数（适合大量短文件，1 为逐个文件）")
+    batch.add_argument("-s", "--stems", nargs="+", default=[DEFAULT_STEMS],
+                       help="输出哪些分轨：all、2stems（人声 + 伴奏）或分轨名列表，例如 -s vocals accompaniment")
+
+    daemon = sub.add_parser("daemon", help="启动常驻模型的本地分离守护进程（Unix 域套接字）")
+    daemon.add_argument("--socket", default=DEFAULT_SOCKET, help="套接字路径")
+    daemon.add_argument("-j", "--workers", type=int, default=1, help="同时执行的任务数（每个工作线程常驻一份模型）")
+    daemon.add_argument("-t", "--threads", type=int, default=None, help="torch 线程数")
+    daemon.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="分轨缓存目录")
+    daemon.add_argument("--cache-size", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3, help="缓存容量上限 (GB)")
+    daemon.add_argument("--no-cache", action="store_true", help="不读写分轨缓存")
+    daemon.add_argument("--fake", action="store_true", help="使用不加载模型的测试后端（调试协议与调度）")
+    daemon.add_argument("--backend", default=DEFAULT_BACKEND, choices=(DEFAULT_BACKEND,) + BACKENDS,
+                        help="CPU 推理后端")
+
+    submit = sub.add_parser("submit", help="把文件提交给正在运行的分离守护进程")
+    submit.add_argument("inputs", nargs="+", help="音频文件、目录或通配符")
+    submit.add_argument("--socket", default=DEFAULT_SOCKET, help="守护进程的套接字路径")
+    submit.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Demucs 模型名称")
+    submit.add_argument("-s", "--stems", nargs="+", default=None,
+                        help="只输出这些分轨，例如 -s vocals；-s 2stems 为人声 + 伴奏两轨")
+    submit.add_argument("-p", "--priority", type=int, default=0, help="优先级，数值越大越先执行")
+    submit.add_argument("-r", "--recursive", action="store_true", help="递归搜索子目录 / 支持 ** 通配符")
+    submit.add_argument("--basic", action="store_true", help="使用基础频段分离")
+    submit.add_argument("-q", "--preset", default=DEFAULT_PRESET, choices=list(PRESETS), help="速度 / 质量预设")
+
+    render = sub.add_parser("render", help="把工程文件的片段排布离线渲染为一个音频文件")
+    render.add_argument("project", help=f"工程文件（{PROJECT_EXT}）")
+    render.add_argument("-o", "--output", required=True, help="输出文件")
+    render.add_argument("--start", type=float, default=0.0, help="起始时间（秒）")
+    render.add_argument("--end", type=float, default=None, help="结束时间（秒，默认到最后一个片段结尾）")
+    render.add_argument("-f", "--format", default=DEFAULT_EXPORT_FORMAT, choices=list(EXPORT_FORMATS),
+                        help="导出格式（flac 需要 soundfile）")
+    render.add_argument("--dither", action="store_true", help="整型格式导出时加 TPDF 抖动")
+    render.add_argument("-j", "--workers", type=int, default=None, help="渲染线程数")
+
+    calibrate = sub.add_parser("calibrate", help="测量各预设在本机的实时率并保存，用于预估分离耗时")
+    calibrate.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Demucs 模型名称")
+    calibrate.add_argument("-q", "--presets", nargs="+", default=None, choices=list(PRESETS), help="只校准这些预设")
+    calibrate.add_argument("--seconds", type=float, default=30.0, help="测试音频长度（秒）")
+    calibrate.add_argument("--input", default=None, help="用这个音频文件（截取开头）代替合成音频")
+    calibrate.add_argument("-t", "--threads", type=int, default=None, help="torch 线程数")
+
+    backends = sub.add_parser("backends", help="对比各 CPU 推理后端与 fp32 的速度和最大偏差，并记住 auto 的选择")
+    backends.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Demucs 模型名称")
+    backends.add_argument("--seconds", type=float, default=8.0, help="测试音频长度（秒）")
+    backends.add_argument("--tolerance", type=float, default=None, help="允许的最大绝对偏差")
+    backends.add_argument("-t", "--threads", type=int, default=None, help="torch 线程数")
+    return parser
+
+
+class StartupProfile:
+    """--profile-startup：记录启动各阶段距离进程开始导入本模块的时间"""
+
+    def __init__(self, t0):
+        self.t0 = t0
+        self.marks = []
+        self.lock = threading.Lock()
+
+    def mark(self, stage, t=None):
+        with self.lock:
+            self.marks.append((stage, (t or time.perf_counter()) - self.t0))
+
+    def report(self):
+        print("启动耗时（自模块导入开始）:")
+        prev = 0.0
+        for stage, t in sorted(self.marks, key=lambda m: m[1]):
+            print(f"  {stage:<12} {t * 1000:8.0f} ms  (+{(t - prev) * 1000:.0f} ms)")
+            prev = t
+        sys.stdout.flush()
+
+
+def run_gui(profile_startup=False):
     try:
         from ctypes import windll
         windll.shcore.SetProcessDpiAwareness(1)
     except: pass
 
+    profile = None
+    if profile_startup:
+        profile = StartupProfile(_STARTUP_T0)
+        profile.mark("模块导入完成", _STARTUP_IMPORTS_DONE)
+
     root = tk.Tk()
-    app = ModernStudioApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = ModernStudioApp(root, profile=profile)
+    app._mark("界面构建完成")
+    root.mainloop()
+
+
+def render_project(args):
+    """render 子命令：分轨只在渲染读到时才映射"""
+    data = ProjectStore(args.project).load()
+    for path in data["missing"]:
+        print(f"⚠ 分轨缺失或已被修改，跳过: {path}")
+    clips = [types.SimpleNamespace(audio_data=c["view"], muted=c["muted"], start_time=c["start"],
+                                   track_idx=c["track"], sample_rate=c["view"].sample_rate) for c in data["clips"]]
+    if not clips:
+        print("工程中没有可渲染的片段")
+        return 1
+    bus = TrackBus([t["name"] for t in TRACK_CONFIG], clips[0].sample_rate)
+    bus.apply_settings(data["tracks"])
+    result = bounce(clips, args.output, clips[0].sample_rate, args.start, args.end, fmt=args.format,
+                    dither=args.dither, workers=args.workers, bus=bus)
+    print(f"已导出: {result['path']}（{result['seconds']:.1f}s 音频，耗时 {result['wall']:.2f}s，"
+          f"{result['realtime']:.0f} 倍实时）")
+    return 0
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.trace or args.trace_chrome:
+        TRACER.enable(args.trace, args.trace_chrome)
+    try:
+        return _run_command(args)
+    finally:
+        TRACER.close()
+
+
+def _run_command(args):
+    if args.command == "batch":
+        from batch_separation import run_batch
+        if args.format not in available_formats():
+            print(f"导出 {args.format} 需要安装 soundfile: pip install soundfile")
+            return 2
+        summary = run_batch(args.inputs, workers=args.workers, threads=args.threads,
+                            model_name=args.model, use_ai=not args.basic, recursive=args.recursive,
+                            cache_dir=None if args.no_cache else args.cache_dir,
+                            cache_bytes=int(args.cache_size * 1024 ** 3),
+                            stream_window=args.stream_window if args.stream else None,
+                            export_format=args.format, dither=args.dither, preset=args.preset,
+                            backend=args.backend, batch_size=args.batch_size, stems=args.stems)
+        return 1 if summary["failed"] else 0
+    if args.command == "daemon":
+        from separation_daemon import serve
+        serve(args.socket, workers=args.workers, threads=args.threads,
+              cache_dir=None if args.no_cache else args.cache_dir,
+              cache_bytes=int(args.cache_size * 1024 ** 3), fake=args.fake, inference_backend=args.backend)
+        return 0
+    if args.command == "submit":
+        from separation_daemon import submit_files
+        summary = submit_files(args.inputs, args.socket, model_name=args.model, stems=args.stems,
+                               priority=args.priority, basic=args.basic, recursive=args.recursive,
+                               preset=args.preset)
+        return 1 if summary["failed"] else 0
+    if args.command == "render":
+        return render_project(args)
+    if args.command == "calibrate":
+        from presets import calibrate
+        calibrate(args.model, args.presets, seconds=args.seconds, input_path=args.input, threads=args.threads)
+        return 0
+    if args.command == "backends":
+        from inference_backends import DEFAULT_TOLERANCE, select_backend
+        engine = SeparationEngine(args.model, num_threads=args.threads)
+        if not engine.use_ai:
+            print("模型库不可用，没有可对比的推理后端")
+            return 1
+        select_backend(engine.load_model(), args.model, seconds=args.seconds,
+                       tolerance=args.tolerance or DEFAULT_TOLERANCE)
+        return 0
+    run_gui(profile_startup=args.profile_startup)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+本地分离守护进程
+常驻模型，通过 Unix 域套接字接收分离任务，按优先级排队、在有限的工作线程池上执行，
+并把排队 / 开始 / 进度 / 完成事件逐行推送回客户端。图形界面与命令行只是它的瘦客户端。
+
+协议：每个连接发送一行 JSON 请求，守护进程回复若干行 JSON 事件，以 done / error 结束
+    {"op": "submit", "path": ..., "model": "htdemucs", "stems": ["vocals"], "priority": 0, "basic": false,
+     "preset": "standard"}
+    stems 可以是分轨名列表（可含 accompaniment），也可以是模式名 "all" / "2stems"（人声 + 伴奏）
+    {"op": "status"} / {"op": "ping"} / {"op": "shutdown"}
+
+FakeBackend 不加载权重、不读写文件，可用来测试协议与调度。
+"""
+import heapq
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from inference_backends import DEFAULT_BACKEND
+from presets import DEFAULT_PRESET, preset_params
+from separation_engine import DEFAULT_MODEL, DEFAULT_STEMS, SeparationEngine, stem_path, stem_selection
+from stem_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, StemCache
+
+UNIX_SOCKETS = hasattr(socket, "AF_UNIX")
+DEFAULT_SOCKET = os.environ.get("SEPARATION_STUDIO_SOCKET") or os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "separation-studio"),
+    "separation-studio.sock")
+
+TERMINAL_EVENTS = ("done", "error")
+
+
+class Job:
+    """一个分离任务；事件经 events 队列交给发起它的连接"""
+
+    def __init__(self, job_id, path, model=DEFAULT_MODEL, stems=None, priority=0, basic=False,
+                 preset=DEFAULT_PRESET):
+        self.id = job_id
+        self.path = path
+        self.model = model
+        self.preset = preset
+        self.stems = stems
+        self.priority = priority
+        self.basic = basic
+        self.events = queue.Queue()
+        self.cancelled = False
+        self.submitted = time.time()
+
+    def emit(self, event, **fields):
+        fields.update(event=event, job=self.id)
+        self.events.put(fields)
+
+
+class EngineBackend:
+    """真实后端：每个工作线程按模型名常驻各自的 SeparationEngine，共享同一个分轨缓存"""
+
+    def __init__(self, threads=None, cache_dir=DEFAULT_CACHE_DIR, cache_bytes=DEFAULT_MAX_BYTES,
+                 inference_backend=DEFAULT_BACKEND):
+        self.threads = threads
+        self.inference_backend = inference_backend
+        self.cache = StemCache(cache_dir, cache_bytes) if cache_dir else None
+        self._local = threading.local()
+        self._loaded = set()
+
+    def models(self):
+        return sorted(self._loaded)
+
+    def _engine(self, model, basic):
+        engines = getattr(self._local, "engines", None)
+        if engines is None:
+            engines = self._local.engines = {}
+        key = "basic" if basic else model
+        if key not in engines:
+            engines[key] = SeparationEngine(model, use_ai=not basic, num_threads=self.threads, cache=self.cache,
+                                            backend=self.inference_backend)
+            self._loaded.add(key)
+        return engines[key]
+
+    def run(self, job, progress):
+        engine = self._engine(job.model, job.basic)
+        engine.preset = job.preset  # 引擎属于当前工作线程，按任务切换预设与分轨选择
+        engine.stems = job.stems or DEFAULT_STEMS
+        if engine.use_ai:
+            progress(0.0, "loading")
+            engine.load_model()
+        progress(0.0, "separating")
+        # 未选中的分轨在引擎内就不会复制出来，也不写盘
+        stems, sr = engine.separate_file(job.path, on_progress=lambda f: progress(f, "separating"))
+        progress(1.0, "saving")
+        outputs = engine.save_stems(job.path, stems, sr, log=lambda msg: None)
+        return {"outputs": outputs, "stems": list(stems), "sr": sr,
+                "audio_seconds": len(next(iter(stems.values()))) / sr if stems else 0.0,
+                "cache_hit": engine.last_cache_hit, "cache_key": engine.last_cache_key}
+
+
+class FakeBackend:
+    """测试用后端：按固定节奏上报进度，返回将会写出的分轨路径，不加载模型也不读写文件"""
+
+    STEMS = ["vocals", "drums", "bass", "other"]
+
+    def __init__(self, steps=4, delay=0.01, fail_paths=()):
+        self.steps = steps
+        self.delay = delay
+        self.fail_paths = set(fail_paths)
+        self.seen = []  # 实际执行顺序，供调度测试检查
+
+    def models(self):
+        return ["fake"]
+
+    def run(self, job, progress):
+        self.seen.append(job.id)
+        for i in range(self.steps):
+            time.sleep(self.delay)
+            progress((i + 1) / self.steps, "separating")
+        if job.path in self.fail_paths:
+            raise RuntimeError(f"fake failure: {job.path}")
+        stems = list(stem_selection(job.stems) or self.STEMS)
+        return {"outputs": [stem_path(job.path, s) for s in stems], "stems": stems, "sr": 44100,
+                "audio_seconds": 0.0, "cache_hit": False, "cache_key": None}
+
+
+class JobScheduler:
+    """优先级队列 + 固定数量的工作线程；优先级数值越大越先执行，同优先级先来先服务"""
+
+    def __init__(self, backend, workers=1):
+        self.backend = backend
+        self._heap = []
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._cv = threading.Condition()
+        self._running = {}
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+        self._threads = [threading.Thread(target=self._worker, name=f"separation-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, path, model=DEFAULT_MODEL, stems=None, priority=0, basic=False, preset=DEFAULT_PRESET):
+        preset_params(preset)
+        stem_selection(stems)
+        with self._cv:
+            if self._closed:
+                raise RuntimeError("调度器已关闭")
+            job = Job(next(self._ids), path, model, stems, priority, basic, preset)
+            heapq.heappush(self._heap, (-priority, next(self._seq), job))
+            position = sum(1 for _, _, j in self._heap if not j.cancelled)
+            job.emit("queued", position=position, path=path)
+            self._cv.notify()
+        return job
+
+    def cancel(self, job):
+        """只能取消尚未开始的任务"""
+        with self._cv:
+            job.cancelled = True
+
+    def status(self):
+        with self._cv:
+            return {"queued": sum(1 for _, _, j in self._heap if not j.cancelled),
+                    "running": [{"job": j.id, "path": j.path} for j in self._running.values()],
+                    "completed": self.completed, "failed": self.failed,
+                    "workers": len(self._threads), "models": self.backend.models()}
+
+    def _next_job(self):
+        with self._cv:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    job = heapq.heappop(self._heap)[2]
+                    self._running[job.id] = job
+                    return job
+                if self._closed:
+                    return None
+                self._cv.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            start = time.perf_counter()
+            job.emit("started")
+            try:
+                result = self.backend.run(job, lambda frac, stage: job.emit("progress", fraction=round(frac, 4), stage=stage))
+                result["seconds"] = time.perf_counter() - start
+                job.emit("done", **result)
+                ok = True
+            except Exception as e:
+                job.emit("error", message=f"{type(e).__name__}: {e}")
+                ok = False
+            with self._cv:
+                self._running.pop(job.id, None)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def shutdown(self, wait=True):
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def _send(self, obj):
+        self.wfile.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8") or "{}")
+        except ValueError as e:
+            self._send({"event": "error", "message": f"无效请求: {e}"})
+            return
+        scheduler = self.server.scheduler
+        op = request.get("op")
+        if op == "ping":
+            self._send({"event": "done", "pid": os.getpid()})
+        elif op == "status":
+            self._send(dict(scheduler.status(), event="done"))
+        elif op == "shutdown":
+            self._send({"event": "done"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif op == "submit":
+            self._stream_job(scheduler, request)
+        else:
+            self._send({"event": "error", "message": f"未知操作: {op}"})
+
+    def _stream_job(self, scheduler, request):
+        try:
+            job = scheduler.submit(os.path.abspath(request["path"]), model=request.get("model") or DEFAULT_MODEL,
+                                   stems=request.get("stems"), priority=int(request.get("priority", 0)),
+                                   basic=bool(request.get("basic")), preset=request.get("preset") or DEFAULT_PRESET)
+        except (KeyError, RuntimeError, ValueError) as e:
+            self._send({"event": "error", "message": str(e)})
+            return
+        while True:
+            event = job.events.get()
+            try:
+                self._send(event)
+            except OSError:
+                scheduler.cancel(job)  # 客户端已断开：未开始的任务不再执行
+                return
+            if event["event"] in TERMINAL_EVENTS:
+                return
+
+
+if UNIX_SOCKETS:
+    class SeparationDaemon(socketserver.ThreadingUnixStreamServer):
+        """监听 Unix 域套接字，每个连接一个线程；分离本身在调度器的工作线程上执行"""
+
+        daemon_threads = True
+
+        def __init__(self, socket_path=DEFAULT_SOCKET, backend=None, workers=1):
+            self.socket_path = socket_path
+            os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+            if os.path.exists(socket_path):
+                if daemon_available(socket_path):
+                    raise RuntimeError(f"守护进程已在运行: {socket_path}")
+                os.remove(socket_path)  # 上次异常退出遗留的套接字文件
+            self.scheduler = JobScheduler(backend or EngineBackend(), workers)
+            super().__init__(socket_path, _RequestHandler)
+            os.chmod(socket_path, 0o600)
+
+        def server_close(self):
+            super().server_close()
+            self.scheduler.shutdown(wait=False)
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+
+def serve(socket_path=DEFAULT_SOCKET, workers=1, threads=None, cache_dir=DEFAULT_CACHE_DIR,
+          cache_bytes=DEFAULT_MAX_BYTES, fake=False, log=print, inference_backend=DEFAULT_BACKEND):
+    """前台运行守护进程直到收到 shutdown 或 Ctrl+C"""
+    if not UNIX_SOCKETS:
+        raise RuntimeError("当前平台不支持 Unix 域套接字，无法运行分离守护进程")
+    backend = FakeBackend() if fake else EngineBackend(threads, cache_dir, cache_bytes, inference_backend)
+    server = SeparationDaemon(socket_path, backend, workers)
+    log(f"分离守护进程已启动: {socket_path}（{workers} 个工作线程{'，测试后端' if fake else ''}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        log("分离守护进程已退出")
+
+
+class DaemonClient:
+    """瘦客户端：每个请求一个连接"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _events(self, request):
+        if not UNIX_SOCKETS:
+            raise OSError("当前平台不支持 Unix 域套接字")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+            with sock.makefile("rb") as f:
+                for line in f:
+                    event = json.loads(line.decode("utf-8"))
+                    yield event
+                    if event.get("event") in TERMINAL_EVENTS:
+                        return
+        raise ConnectionError("守护进程提前关闭了连接")
+
+    def _call(self, request):
+        event = None
+        for event in self._events(request):
+            pass
+        return event
+
+    def ping(self):
+        return self._call({"op": "ping"})
+
+    def status(self):
+        return self._call({"op": "status"})
+
+    def shutdown(self):
+        return self._call({"op": "shutdown"})
+
+    def submit(self, path, model=DEFAULT_MODEL, stems=None, priority=0, basic=False, preset=DEFAULT_PRESET,
+               on_event=None):
+        """提交任务并阻塞到结束；中间事件交给 on_event，返回最终的 done / error 事件"""
+        request = {"op": "submit", "path": os.path.abspath(path), "model": model,
+                   "stems": stems, "priority": priority, "basic": basic, "preset": preset}
+        final = None
+        for event in self._events(request):
+            if on_event is not None:
+                on_event(event)
+            final = event
+        return final
+
+
+def daemon_available(socket_path=DEFAULT_SOCKET, timeout=0.5):
+    """守护进程是否在运行（能连上并响应 ping）"""
+    if not UNIX_SOCKETS or not os.path.exists(socket_path):
+        return False
+    try:
+        return DaemonClient(socket_path, timeout=timeout).ping() is not None
+    except (OSError, ValueError):
+        return False
+
+
+def submit_files(inputs, socket_path=DEFAULT_SOCKET, model_name=DEFAULT_MODEL, stems=None,
+                 priority=0, basic=False, recursive=False, preset=DEFAULT_PRESET):
+    """命令行瘦客户端：把文件全部提交给守护进程（由它按优先级调度），逐个报告结果"""
+    import concurrent.futures
+    from batch_separation import _report_file, expand_inputs, summarize
+
+    files = expand_inputs(inputs, recursive=recursive)
+    if not files:
+        print("未找到可分离的音频文件")
+        return summarize([], 0.0)
+    if not daemon_available(socket_path):
+        raise RuntimeError(f"分离守护进程未运行（{socket_path}），请先执行: separation-studio.py daemon")
+
+    client = DaemonClient(socket_path)
+
+    def run(path):
+        final = client.submit(path, model=model_name, stems=stems, priority=priority, basic=basic, preset=preset)
+        if final["event"] == "error":
+            return {"path": path, "ok": False, "seconds": 0.0, "audio_seconds": 0.0, "error": final["message"]}
+        return {"path": path, "ok": True, "seconds": final["seconds"], "audio_seconds": final["audio_seconds"],
+                "outputs": final["outputs"], "cache_hit": final["cache_hit"]}
+
+    print(f"提交 {len(files)} 个文件到分离守护进程（优先级 {priority}）")
+    results = []
+    start = time.perf_counter()
+    # 一个文件一个连接，排队与并发由守护进程决定
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(files), 32)) as pool:
+        futures = [pool.submit(run, path) for path in files]
+        for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            results.append(future.result())
+            _report_file(results[-1], i, len(files))
+    summary = summarize(results, time.perf_counter() - start)
+    print(f"完成 {summary['succeeded']}/{summary['files']} 个文件（失败 {summary['failed']}）")
+    return summary
@@ -0,0 +1,438 @@
+"""
+分离引擎 - 与界面无关的分离核心
+供 separation-studio.py 的图形界面与命令行批处理共用：
+加载音频、运行 Demucs / 基础频段分离、按 {base}_{stem}.wav 保存分轨
+"""
+import functools
+import importlib.util
+import inspect
+import os
+import threading
+import numpy as np
+from scipy.io import wavfile
+
+from inference_backends import BACKENDS, DEFAULT_BACKEND, make_backend, stored_choice
+from presets import DEFAULT_PRESET, preset_params
+from stem_cache import audio_cache_key
+from tracing import TRACER
+
+# --- 大模型依赖按需导入 ---
+# torch / torchaudio / demucs 导入要数秒，模块导入时只检查是否安装，
+# 第一次真正用到（或界面后台预热）时才由 ensure_ai() 导入。
+torch = torchaudio = get_model = apply_model = None
+
+AI_PENDING, AI_LOADING, AI_READY, AI_UNAVAILABLE = "pending", "loading", "ready", "unavailable"
+_AI_LOCK = threading.Lock()
+
+
+def _probe_ai():
+    try:
+        missing = [m for m in ("torch", "torchaudio", "demucs") if importlib.util.find_spec(m) is None]
+    except (ImportError, ValueError) as e:
+        return e
+    return ImportError(f"No module named {missing[0]!r}") if missing else None
+
+
+AI_IMPORT_ERROR = _probe_ai()
+AI_AVAILABLE = AI_IMPORT_ERROR is None  # 导入前为“已安装”，导入失败后改为 False
+AI_STATE = AI_PENDING if AI_AVAILABLE else AI_UNAVAILABLE
+
+
+def ai_state():
+    """模型库就绪状态：pending / loading / ready / unavailable"""
+    return AI_STATE
+
+
+def ensure_ai():
+    """导入模型库（只导入一次，可在任意线程调用），返回是否可用"""
+    global torch, torchaudio, get_model, apply_model, AI_AVAILABLE, AI_IMPORT_ERROR, AI_STATE
+    if AI_STATE in (AI_READY, AI_UNAVAILABLE):
+        return AI_AVAILABLE
+    with _AI_LOCK:
+        if AI_STATE == AI_PENDING:
+            AI_STATE = AI_LOADING
+            try:
+                import torch
+                import torchaudio
+                from demucs.pretrained import get_model
+                from demucs.apply import apply_model
+                AI_STATE = AI_READY
+            except ImportError as e:
+                AI_AVAILABLE, AI_IMPORT_ERROR, AI_STATE = False, e, AI_UNAVAILABLE
+    return AI_AVAILABLE
+
+DEFAULT_MODEL = "htdemucs"
+ACCOMPANIMENT = "accompaniment"
+# 分轨在界面与保存时的标准顺序（两轨模式的伴奏排在最后）
+STEM_ORDER = ["vocals", "drums", "bass", "other", ACCOMPANIMENT]
+# 分轨选择：all 为模型的全部分轨；2stems 为人声 + 伴奏两轨，伴奏 = 非人声分轨之和
+STEM_MODES = {"all": None, "2stems": ("vocals", ACCOMPANIMENT)}
+STEM_MODE_LABELS = {"all": "全部分轨", "2stems": "人声 + 伴奏"}
+DEFAULT_STEMS = "all"
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg")
+# 基础分离的分频点 (Hz)：低于 200 为 bass，200~2000 为 drums，其余为 vocals
+BASIC_CROSSOVERS = (200.0, 2000.0)
+
+
+def load_audio(path):
+    """解码音频为连续存储的 (frames, channels) float32 数组，返回 (data, sr)。
+    同一份缓冲供波形显示、查缓存和分离共用，之后不再复制"""
+    ai = AI_AVAILABLE and ensure_ai()
+    with TRACER.span("decode", path=path):
+        if ai:
+            waveform, sr = torchaudio.load(path)
+            # torchaudio 是 (channels, frames)，在这里转置成帧优先的布局，只复制这一次
+            return np.ascontiguousarray(waveform.numpy().T), sr
+
+        from audio_io import pcm_to_float32
+
+        # 没有 torchaudio 时只支持 WAV：映射文件而不整段读入，float32 直接使用映射（只读），
+        # 整型只做一次到 float32 的转换（与 torchaudio 相同除以 2^(bits-1)）
+        try:
+            sr, data = wavfile.read(path, mmap=True)
+        except ValueError:
+            sr, data = wavfile.read(path)  # 24-bit 等 scipy 无法映射的格式
+        data = pcm_to_float32(data)
+        return (data if data.ndim == 2 else data[:, None]), sr
+
+
+@functools.lru_cache(maxsize=1)
+def apply_model_has_callback():
+    """demucs 4.1.0 起 apply_model 才有 callback 参数；4.0.x 上不上报分段进度"""
+    return "callback" in inspect.signature(apply_model).parameters
+
+
+def stem_selection(stems):
+    """分轨选择 -> 要输出的分轨名元组，None 表示模型的全部分轨。
+    stems 可以是 STEM_MODES 中的模式名，也可以是分轨名列表（可含 accompaniment）"""
+    if not isinstance(stems, str) and stems is not None and len(stems) == 1 and stems[0] in STEM_MODES:
+        stems = stems[0]  # 命令行 -s 2stems
+    if stems is None or isinstance(stems, str) and stems in STEM_MODES:
+        return STEM_MODES[stems or DEFAULT_STEMS]
+    if isinstance(stems, str):
+        raise ValueError(f"未知分轨选择: {stems}（可选 {', '.join(STEM_MODES)}，或分轨名列表）")
+    return tuple(dict.fromkeys(stems)) or None
+
+
+def stem_plan(selection, sources):
+    """每个输出分轨由哪些模型分轨相加：[(name, [源序号])]；伴奏为除 vocals 外的全部分轨"""
+    if selection is None:
+        return [(name, [i]) for i, name in enumerate(sources)]
+    plan = []
+    for name in selection:
+        if name == ACCOMPANIMENT:
+            plan.append((name, [i for i, s in enumerate(sources) if s != "vocals"]))
+        elif name in sources:
+            plan.append((name, [list(sources).index(name)]))
+        else:
+            raise ValueError(f"模型没有分轨 {name}（可选 {', '.join(sources)}, {ACCOMPANIMENT}）")
+    return plan
+
+
+def as_waveform(data):
+    """(frames, channels) float32 数组 -> (channels, frames) 张量，共享内存不复制；单声道为 (1, frames)"""
+    data = np.asarray(data, dtype=np.float32)
+    if not data.flags.writeable:
+        data = data.copy()  # torch 不接受只读内存（如内存映射的 WAV）
+    waveform = torch.from_numpy(data)
+    return waveform[None] if waveform.ndim == 1 else waveform.T
+
+
+@functools.lru_cache(maxsize=8)
+def resampler(src_sr, dst_sr):
+    """按 (源采样率, 目标采样率) 缓存的重采样器，sinc 卷积核只计算一次"""
+    return torchaudio.transforms.Resample(src_sr, dst_sr)
+
+
+def normalize(waveform, mean, std):
+    """(waveform - mean) / std，写入新的连续张量（输入可能是共享的转置视图，不能原地修改）"""
+    out = torch.empty(waveform.shape, dtype=torch.float32)
+    torch.sub(waveform, mean, out=out)
+    return out.div_(std)
+
+
+def stem_path(source_path, stem, ext=".wav"):
+    """分轨输出路径：与源文件同目录的 {base}_{stem}.wav"""
+    return f"{os.path.splitext(source_path)[0]}_{stem}{ext}"
+
+
+def write_stem_wav(save_path, audio, sr):
+    """保存分轨 (float32 -> int16)，峰值超过 0.99 时整体压回，防止爆音；分块写出，不复制整段音频"""
+    from audio_io import write_wav_chunked
+
+    write_wav_chunked(audio, save_path, sr)
+
+
+class SeparationEngine:
+    """分离引擎：常驻一个模型，可重复对多个文件执行分离"""
+
+    def __init__(self, model_name=DEFAULT_MODEL, use_ai=True, num_threads=None, cache=None, preset=DEFAULT_PRESET,
+                 backend=DEFAULT_BACKEND, stems=DEFAULT_STEMS):
+        self.model_name = model_name
+        self._want_ai = use_ai
+        preset_params(preset)
+        self.preset = preset  # 速度 / 质量预设，见 presets.PRESETS；可在两次分离之间切换
+        self.num_threads = num_threads  # 显式指定的 torch 线程数，优先于预设
+        stem_selection(stems)
+        self.stems = stems  # 分轨选择（模式名或分轨名列表），未选中的分轨不复制、不写盘；可在两次分离之间切换
+        if backend != DEFAULT_BACKEND and backend not in BACKENDS:
+            raise ValueError(f"未知推理后端: {backend}（可选 auto, {', '.join(BACKENDS)}）")
+        self.backend_name = backend  # auto / fp32 / int8 / bf16 / jit，见 inference_backends
+        self.backend = None
+        self._prepared = (None, None)  # (原模型, 后端转换后的模型)
+        self.model = None
+        self._model_lock = threading.Lock()
+        self.cache = cache  # 可选 StemCache，命中时不运行模型
+        self.last_cache_hit = False
+        self.last_cache_hits = []  # separate_many 的逐项缓存命中
+        self.last_cache_key = None
+        self.last_rtf = 0.0  # 最近一次基础分离的实时率（处理耗时 / 音频时长）
+        if num_threads and self.use_ai:
+            torch.set_num_threads(num_threads)
+
+    @property
+    def use_ai(self):
+        # 首次访问时导入模型库；未安装或导入失败时退回基础分离
+        return self._want_ai and AI_AVAILABLE and ensure_ai()
+
+    @property
+    def model_ready(self):
+        return self.model is not None
+
+    @property
+    def mode(self):
+        return "demucs" if self.use_ai else "basic"
+
+    def thread_count(self):
+        """本次推理使用的 torch 线程数"""
+        return self.num_threads or preset_params(self.preset)["threads"] or torch.get_num_threads()
+
+    def _configure_threads(self, params):
+        threads = self.num_threads or params["threads"]
+        if threads and torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+        interop = params["interop_threads"]
+        if interop and torch.get_num_interop_threads() != interop:
+            try:
+                torch.set_num_interop_threads(interop)
+            except RuntimeError:
+                pass  # 只能在第一次并行计算之前设置
+
+    def load_model(self):
+        """按需加载模型（只加载一次，之后常驻）；界面预热线程与分离线程可能同时调用"""
+        with self._model_lock:
+            if self.model is None:
+                ensure_ai()
+                model = get_model(self.model_name)
+                model.eval()
+                self.model = model
+        return self.model
+
+    def resolved_backend(self):
+        """实际使用的后端名：auto 读取 backends 命令记下的选择，没有记录时用 fp32。
+        这里从不运行一致性检查（它要跑好几遍模型，批处理的每个工作进程都做一遍会互相争抢）"""
+        if self.backend_name != DEFAULT_BACKEND:
+            return self.backend_name
+        return stored_choice(self.model_name) or "fp32"
+
+    def inference_model(self):
+        """按推理后端转换后的模型"""
+        model = self.load_model()
+        with self._model_lock:
+            if self._prepared[0] is not model:
+                self.backend = make_backend(self.resolved_backend())
+                self._prepared = (model, self.backend.prepare(model))
+        return self._prepared[1]
+
+    def separate_file(self, path, progress=False, on_progress=None):
+        """分离单个文件，返回 (stems, sr)；stems 为 {name: (frames, 2) 数组}，保持模型输出顺序"""
+        with TRACER.span("file", path=path, mode=self.mode):
+            data, sr = load_audio(path)
+            return self.separate(data, sr, progress=progress, on_progress=on_progress)
+
+    def cache_params(self):
+        """参与缓存键计算的分离参数"""
+        if self.use_ai:
+            p = preset_params(self.preset)
+            params = {"mode": "demucs", "shifts": p["shifts"], "split": p["split"], "overlap": p["overlap"]}
+            if p["segment"] is not None:
+                params["segment"] = p["segment"]
+            # 其他后端的输出只在容差内接近 fp32，分开缓存；fp32 的键与以前相同
+            backend = self.resolved_backend()
+            if backend != "fp32":
+                params["backend"] = backend
+        else:
+            params = {"mode": "basic", "crossover": list(BASIC_CROSSOVERS), "filter": "linkwitz-riley-sos", "order": 4}
+        # 只有部分分轨时单独成键；全部分轨的键与以前相同，旧缓存继续有效
+        selection = stem_selection(self.stems)
+        if selection is not None:
+            params["stems"] = list(selection)
+        return params
+
+    def cache_key(self, data, sr):
+        return audio_cache_key(data, sr, self.model_name if self.use_ai else "basic", self.cache_params())
+
+    def lookup_cache(self, data, sr, mmap=False):
+        """只查缓存不分离，命中返回 (stems, sr)，否则 None"""
+        if self.cache is None:
+            return None
+        return self.cache.load(self.cache_key(data, sr), mmap=mmap)
+
+    def separate(self, data, sr, progress=False, on_progress=None):
+        """分离已解码的 (frames, channels) 音频；配置了缓存时先查缓存，未命中才运行模型。
+        on_progress(fraction) 在模型推理过程中被调用（0~1）"""
+        self.last_cache_hit = False
+        key = self.last_cache_key = None
+        if self.cache is not None:
+            with TRACER.span("cache_lookup"):
+                key = self.last_cache_key = self.cache_key(data, sr)
+                hit = self.cache.load(key)
+            if hit is not None:
+                self.last_cache_hit = True
+                return hit
+
+        if self.use_ai:
+            stems, out_sr = self.separate_demucs(data, sr, progress=progress, on_progress=on_progress)
+        else:
+            stems, out_sr = self.separate_basic(data, sr), sr
+
+        if key is not None:
+            with TRACER.span("cache_store"):
+                self.cache.store(key, stems, out_sr, meta={"model": self.model_name, "mode": self.mode})
+        return stems, out_sr
+
+    def separate_many(self, items, batch_size, on_progress=None):
+        """分离多个已解码的 (data, sr)，返回 [(stems, sr)]；未命中缓存的文件的分段拼成批次一起推理
+        （见 segment_batching，只合并模型前向，切分与平移仍由 apply_model 完成）。
+        self.last_cache_hits 记录各项是否命中缓存"""
+        results = [None] * len(items)
+        keys = [None] * len(items)
+        if self.cache is not None:
+            with TRACER.span("cache_lookup", files=len(items)):
+                for i, (data, sr) in enumerate(items):
+                    keys[i] = self.cache_key(data, sr)
+                    results[i] = self.cache.load(keys[i])
+        self.last_cache_hits = [r is not None for r in results]
+        todo = [i for i, r in enumerate(results) if r is None]
+
+        if self.use_ai and todo:
+            from segment_batching import SegmentBatcher
+
+            prepared = [self._prepare_waveform(*items[i]) for i in todo]
+            outputs = SegmentBatcher(self, batch_size).run([p[0] for p in prepared], on_progress=on_progress)
+            for i, (_, mean, std), sources in zip(todo, prepared, outputs):
+                results[i] = self._to_stems(sources, mean, std)
+        else:
+            for i in todo:
+                results[i] = self.separate_basic(*items[i]), items[i][1]
+
+        for i in todo:
+            if keys[i] is not None:
+                with TRACER.span("cache_store"):
+                    self.cache.store(keys[i], *results[i], meta={"model": self.model_name, "mode": self.mode})
+        return results
+
+    def _prepare_waveform(self, data, sr):
+        """(frames, channels) 数组 -> 模型采样率下归一化的 (2, frames) 张量，返回 (张量, mean, std)"""
+        model = self.load_model()
+        waveform = as_waveform(data)
+        if sr != model.samplerate:
+            with TRACER.span("resample", src=sr, dst=model.samplerate):
+                waveform = resampler(sr, model.samplerate)(waveform)
+        if waveform.shape[0] == 1:
+            waveform = waveform.expand(2, -1)
+
+        with TRACER.span("normalize"):
+            ref = waveform.mean(0)
+            mean, std = ref.mean(), ref.std()
+            return normalize(waveform, mean, std), mean, std
+
+    def denormalize_stems(self, sources, mean, std, frames_first=False):
+        """模型输出 (sources, channels, frames) -> 按分轨选择反归一化，返回 (分轨名列表, 张量)。
+        未选中的分轨不复制；伴奏直接在归一化的输出上相加，反归一化时加 mean × 分轨数。
+        frames_first 时写成 (n, frames, channels)，每个分轨都是连续的帧优先数组，否则为 (n, channels, frames)"""
+        plan = stem_plan(stem_selection(self.stems), self.load_model().sources)
+        sources = sources.cpu()
+        _, channels, frames = sources.shape
+        shape = (len(plan), frames, channels) if frames_first else (len(plan), channels, frames)
+        out = torch.empty(shape, dtype=torch.float32)
+        for j, (_, idx) in enumerate(plan):
+            src = sources[idx[0]]
+            if len(idx) > 1:
+                src = src + sources[idx[1]]
+                for i in idx[2:]:
+                    src += sources[i]
+            torch.mul(src.T if frames_first else src, std, out=out[j]).add_(mean * len(idx))
+        return [name for name, _ in plan], out
+
+    def _to_stems(self, sources, mean, std):
+        """模型输出 (sources, channels, frames) 反归一化为 {name: (frames, 2) 数组}，返回 (stems, sr)；
+        只包含选中的分轨"""
+        with TRACER.span("denormalize"):
+            names, out = self.denormalize_stems(sources, mean, std, frames_first=True)
+        with TRACER.span("to_numpy"):
+            stems = {name: out[i].numpy() for i, name in enumerate(names)}
+        return stems, self.model.samplerate
+
+    def separate_demucs(self, data, sr, progress=False, on_progress=None):
+        waveform, mean, std = self._prepare_waveform(data, sr)
+        sources = self.run_model(waveform, progress=progress, on_progress=on_progress)
+        return self._to_stems(sources, mean, std)
+
+    def run_model(self, waveform, progress=False, on_progress=None):
+        """对已归一化的 (channels, frames) 张量按当前预设运行模型，返回 (sources, channels, frames)"""
+        params = preset_params(self.preset)
+        shifts = max(1, params["shifts"])
+        options = {}
+        if on_progress is not None and apply_model_has_callback():
+            length = max(1, waveform.shape[-1])
+            done = [0.0]
+
+            def callback(d):
+                # 分段可能乱序完成，只上报单调递增的进度；多次平移时按平移序号累加
+                if d.get("state") == "end":
+                    shift = d.get("shift_idx", 0) + min(1.0, d["segment_offset"] / length)
+                    frac = (d["model_idx_in_bag"] + shift / shifts) / d["models"]
+                    if frac > done[0]:
+                        done[0] = frac
+                        on_progress(frac)
+            options["callback"] = callback
+        self._configure_threads(params)
+        model = self.inference_model()
+        with torch.no_grad(), self.backend.context(), TRACER.span(
+                "inference", model=self.model_name, preset=self.preset, backend=self.backend.name,
+                frames=int(waveform.shape[-1])):
+            return apply_model(model, waveform[None], shifts=params["shifts"], split=params["split"],
+                               overlap=params["overlap"], segment=params["segment"],
+                               progress=progress, **options)[0].float()
+
+    def separate_basic(self, data, sr):
+        """无 AI 依赖时的基础频段分离：LR4 分频滤波器组，三个频段相加等于原音频"""
+        from crossover import CrossoverFilterbank
+
+        if data.ndim == 1:
+            data = data[:, None]
+        if data.shape[1] == 1:
+            data = np.repeat(data, 2, axis=1)
+
+        bank = CrossoverFilterbank(sr, BASIC_CROSSOVERS, order=4)
+        with TRACER.span("basic_split", frames=len(data)):
+            bands = dict(zip(("bass", "drums", "vocals"), bank.split(data)))
+        self.last_rtf = bank.last_rtf
+        names = list(bands)
+        stems = {}
+        for name, idx in stem_plan(stem_selection(self.stems), names):
+            audio = bands[names[idx[0]]]
+            for i in idx[1:]:
+                audio = audio + bands[names[i]]
+            stems[name] = audio
+        return stems
+
+    def save_stems(self, source_path, stems, sr, log=print, exporter=None):
+        """把全部分轨写到源文件旁并等待写完，返回路径列表；各分轨在导出线程池上并行分块写出"""
+        from stem_export import StemExporter
+
+        if exporter is not None:
+            return [f.result() for f in exporter.export_stems(source_path, stems, sr)]
+        with StemExporter(log=log) as exporter:
+            return [f.result() for f in exporter.export_stems(source_path, stems, sr)]
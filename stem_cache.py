@@ -0,0 +1,210 @@
+"""
+内容寻址分轨缓存
+以「解码后音频 + 模型名 + 采样率 + 分离参数」的哈希为键，
+同一段音频无论文件名、目录如何变化都能命中；源文件被编辑后哈希随之改变，不会读到过期结果。
+
+目录结构:
+    <root>/<key[:2]>/<key>/entry.json   条目信息（分轨名、采样率、大小），查找只读这一个小文件
+    <root>/<key[:2]>/<key>/{stem}.npy   float32 (frames, channels)
+LRU 访问时间就是条目目录的 mtime：命中时 os.utime 刷新，不加锁、不改写任何共享文件。
+多个工作进程可共享同一缓存：条目先写入临时目录再原子改名；
+超出容量时在文件锁内扫描条目目录，按 mtime 从旧到新先改名再删除。
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.environ.get(
+    "SEPARATION_STUDIO_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "separation-studio", "stems"))
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+ENTRY_FILE = "entry.json"
+
+
+class AudioKeyHasher:
+    """增量计算缓存键，可按块喂入音频（流式处理时无需整段解码）"""
+
+    def __init__(self, shape, sr, model_name, params=None):
+        self._h = hashlib.sha256()
+        header = {"v": CACHE_VERSION, "model": model_name, "sr": int(sr),
+                  "shape": list(shape), "params": params or {}}
+        self._h.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+
+    def update(self, block):
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        self._h.update(memoryview(block).cast("B"))
+
+    def hexdigest(self):
+        return self._h.hexdigest()
+
+
+def audio_cache_key(audio, sr, model_name, params=None):
+    """计算缓存键：解码后的音频内容 + 模型 + 采样率 + 分离参数"""
+    hasher = AudioKeyHasher(np.shape(audio), sr, model_name, params)
+    hasher.update(audio)
+    return hasher.hexdigest()
+
+
+class _FileLock:
+    """基于 O_EXCL 的跨平台文件锁，持有者异常退出后超时自动清理"""
+
+    def __init__(self, path, timeout=30.0, stale=60.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale = stale
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"等待缓存锁超时: {self.path}")
+                time.sleep(0.01)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StemCache:
+    """内容寻址、容量受限 (LRU 淘汰) 的分轨缓存"""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock_path = os.path.join(root, "evict.lock")
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    # --- 查询 ---
+    def lookup(self, key):
+        """返回条目信息（stems / sr / size ...），未命中返回 None"""
+        try:
+            with open(os.path.join(self._entry_dir(key), ENTRY_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, key, mmap=False):
+        """命中时读取全部分轨，返回 (stems, sr)，并刷新 LRU 访问时间；未命中返回 None"""
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        entry_dir = self._entry_dir(key)
+        try:
+            stems = {name: np.load(os.path.join(entry_dir, f"{name}.npy"),
+                                   mmap_mode="r" if mmap else None)
+                     for name in entry["stems"]}
+        except (OSError, ValueError):
+            self.discard(key)
+            return None
+        self._touch(key)
+        return stems, entry["sr"]
+
+    def locate(self, path):
+        """缓存条目中的分轨文件 -> (key, 分轨名)；不是本缓存中的文件时返回 None"""
+        entry_dir, name = os.path.split(os.path.realpath(path))
+        key = os.path.basename(entry_dir)
+        if not name.endswith(".npy") or entry_dir != os.path.realpath(self._entry_dir(key)):
+            return None
+        return key, name[:-len(".npy")]
+
+    def _touch(self, key):
+        try:
+            os.utime(self._entry_dir(key))
+        except OSError:
+            pass  # 刚被其他进程淘汰
+
+    # --- 写入 ---
+    def store(self, key, stems, sr, meta=None):
+        """写入一组分轨：先写临时目录，再原子改名为正式条目目录"""
+        final_dir = self._entry_dir(key)
+        os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+        tmp_dir = os.path.join(self.root, f"tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        size = 0
+        try:
+            for name, audio in stems.items():
+                path = os.path.join(tmp_dir, f"{name}.npy")
+                np.save(path, np.ascontiguousarray(audio, dtype=np.float32))
+                size += os.path.getsize(path)
+            entry = {"stems": list(stems), "sr": int(sr), "size": size,
+                     "ctime": time.time(), "meta": meta or {}}
+            with open(os.path.join(tmp_dir, ENTRY_FILE), "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            try:
+                os.replace(tmp_dir, final_dir)
+            except OSError:
+                # 其他进程已写入相同条目（内容一致），丢弃本次结果
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        if self.total_bytes > self.max_bytes:
+            with _FileLock(self.lock_path):
+                self._evict(keep=key)
+
+    def discard(self, key):
+        self._remove(self._entry_dir(key))
+
+    def _remove(self, entry_dir):
+        """先改名再删除：其他进程要么看到完整条目，要么完全看不到"""
+        trash = os.path.join(self.root, f"tmp-{uuid.uuid4().hex}")
+        try:
+            os.replace(entry_dir, trash)
+        except OSError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def _scan(self):
+        """列出全部条目 [(mtime, size, key)]；大小按目录内文件实际占用统计"""
+        entries = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    mtime = entry.stat().st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.name.endswith(".npy"))
+                except OSError:
+                    continue  # 扫描途中被淘汰
+                entries.append((mtime, size, entry.name))
+        return entries
+
+    def _evict(self, keep=None):
+        """超出容量时按最久未访问顺序淘汰（调用方持有锁）"""
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.discard(key)
+            total -= size
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, size, _ in self._scan())
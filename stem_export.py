@@ -0,0 +1,117 @@
+"""
+分轨导出
+在写线程池上分块转换并写盘，与下一次推理重叠进行，不再阻塞分离线程：
+- wav16 / wav24 / wav32f：分块写 WAV（见 audio_io.WavStreamWriter）
+- flac / flac24：需要可选依赖 soundfile（pip install soundfile）
+- 整型格式可选 TPDF 抖动；所有导出累计字节数与写入耗时，报告 bytes/s
+"""
+import concurrent.futures
+import os
+import threading
+import time
+
+import numpy as np
+
+from audio_io import peak_abs, tpdf_dither, write_wav_chunked
+from separation_engine import stem_path
+from tracing import TRACER
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+# 格式名 -> (扩展名, WAV 采样格式 / soundfile subtype)
+EXPORT_FORMATS = {
+    "wav16": (".wav", "int16"),
+    "wav24": (".wav", "int24"),
+    "wav32f": (".wav", "float32"),
+    "flac": (".flac", "PCM_16"),
+    "flac24": (".flac", "PCM_24"),
+}
+DEFAULT_EXPORT_FORMAT = "wav16"
+_BLOCK_FRAMES = 1 << 18
+
+
+def available_formats():
+    return [f for f, (ext, _) in EXPORT_FORMATS.items() if ext != ".flac" or soundfile is not None]
+
+
+def export_path(source_path, stem, fmt=DEFAULT_EXPORT_FORMAT):
+    return stem_path(source_path, stem, EXPORT_FORMATS[fmt][0])
+
+
+def _write_flac(audio, path, sr, subtype, peak, dither, block_frames):
+    if soundfile is None:
+        raise RuntimeError("导出 FLAC 需要安装 soundfile: pip install soundfile")
+    bits = 24 if subtype == "PCM_24" else 16
+    lsb = 1.0 / 2 ** (bits - 1)
+    scale = 0.99 / peak if peak > 0.99 else 1.0
+    rng = np.random.default_rng() if dither else None
+    channels = audio.shape[1] if audio.ndim > 1 else 1
+    with soundfile.SoundFile(path, "w", sr, channels, subtype=subtype, format="FLAC") as f:
+        for start in range(0, len(audio), block_frames):
+            block = np.asarray(audio[start:start + block_frames], dtype=np.float32) * scale
+            if rng is not None:
+                block += tpdf_dither(block.shape, rng) * lsb
+            f.write(block)
+    return os.path.getsize(path)
+
+
+def export_stem(audio, path, sr, fmt=DEFAULT_EXPORT_FORMAT, dither=False, peak=None, block_frames=_BLOCK_FRAMES):
+    """分块把一条分轨写成指定格式，返回写出的字节数"""
+    ext, sample_format = EXPORT_FORMATS[fmt]
+    if ext == ".wav":
+        return write_wav_chunked(audio, path, sr, peak=peak, block_frames=block_frames,
+                                 sample_format=sample_format, dither=dither)
+    if peak is None:
+        peak = peak_abs(audio, block_frames)
+    return _write_flac(audio, path, sr, sample_format, peak, dither, block_frames)
+
+
+class StemExporter:
+    """分轨导出线程池；submit 立即返回 Future（结果为写出的路径）"""
+
+    def __init__(self, fmt=DEFAULT_EXPORT_FORMAT, dither=False, workers=2, log=print):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"未知导出格式: {fmt}（可选 {', '.join(EXPORT_FORMATS)}）")
+        self.fmt = fmt
+        self.dither = dither
+        self.log = log
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stem-export")
+        self._lock = threading.Lock()
+        self.bytes_written = 0
+        self.busy_seconds = 0.0
+
+    def _export(self, path, audio, sr, fmt, dither, peak):
+        start = time.perf_counter()
+        with TRACER.span("export", path=path, format=fmt) as span:
+            size = export_stem(audio, path, sr, fmt, dither, peak)
+            span.set(bytes=size)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.bytes_written += size
+            self.busy_seconds += seconds
+        if self.log:
+            self.log(f"已保存: {path}（{size / 1e6:.1f} MB，{size / 1e6 / max(seconds, 1e-9):.0f} MB/s）")
+        return path
+
+    def submit(self, path, audio, sr, peak=None):
+        return self._pool.submit(self._export, path, audio, sr, self.fmt, self.dither, peak)
+
+    def export_stems(self, source_path, stems, sr):
+        """把全部分轨提交到写线程池，按分轨顺序返回 Future 列表"""
+        return [self.submit(export_path(source_path, name, self.fmt), audio, sr) for name, audio in stems.items()]
+
+    def bytes_per_second(self):
+        """单个写线程的平均写出速度"""
+        return self.bytes_written / self.busy_seconds if self.busy_seconds else 0.0
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,221 @@
+"""
+流式分离 - 长录音（DJ set、播客等）的有界内存模式
+按重叠窗口读取输入、逐窗口运行模型、在接缝处交叉淡化叠加，
+分轨先增量追加到 float32 临时文件，最后按全局峰值分块转成 {base}_{stem}.wav。
+只处理引擎分轨选择中的分轨：两轨模式每个窗口直接合成伴奏，未选中的分轨不写临时文件。
+峰值内存只取决于窗口长度，与文件长度无关；结果与整文件模式在很小误差内一致。
+"""
+import math
+import os
+import time
+
+import numpy as np
+
+from audio_io import AudioBlockReader
+from presets import preset_params
+from separation_engine import as_waveform, normalize, resampler, stem_path
+from stem_cache import AudioKeyHasher
+from stem_export import StemExporter, export_path
+from tracing import TRACER
+
+DEFAULT_WINDOW_SECONDS = 120.0
+# None: 按模型分段长度自动选取，使接缝处与整文件模式逐帧一致
+DEFAULT_OVERLAP_SECONDS = None
+
+
+class StreamingSeparator:
+    """用 SeparationEngine 的常驻模型按窗口分离单个长文件"""
+
+    def __init__(self, engine, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 overlap_seconds=DEFAULT_OVERLAP_SECONDS, log=print, exporter=None):
+        if not engine.use_ai:
+            raise RuntimeError("流式分离需要 Demucs 模型（基础模式请使用整文件分离）")
+        if overlap_seconds is not None and overlap_seconds * 2 >= window_seconds:
+            raise ValueError("重叠长度必须小于窗口长度的一半")
+        self.engine = engine
+        self.window_seconds = window_seconds
+        self.overlap_seconds = overlap_seconds
+        self.log = log
+        self.exporter = exporter or StemExporter(log=log)
+
+    def cache_params(self):
+        return dict(self.engine.cache_params(), stream_window=self.window_seconds,
+                    stream_overlap=self.overlap_seconds)
+
+    def _scan(self, reader):
+        """第一遍：分块统计全局归一化参数（与整文件模式相同的 mean/std），顺便计算缓存键"""
+        hasher = None
+        if self.engine.cache is not None:
+            hasher = AudioKeyHasher((reader.frames, reader.channels), reader.sr,
+                                    self.engine.model_name, self.cache_params())
+        # 按块合并均值与平方偏差和（Chan/Welford），避免长文件上 Σx² - n·mean² 的相消误差
+        n = 0
+        mean = m2 = 0.0
+        for _, block in reader.blocks(int(reader.sr * self.window_seconds)):
+            if hasher is not None:
+                hasher.update(block)
+            ref = block.mean(axis=1, dtype=np.float64)
+            if not len(ref):
+                continue
+            block_mean = ref.mean()
+            dev = ref - block_mean
+            total = n + len(ref)
+            delta = block_mean - mean
+            mean += delta * len(ref) / total
+            m2 += np.dot(dev, dev) + delta * delta * n * len(ref) / total
+            n = total
+        std = math.sqrt(m2 / max(n - 1, 1))
+        return mean, std or 1.0, hasher.hexdigest() if hasher else None
+
+    def separate_file(self, path):
+        """流式分离并写出分轨，返回 {"outputs", "audio_seconds", "sr", "cache_hit"}"""
+        with TRACER.span("file", path=path, mode="demucs-stream"):
+            return self._separate_file(path)
+
+    def _separate_file(self, path):
+        reader = AudioBlockReader(path)
+        model = self.engine.load_model()
+        out_sr = model.samplerate
+        with TRACER.span("scan"):
+            mean, std, key = self._scan(reader)
+
+        if key is not None:
+            hit = self.engine.cache.load(key, mmap=True)
+            if hit is not None:
+                stems, sr = hit
+                outputs = [f.result() for f in self.exporter.export_stems(path, stems, sr)]
+                return {"outputs": outputs, "audio_seconds": reader.duration, "sr": sr, "cache_hit": True}
+
+        plan = self._plan(model, reader.sr, out_sr)
+        out_frames = math.ceil(reader.frames * out_sr / reader.sr)
+        starts = window_starts(out_frames, plan)
+        stitcher = WindowStitcher(plan, out_frames)
+        resample = resampler(reader.sr, out_sr) if reader.sr != out_sr else None
+
+        raw_paths, raw_files, peaks = {}, {}, {}
+        try:
+            for k, start in enumerate(starts):
+                t0 = time.perf_counter()
+                last = k == len(starts) - 1
+                end = out_frames if last else start + plan["window"]
+                with TRACER.span("window", index=k, start=start, end=end):
+                    names, out = self._process_window(reader, resample, plan, start, end, mean, std)
+                chunk = stitcher.push(out.cpu().numpy(), last)
+
+                for i, name in enumerate(names):
+                    audio = chunk[i].T
+                    if name not in raw_files:
+                        raw_paths[name] = f"{stem_path(path, name)}.f32.part"
+                        raw_files[name] = open(raw_paths[name], "wb")
+                        peaks[name] = 0.0
+                    np.ascontiguousarray(audio, dtype=np.float32).tofile(raw_files[name])
+                    peaks[name] = max(peaks[name], float(np.max(np.abs(audio))) if audio.size else 0.0)
+                self.log(f"窗口 {k + 1}/{len(starts)} 完成，用时 {time.perf_counter() - t0:.1f}s")
+        finally:
+            for f in raw_files.values():
+                f.close()
+
+        try:
+            # 各分轨在导出线程池上并行转换，峰值已在分离时统计
+            outputs = [f.result() for f in [
+                self.exporter.submit(export_path(path, name, self.exporter.fmt), _open_raw(raw_paths[name]),
+                                     out_sr, peak=peaks[name])
+                for name in raw_paths]]
+            if key is not None:
+                stems = {name: _open_raw(raw_paths[name]) for name in raw_paths}
+                with TRACER.span("cache_store"):
+                    self.engine.cache.store(key, stems, out_sr,
+                                            meta={"model": self.engine.model_name, "mode": "demucs-stream"})
+                del stems
+        finally:
+            for raw in raw_paths.values():
+                try:
+                    os.remove(raw)
+                except OSError:
+                    pass
+        return {"outputs": outputs, "audio_seconds": reader.duration, "sr": out_sr, "cache_hit": False}
+
+    def _plan(self, model, src_sr, out_sr):
+        """确定窗口 / 重叠 / 边缘余量（单位：模型采样率下的帧）
+
+        窗口起点对齐到 apply_model 内部分段的步长，使窗口内部的分段网格与整文件模式一致；
+        重采样时再对齐到两种采样率的最小公倍单元，保证每个窗口映射回源文件时落在整数帧上。
+        """
+        sub = model.models[0] if hasattr(model, "models") else model
+        params = preset_params(self.engine.preset)
+        seg = int(float(params["segment"] or sub.segment) * out_sr)
+        stride = int((1 - params["overlap"]) * seg)  # 与 apply_model 按预设切分的步长一致
+        unit_out = out_sr // math.gcd(src_sr, out_sr)
+        window = int(self.window_seconds * out_sr)
+        grid = stride * unit_out // math.gcd(stride, unit_out)
+        if grid * 4 > window:
+            grid = unit_out
+        round_up = lambda n: -(-n // grid) * grid
+
+        # 边缘余量：一个分段 + apply_model 随机平移的最大值，余量之外的结果与整文件一致
+        margin = seg + int(0.5 * out_sr)
+        if self.overlap_seconds is None:
+            overlap = round_up(2 * margin + out_sr)
+        else:
+            overlap = round_up(int(self.overlap_seconds * out_sr))
+            margin = min(margin, overlap // 4)
+        window = max(round_up(window), overlap + grid)
+        return {"window": window, "overlap": overlap, "margin": margin,
+                "unit_src": src_sr // math.gcd(src_sr, out_sr), "unit_out": unit_out,
+                "context": 0 if src_sr == out_sr else unit_out * max(1, int(0.05 * out_sr) // unit_out)}
+
+    def _process_window(self, reader, resample, plan, start, end, mean, std):
+        """读取 [start, end)（模型帧）对应的源音频（含重采样上下文），归一化后运行模型，
+        返回 (分轨名列表, (n, 2, frames) 反归一化后的选中分轨)"""
+        unit_src, unit_out = plan["unit_src"], plan["unit_out"]
+        ctx_left = min(plan["context"], start)
+        src_start = (start - ctx_left) // unit_out * unit_src
+        src_end = -(-(end + plan["context"]) // unit_out) * unit_src
+        with TRACER.span("decode"):
+            block = reader.read(src_start, src_end)
+        waveform = as_waveform(block)
+        if resample is not None:
+            with TRACER.span("resample"):
+                waveform = resample(waveform)[:, ctx_left:ctx_left + end - start]
+        if waveform.shape[0] == 1:
+            waveform = waveform.expand(2, -1)
+
+        waveform = normalize(waveform, mean, std)
+        sources = self.engine.run_model(waveform)
+        return self.engine.denormalize_stems(sources, mean, std)
+
+
+def window_starts(out_frames, plan):
+    """各窗口在模型采样率下的起点；相邻窗口重叠 plan["overlap"] 帧，最后一个窗口延伸到文件末尾"""
+    return list(range(0, max(out_frames - plan["overlap"], 1), plan["window"] - plan["overlap"]))
+
+
+class WindowStitcher:
+    """把逐窗口的分离结果拼成连续输出：接缝处前 margin 帧用旧窗口，重叠区中段交叉淡化，之后用新窗口。
+    只在重叠区中段淡化，两侧各留 margin，使接缝处两个窗口都不受窗口边界影响"""
+
+    def __init__(self, plan, out_frames):
+        self.margin = plan["margin"]
+        self.overlap = plan["overlap"]
+        fade_len = self.overlap - 2 * self.margin
+        self.fade_in = ((np.arange(fade_len) + 0.5) / fade_len).astype(np.float32)
+        self.out_frames = out_frames
+        self.written = 0
+        self._tail = None
+
+    def push(self, out, last):
+        """out: (..., frames) 一个窗口的结果（原地修改），返回可以写出的部分"""
+        if self._tail is not None:
+            a, b = self.margin, self.margin + len(self.fade_in)
+            out[..., :a] = self._tail[..., :a]
+            out[..., a:b] = self._tail[..., a:b] * (1 - self.fade_in) + out[..., a:b] * self.fade_in
+        emit_end = out.shape[-1] if last else out.shape[-1] - self.overlap
+        chunk = out[..., :emit_end]
+        self._tail = None if last else out[..., emit_end:].copy()
+        chunk = chunk[..., :self.out_frames - self.written]
+        self.written += chunk.shape[-1]
+        return chunk
+
+
+def _open_raw(raw_path, channels=2):
+    return np.memmap(raw_path, dtype=np.float32, mode="r").reshape(-1, channels)
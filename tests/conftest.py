@@ -0,0 +1,25 @@
+"""
+测试共用：随机初始化的小型 HTDemucs（不下载权重），需要 torch + demucs，未安装时相关测试跳过
+"""
+import pytest
+
+
+@pytest.fixture
+def tiny_engine():
+    """返回 make(preset="standard", **engine_kwargs)，每次构造一个常驻小模型的 SeparationEngine"""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("demucs")
+    from demucs.htdemucs import HTDemucs
+
+    from separation_engine import SeparationEngine
+
+    def make(preset="standard", **kwargs):
+        torch.manual_seed(0)
+        model = HTDemucs(["drums", "bass", "other", "vocals"], channels=4, depth=2, t_layers=1, segment=2)
+        model.eval()
+        kwargs.setdefault("backend", "fp32")
+        engine = SeparationEngine("tiny-htdemucs", preset=preset, **kwargs)
+        engine.model = model  # load_model() 直接返回常驻模型
+        return engine
+
+    return make
@@ -0,0 +1,22 @@
+"""
+批处理输入展开：只有源文件同在时才把 {base}_{stem} 当作分轨跳过
+"""
+import os
+
+from batch_separation import expand_inputs
+
+
+def _touch(folder, *names):
+    for name in names:
+        (folder / name).write_bytes(b"")
+
+
+def test_skips_stems_next_to_their_source(tmp_path):
+    _touch(tmp_path, "song.wav", "song_vocals.wav", "song_bass.flac", "song_accompaniment.wav")
+    assert [os.path.basename(p) for p in expand_inputs([str(tmp_path)])] == ["song.wav"]
+
+
+def test_keeps_sources_that_only_look_like_stems(tmp_path):
+    _touch(tmp_path, "choir_vocals.wav", "walking_bass.mp3", "live_other.flac")
+    names = [os.path.basename(p) for p in expand_inputs([str(tmp_path)])]
+    assert names == ["choir_vocals.wav", "live_other.flac", "walking_bass.mp3"]
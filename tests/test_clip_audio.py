@@ -0,0 +1,64 @@
+"""
+非破坏片段编辑：切分 / 裁剪 / 滑移逐帧准确，视图共享同一缓冲
+"""
+import numpy as np
+
+from clip_audio import ClipView, PagedAudio
+
+SR = 44100
+
+
+def _ramp(frames=1000):
+    """每帧的值等于帧号，左右声道相反，便于检查对齐"""
+    n = np.arange(frames, dtype=np.float32)
+    return np.column_stack((n, -n))
+
+
+def test_split_is_sample_accurate():
+    audio = _ramp()
+    view = ClipView(audio, sr=SR)
+    left, right = view.split(337)
+    assert (len(left), len(right)) == (337, 663)
+    np.testing.assert_array_equal(np.concatenate([left[:], right[:]]), audio)
+    assert left.buffer is right.buffer is view.buffer
+    assert right[0][0] == 337 and left[-1][0] == 336
+
+
+def test_trim_and_nested_views():
+    audio = _ramp()
+    view = ClipView(audio, sr=SR).trim(100, 900)
+    np.testing.assert_array_equal(view[:], audio[100:900])
+    inner = view.split(50)[1].trim(10, 20)  # 视图的视图直接指向底层缓冲
+    assert inner.buffer is view.buffer and inner.offset == 160
+    np.testing.assert_array_equal(inner[:], audio[160:170])
+    assert len(view.trim(700, 2000)) == 100  # 超出范围的端点被截住
+
+
+def test_slip_moves_the_window_and_clamps():
+    audio = _ramp()
+    view = ClipView(audio, sr=SR).trim(200, 300)
+    np.testing.assert_array_equal(view.slip(-50)[:], audio[150:250])
+    np.testing.assert_array_equal(view.slip(25)[:], audio[225:325])
+    assert view.slip(-10000).offset == 0
+    assert view.slip(10000).offset == len(audio) - len(view)
+    assert len(view.slip(10000)) == len(view)
+
+
+def test_gain_and_duplicate_do_not_touch_the_buffer():
+    audio = _ramp()
+    view = ClipView(audio, sr=SR)
+    louder = view.with_gain(2.0).split(10)[1]
+    np.testing.assert_array_equal(louder[:5], audio[10:15] * 2.0)
+    out = np.empty((5, 2), dtype=np.float32)
+    np.testing.assert_array_equal(louder.read_into(0, 5, out), audio[10:15] * 2.0)
+    np.testing.assert_array_equal(view.duplicate()[:], audio)
+    np.testing.assert_array_equal(view[:], audio)  # 原缓冲没有被原地乘增益
+
+
+def test_paged_audio_converts_pcm_and_mono():
+    pcm = np.array([0, 16384, -32768, 32767], dtype=np.int16)
+    buffer = PagedAudio(pcm, SR)
+    block = buffer[1:3]
+    assert block.shape == (2, 2) and block.dtype == np.float32
+    np.testing.assert_allclose(block[:, 0], pcm[1:3] / 32767.0)
+    np.testing.assert_array_equal(block[:, 0], block[:, 1])
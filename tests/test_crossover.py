@@ -0,0 +1,48 @@
+"""
+LR4 分频滤波器组：频段之和还原输入，分块与多线程不改变结果
+"""
+import numpy as np
+import pytest
+
+from crossover import CrossoverFilterbank, split_bands
+
+SR = 44100
+
+
+def _noise(frames=SR * 2, channels=2, seed=0):
+    return (np.random.default_rng(seed).standard_normal((frames, channels)) * 0.3).astype(np.float32)
+
+
+@pytest.mark.parametrize("crossovers", [(200.0, 2000.0), (120.0, 800.0, 5000.0)])
+def test_bands_sum_to_input(crossovers):
+    audio = _noise()
+    bands = CrossoverFilterbank(SR, crossovers).split(audio)
+    assert len(bands) == len(crossovers) + 1
+    assert all(b.shape == audio.shape and b.dtype == np.float32 for b in bands)
+    np.testing.assert_allclose(sum(b.astype(np.float64) for b in bands), audio, atol=1e-5)
+
+
+def test_block_size_and_threads_do_not_change_the_result():
+    audio = _noise(frames=50000)
+    ref = CrossoverFilterbank(SR, block_frames=1 << 16, workers=1).split(audio)
+    out = CrossoverFilterbank(SR, block_frames=997, workers=2).split(audio)
+    for a, b in zip(ref, out):
+        np.testing.assert_allclose(a, b, atol=1e-6)
+
+
+def test_tones_land_in_their_band():
+    t = np.arange(SR) / SR
+    tones = {"bass": 60.0, "drums": 700.0, "vocals": 8000.0}
+    for name, freq in tones.items():
+        audio = np.sin(2 * np.pi * freq * t).astype(np.float32)
+        bands, _ = split_bands(audio, SR)
+        settled = {k: float(np.sqrt(np.mean(v[SR // 4:] ** 2))) for k, v in bands.items()}
+        assert max(settled, key=settled.get) == name
+        assert settled[name] > 0.6  # 正弦 RMS 约 0.707，主要能量留在本频段
+
+
+def test_mono_input_keeps_one_channel():
+    audio = _noise(channels=1)[:, 0]
+    bands = CrossoverFilterbank(SR).split(audio)
+    assert bands[0].shape == (len(audio), 1)
+    np.testing.assert_allclose(sum(bands)[:, 0], audio, atol=1e-5)
@@ -0,0 +1,61 @@
+"""
+推理后端：auto 不在分离时运行一致性检查，缓存键区分后端；一致性检查与选择的记录
+（需要 torch + demucs，用随机初始化的小型 HTDemucs）
+"""
+import numpy as np
+import pytest
+
+import inference_backends
+import separation_engine
+
+SR = 44100
+
+
+@pytest.fixture
+def no_parity_check(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("分离时不应运行一致性检查")
+
+    monkeypatch.setattr(inference_backends, "parity_check", fail)
+    monkeypatch.setattr(inference_backends, "select_backend", fail)
+
+
+def test_auto_without_a_stored_choice_runs_fp32(tiny_engine, monkeypatch, no_parity_check):
+    monkeypatch.setattr(separation_engine, "stored_choice", lambda model_name: None)
+    engine = tiny_engine(backend="auto")
+    engine.inference_model()
+    assert engine.backend.name == "fp32"
+
+
+def test_auto_uses_the_stored_choice(tiny_engine, monkeypatch, no_parity_check):
+    monkeypatch.setattr(separation_engine, "stored_choice", lambda model_name: "int8")
+    engine = tiny_engine(backend="auto")
+    assert engine.resolved_backend() == "int8"
+
+
+def test_cache_key_includes_non_fp32_backends(tiny_engine, monkeypatch):
+    monkeypatch.setattr(separation_engine, "stored_choice", lambda model_name: None)
+    audio = np.zeros((SR, 2), dtype=np.float32)
+    keys = {name: tiny_engine(backend=name).cache_key(audio, SR) for name in ("fp32", "auto", "int8", "jit")}
+    assert keys["auto"] == keys["fp32"]  # 没有记录时 auto 就是 fp32
+    assert len({keys["fp32"], keys["int8"], keys["jit"]}) == 3
+    assert "backend" not in tiny_engine(backend="fp32").cache_params()  # fp32 的键与以前相同
+
+
+def test_parity_check_and_stored_choice(tiny_engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_backends.JitBackend.__init__, "__defaults__", (str(tmp_path / "jit"),))
+    model = tiny_engine().load_model()
+    rows = inference_backends.parity_check(model, names=["int8", "jit"], seconds=4.0, log=None)
+    assert [r["backend"] for r in rows] == ["fp32", "int8", "jit"]
+    assert rows[0]["ok"] and rows[0]["max_abs"] == 0.0
+    for row in rows[1:]:
+        if row["seconds"] is not None:
+            assert row["ok"] == (row["max_abs"] <= inference_backends.DEFAULT_TOLERANCE)
+    jit = rows[2]
+    if jit["seconds"] is not None:
+        assert jit["max_abs"] < 1e-4  # TorchScript 与 eager 是同一份 fp32 计算
+
+    path = str(tmp_path / "backends.json")
+    choice = inference_backends.select_backend(model, "tiny-htdemucs", seconds=4.0, path=path, log=None)
+    assert choice in inference_backends.BACKENDS
+    assert inference_backends.stored_choice("tiny-htdemucs", path=path) == choice
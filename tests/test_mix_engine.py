@@ -0,0 +1,54 @@
+"""
+混音引擎：ClipView 片段走内存缓冲的规整一次路径，映射的缓冲仍按需分页
+"""
+from types import SimpleNamespace
+
+import numpy as np
+from scipy.io import wavfile
+
+from clip_audio import ClipView, PagedAudio
+from mix_engine import MixEngine
+
+SR = 44100
+
+
+def _clip(view, start_time=0.0, track=0):
+    return SimpleNamespace(audio_data=view, start_time=start_time, sample_rate=SR, muted=False, track_idx=track)
+
+
+def test_in_memory_views_share_one_float32_array():
+    stem = np.random.default_rng(0).standard_normal((SR, 2)).astype(np.float32)
+    left, right = ClipView(stem, sr=SR).split(SR // 2)
+    engine = MixEngine(block_frames=512)
+    engine.rebuild([_clip(left), _clip(right.with_gain(0.5), start_time=1.0)])
+    sources = [e[2] for e in engine._entries]
+    assert all(isinstance(s, np.ndarray) and np.shares_memory(s, stem) for s in sources)
+
+    buf, has_audio = engine.mix(None, SR // 2 - 256)  # 跨过左半段末尾
+    assert has_audio
+    np.testing.assert_array_equal(buf[:256], stem[SR // 2 - 256:SR // 2])
+    assert not buf[256:].any()
+    buf, _ = engine.mix(None, SR)
+    np.testing.assert_allclose(buf, stem[SR // 2:SR // 2 + 512] * 0.5, rtol=1e-6)
+
+
+def test_integer_and_mono_buffers_are_normalised_once():
+    pcm = (np.arange(SR, dtype=np.int64) % 2000 - 1000).astype(np.int16)
+    buffer = PagedAudio(pcm, SR)
+    engine = MixEngine(block_frames=256)
+    clips = [_clip(ClipView(buffer)), _clip(ClipView(buffer).slip(0), start_time=2.0)]
+    engine.rebuild(clips)
+    first, second = (e[2] for e in engine._entries)
+    assert first is second and first.dtype == np.float32 and first.shape == (SR, 2)
+    buf, _ = engine.mix(None, 1000)
+    np.testing.assert_allclose(buf[:, 0], pcm[1000:1256] / 32767.0, rtol=1e-6)
+    np.testing.assert_array_equal(buf[:, 0], buf[:, 1])
+
+
+def test_mapped_buffers_stay_paged(tmp_path):
+    path = str(tmp_path / "stem.wav")
+    wavfile.write(path, SR, np.zeros((SR, 2), dtype=np.float32))
+    buffer = PagedAudio.open_wav(path)
+    engine = MixEngine()
+    engine.rebuild([_clip(ClipView(buffer))])
+    assert engine._entries[0][2] is buffer
@@ -0,0 +1,101 @@
+"""
+播放预缓冲：定位后立即取到新位置的块；回调拿到的数据不会被生产者改写
+"""
+import threading
+
+import numpy as np
+
+from playback_buffer import BlockRingBuffer
+
+
+def _fill(ring, start_frame=0):
+    frame = start_frame
+    while True:
+        slot = ring.next_slot()
+        if slot is None:
+            return frame
+        slot[:] = frame
+        ring.commit(frame, ring.generation)
+        frame += ring.block_frames
+
+
+def _frames_of(data, ring):
+    return np.frombuffer(data, dtype=np.float32).reshape(ring.block_frames, -1)
+
+
+def test_pop_returns_bytes_that_survive_refills():
+    ring = BlockRingBuffer(4, 16)
+    frame = _fill(ring)
+    for _ in range(10):  # 读写位置转过几圈，覆盖每个槽
+        data, start = ring.pop()
+        assert isinstance(data, bytes)
+        frame = _fill(ring, frame)  # 取走一块后生产者立即补满
+        assert (_frames_of(data, ring) == start).all()
+
+
+def test_seek_then_pop_returns_the_new_block():
+    ring = BlockRingBuffer(4, 16)
+    _fill(ring)
+    assert ring.full
+    ring.flush()
+    # 旧块不再占用槽位：生产者无需等回调丢弃它们就能从新位置填满
+    assert len(ring) == 0 and ring.next_slot() is not None
+    _fill(ring, 1000)
+    data, start = ring.pop()
+    assert start == 1000 and (_frames_of(data, ring) == 1000).all()
+
+
+def test_block_committed_across_a_flush_is_dropped():
+    ring = BlockRingBuffer(4, 16)
+    slot = ring.next_slot()
+    gen = ring.generation  # 生产者开始混音时读到的代
+    ring.flush()
+    slot[:] = 0
+    ring.commit(0, gen)
+    assert ring.pop() is None
+    _fill(ring, 500)
+    assert ring.pop()[1] == 500
+
+
+def test_blocks_come_out_in_order_across_generations():
+    ring = BlockRingBuffer(3, 8)
+    _fill(ring)
+    assert [ring.pop()[1] for _ in range(2)] == [0, 8]
+    ring.flush()
+    _fill(ring, 800)
+    assert [ring.pop()[1] for _ in range(3)] == [800, 808, 816]
+    assert ring.pop() is None
+
+
+def test_concurrent_producer_consumer_and_seeks():
+    ring = BlockRingBuffer(4, 32)
+    stop = threading.Event()
+
+    def producer():
+        frame, gen = 0, ring.generation
+        while not stop.is_set():
+            if ring.generation != gen:
+                gen, frame = ring.generation, gen * 100000 + 100000
+            slot = ring.next_slot()
+            if slot is None:
+                continue
+            slot[:] = frame
+            ring.commit(frame, gen)
+            frame += ring.block_frames
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    try:
+        popped = 0
+        for i in range(20000):
+            if i % 500 == 499:
+                ring.flush()
+            item = ring.pop()
+            if item is not None:
+                data, start = item
+                assert (_frames_of(data, ring) == start).all()  # 数据完整，没有被改写一半
+                popped += 1
+    finally:
+        stop.set()
+        thread.join()
+    assert popped
@@ -0,0 +1,81 @@
+"""
+工程文件：保存 / 打开往返；来自分轨缓存的分轨链接进工程，缓存淘汰后仍可打开且不重新哈希
+"""
+import os
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+from scipy.io import wavfile
+
+import project_file
+from clip_audio import ClipView, PagedAudio
+from project_file import ProjectStore
+from stem_cache import StemCache
+from waveform_peaks import PeakPyramid
+
+SR = 44100
+
+
+def _audio(seed, frames=SR):
+    return (np.random.default_rng(seed).standard_normal((frames, 2)) * 0.1).astype(np.float32)
+
+
+def _clip(view, name, track, start=0.0, peaks=None):
+    return SimpleNamespace(audio_data=view, peaks=peaks, name=name, track_idx=track, start_time=start, muted=False)
+
+
+def _save_and_reopen(tmp_path, clips, cache=None, folder="proj"):
+    path = str(tmp_path / folder / "song.ssproj")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    store = ProjectStore(path, cache=cache)
+    assert store.save({"path": "", "sample_rate": SR, "duration": 1.0, "peaks": None}, clips, 2.0,
+                      [{"gain_db": -3.0, "pan": 0.0, "mute": False, "solo": False}])
+    assert not store.save({"path": "", "sample_rate": SR, "duration": 1.0, "peaks": None}, clips, 2.0,
+                          [{"gain_db": -3.0, "pan": 0.0, "mute": False, "solo": False}])  # 没变化不写盘
+    return path
+
+
+def test_round_trip_keeps_edits_and_tracks(tmp_path):
+    vocals, drums = _audio(0), _audio(1)
+    wav = str(tmp_path / "song_drums.wav")
+    wavfile.write(wav, SR, drums)
+    left, right = ClipView(vocals, sr=SR).split(1000)
+    clips = [_clip(left, "vocals", 0, peaks=PeakPyramid.build(vocals, SR)),
+             _clip(right.with_gain(0.5).trim(10, 5000), "vocals", 0, start=1.0),
+             _clip(ClipView(PagedAudio.open_wav(wav)).slip(0), "drums", 1)]
+    data = ProjectStore(_save_and_reopen(tmp_path, clips)).load()
+
+    assert data["missing"] == [] and data["tracks"][0]["gain_db"] == -3.0
+    assert [(c["name"], c["track"], c["start"]) for c in data["clips"]] == [
+        ("vocals", 0, 0.0), ("vocals", 0, 1.0), ("drums", 1, 0.0)]
+    views = [c["view"] for c in data["clips"]]
+    np.testing.assert_array_equal(views[0][:], vocals[:1000])
+    np.testing.assert_allclose(views[1][:], vocals[1010:6000] * 0.5)
+    np.testing.assert_array_equal(views[2][:], drums)
+    assert data["clips"][0]["peaks"] is not None
+    assert views[0].buffer is views[1].buffer  # 同一分轨只引用一次
+
+
+def test_cached_stems_survive_eviction_without_rehashing(tmp_path, monkeypatch):
+    cache = StemCache(str(tmp_path / "cache"))
+    stems = {"vocals": _audio(2), "accompaniment": _audio(3)}
+    cache.store("ab" * 32, stems, SR)
+    loaded, _ = cache.load("ab" * 32, mmap=True)
+    clips = [_clip(ClipView(PagedAudio(loaded[name], SR)), name, i) for i, name in enumerate(loaded)]
+
+    def no_hash(path):
+        raise AssertionError(f"缓存中的分轨不应重新哈希: {path}")
+
+    monkeypatch.setattr(project_file, "file_sha256", no_hash)
+    path = _save_and_reopen(tmp_path, clips, cache=cache)
+    del clips, loaded
+    cache.discard("ab" * 32)  # 缓存被淘汰
+
+    # 整个工程目录拷到别处（另一台机器）也能打开
+    moved = str(tmp_path / "elsewhere")
+    shutil.copytree(os.path.dirname(path), moved)
+    data = ProjectStore(os.path.join(moved, "song.ssproj")).load()
+    assert data["missing"] == []
+    for clip in data["clips"]:
+        np.testing.assert_array_equal(clip["view"][:], stems[clip["name"]])
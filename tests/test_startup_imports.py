@@ -0,0 +1,28 @@
+"""
+启动时的导入：界面模块在窗口出现之前不能导入 torch / torchaudio（它们只在后台线程里加载）
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = textwrap.dedent("""
+    import sys
+    sys.path[:0] = [{fake!r}, {bench!r}]
+    import headless
+    headless.install()
+    headless.load_studio()
+    print(sorted(name for name in ("torch", "torchaudio", "demucs") if name in sys.modules))
+""")
+
+
+def test_gui_module_does_not_import_torch(tmp_path):
+    # 放一份空的 torch / torchaudio / demucs 在最前面：即使本机没装，误导入也能被发现
+    for name in ("torch", "torchaudio", "demucs"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "__init__.py").write_text("")
+    code = _PROBE.format(fake=str(tmp_path), bench=os.path.join(ROOT, "benchmarks"))
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "[]"
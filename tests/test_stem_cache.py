@@ -0,0 +1,80 @@
+"""
+分轨缓存：写入 / 读取 / LRU 淘汰，以及多个进程同时写入同一缓存目录
+"""
+import multiprocessing
+import os
+
+import numpy as np
+
+from stem_cache import StemCache, audio_cache_key
+
+FRAMES = 1000
+ENTRY_BYTES = 2 * (FRAMES * 2 * 4 + 128)  # 两个 .npy 分轨（含文件头）
+
+
+def _stems(value):
+    return {name: np.full((FRAMES, 2), value, dtype=np.float32) for name in ("vocals", "accompaniment")}
+
+
+def _age(cache, key, seconds_ago):
+    t = os.stat(cache._entry_dir(key)).st_mtime - seconds_ago
+    os.utime(cache._entry_dir(key), (t, t))
+
+
+def test_store_then_load_round_trip(tmp_path):
+    cache = StemCache(str(tmp_path))
+    audio = np.random.default_rng(0).standard_normal((FRAMES, 2)).astype(np.float32)
+    key = audio_cache_key(audio, 44100, "htdemucs")
+    assert cache.load(key) is None
+    cache.store(key, _stems(0.5), 44100, meta={"mode": "2stems"})
+    assert cache.lookup(key)["meta"] == {"mode": "2stems"}
+    stems, sr = cache.load(key, mmap=True)
+    assert sr == 44100 and list(stems) == ["vocals", "accompaniment"]
+    np.testing.assert_array_equal(stems["vocals"], _stems(0.5)["vocals"])
+    assert cache.total_bytes == ENTRY_BYTES
+
+
+def test_load_only_touches_its_own_entry(tmp_path):
+    cache = StemCache(str(tmp_path))
+    cache.store("aa01", _stems(1), 44100)
+    _age(cache, "aa01", 100)
+    before = os.stat(cache._entry_dir("aa01")).st_mtime
+    assert cache.load("aa01") is not None
+    assert os.stat(cache._entry_dir("aa01")).st_mtime > before + 50
+    assert sorted(os.listdir(tmp_path)) == ["aa"]  # 没有共享索引文件被改写
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = StemCache(str(tmp_path), max_bytes=3 * ENTRY_BYTES)
+    for age, key in ((30, "aa01"), (20, "bb02"), (10, "cc03")):
+        cache.store(key, _stems(0), 44100)
+        _age(cache, key, age)
+    cache.load("aa01")  # 最旧的条目刚被访问，淘汰时应保留
+    cache.store("dd04", _stems(0), 44100)
+    assert cache.lookup("bb02") is None
+    assert all(cache.lookup(k) is not None for k in ("aa01", "cc03", "dd04"))
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def _writer(root, worker):
+    cache = StemCache(root, max_bytes=4 * ENTRY_BYTES)
+    for i in range(6):
+        cache.store(f"{worker:02d}{i:02d}", _stems(worker), 44100)
+        cache.store("ffff", _stems(-1), 44100)  # 所有进程都写同一个条目
+
+
+def test_concurrent_writers_keep_cache_consistent(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_writer, args=(str(tmp_path), w)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    cache = StemCache(str(tmp_path), max_bytes=4 * ENTRY_BYTES)
+    assert 0 < cache.total_bytes <= cache.max_bytes
+    assert not [n for n in os.listdir(tmp_path) if n.startswith("tmp-")]
+    for _, _, key in cache._scan():
+        stems, _ = cache.load(key)
+        expected = -1 if key == "ffff" else int(key[:2])
+        assert (stems["vocals"] == expected).all()
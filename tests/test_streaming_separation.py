@@ -0,0 +1,111 @@
+"""
+流式分离：窗口规划与接缝拼接（不需要 torch），全局归一化参数，
+以及在小型 HTDemucs 上与整文件分离的一致性（需要 torch + demucs）
+"""
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from audio_io import AudioBlockReader
+from presets import preset_params
+from streaming_separation import StreamingSeparator, WindowStitcher, window_starts
+
+SR = 44100
+
+
+def _separator(window_seconds=30.0, preset="standard", overlap_seconds=None):
+    engine = SimpleNamespace(use_ai=True, preset=preset, cache=None, model_name="fake")
+    return StreamingSeparator(engine, window_seconds=window_seconds, overlap_seconds=overlap_seconds, log=None)
+
+
+@pytest.mark.parametrize("src_sr", [44100, 48000, 22050])
+def test_windows_follow_the_segment_grid(src_sr):
+    model = SimpleNamespace(segment=7.8, samplerate=SR)
+    plan = _separator()._plan(model, src_sr, SR)
+    seg = int(7.8 * SR)
+    stride = int((1 - preset_params("standard")["overlap"]) * seg)
+    out_frames = 10 * 60 * SR
+    starts = window_starts(out_frames, plan)
+
+    assert plan["overlap"] > 2 * plan["margin"]  # 中段留有淡化区
+    assert plan["margin"] >= seg + SR // 2  # 余量覆盖一个分段 + 最大平移
+    assert starts[0] == 0 and starts[-1] < out_frames - plan["overlap"]
+    assert all(b - a == plan["window"] - plan["overlap"] for a, b in zip(starts, starts[1:]))
+    for start in starts:
+        assert start * src_sr % SR == 0  # 映射回源文件落在整数帧上
+        if src_sr == SR:
+            assert start % stride == 0  # 与整文件模式的分段网格对齐
+
+
+def _stitch(signal, plan, window_output):
+    frames = signal.shape[-1]
+    stitcher = WindowStitcher(plan, frames)
+    starts = window_starts(frames, plan)
+    pieces = []
+    for k, start in enumerate(starts):
+        last = k == len(starts) - 1
+        end = frames if last else start + plan["window"]
+        pieces.append(stitcher.push(window_output(k, start, end), last))
+    return np.concatenate(pieces, axis=-1)
+
+
+PLAN = {"window": 1000, "overlap": 300, "margin": 50}
+
+
+def test_stitching_identical_windows_reproduces_the_input():
+    signal = np.random.default_rng(0).standard_normal((2, 2, 4321)).astype(np.float32)
+    out = _stitch(signal, PLAN, lambda k, start, end: signal[..., start:end].copy())
+    assert out.shape == signal.shape
+    np.testing.assert_allclose(out, signal, atol=1e-6)
+
+
+def test_seam_keeps_margins_and_crossfades_the_middle():
+    frames = 2500
+    out = _stitch(np.zeros((1, frames)), PLAN,
+                  lambda k, start, end: np.full((1, end - start), float(k), dtype=np.float32))[0]
+    seam = PLAN["window"] - PLAN["overlap"]  # 第二个窗口的起点
+    margin, fade_end = seam + PLAN["margin"], seam + PLAN["overlap"] - PLAN["margin"]
+    assert len(out) == frames
+    assert (out[:margin] == 0).all()  # 接缝前 margin 帧仍用旧窗口
+    assert (out[fade_end:seam + PLAN["window"] - PLAN["overlap"]] == 1).all()
+    fade = out[margin:fade_end]
+    assert (np.diff(fade) > 0).all() and 0 < fade[0] < fade[-1] < 1
+    np.testing.assert_allclose(fade + fade[::-1], 1.0, atol=1e-6)  # 两侧权重之和为 1
+
+
+def test_scan_matches_whole_file_statistics(tmp_path):
+    # 大直流偏置 + 很小的起伏：Σx² - n·mean² 在这里会丢掉大部分有效位
+    rng = np.random.default_rng(0)
+    n = 3 * SR + 123
+    audio = (0.9 + 1e-4 * rng.standard_normal((n, 2))).astype(np.float32)
+    path = str(tmp_path / "dc.wav")
+    wavfile.write(path, SR, audio)
+
+    mean, std, key = _separator(window_seconds=1.0)._scan(AudioBlockReader(path))
+    ref = audio.mean(axis=1, dtype=np.float64)
+    assert key is None
+    assert math.isclose(mean, ref.mean(), rel_tol=1e-12)
+    assert math.isclose(std, ref.std(ddof=1), rel_tol=1e-9)
+
+
+@pytest.mark.parametrize("preset", ["draft", "standard"])
+def test_stream_matches_whole_file(tiny_engine, tmp_path, preset):
+    from stem_export import StemExporter
+
+    engine = tiny_engine(preset)
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal((int(SR * 30.5), 2)) * 0.1).astype(np.float32)
+    path = str(tmp_path / "long.wav")
+    wavfile.write(path, SR, audio)
+
+    whole, _ = engine.separate_demucs(audio, SR)
+    with StemExporter("wav32f", log=None) as exporter:
+        result = StreamingSeparator(engine, window_seconds=12.0, log=None, exporter=exporter).separate_file(path)
+    assert len(result["outputs"]) == len(whole)
+    for out_path, name in zip(result["outputs"], whole):
+        sr, streamed = wavfile.read(out_path)
+        assert sr == SR and streamed.shape == whole[name].shape
+        np.testing.assert_allclose(streamed, whole[name], atol=1e-4)
@@ -0,0 +1,44 @@
+"""
+界面：换了分轨选择后按新选择重新查缓存（无显示器，替身见 benchmarks/headless.py，在子进程里运行）
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = textwrap.dedent("""
+    import sys, threading, types
+    sys.path.insert(0, {bench!r})
+    import numpy as np
+    import headless
+    headless.install()
+    studio = headless.load_studio()
+
+    loaded = threading.Event()
+    lookups = []
+
+    class Engine:
+        stems = "all"
+        def lookup_cache(self, data, sr, mmap=False):
+            lookups.append(self.stems)
+            return ({{"vocals": data, "accompaniment": data}}, sr) if self.stems == "2stems" else None
+
+    app = studio.ModernStudioApp.__new__(studio.ModernStudioApp)
+    app.engine = Engine()
+    app.root = types.SimpleNamespace(after=lambda ms, fn, *args: fn(*args))
+    app.var_stems = types.SimpleNamespace(get=lambda: "2stems")
+    app.update_status = lambda text: None
+    app.audio_data, app.sample_rate, app._load_gen, app.cached_stems = np.zeros((10, 2), np.float32), 44100, 3, None
+    app._try_load_existing_stems = lambda: loaded.set() or True
+    app._on_stems_changed()
+    assert loaded.wait(10)
+    print(lookups, sorted(app.cached_stems[0]))
+""")
+
+
+def test_changing_stem_selection_rechecks_the_cache():
+    code = _PROBE.format(bench=os.path.join(ROOT, "benchmarks"))
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "['2stems'] ['accompaniment', 'vocals']"
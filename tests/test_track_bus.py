@@ -0,0 +1,65 @@
+"""
+主总线前视限幅器：输出不超过 ceiling，延迟等于前视长度；TrackBus 补偿这段延迟
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from clip_audio import ClipView
+from mix_engine import MixEngine
+from track_bus import LIMITER_CEILING, LookaheadLimiter, TrackBus
+
+SR = 44100
+
+
+def _run(limiter, audio, block_sizes):
+    out, start, i = [], 0, 0
+    while start < len(audio):
+        n = block_sizes[i % len(block_sizes)]
+        out.append(limiter.process(audio[start:start + n].copy()))
+        start += n
+        i += 1
+    return np.concatenate(out)
+
+
+def test_ceiling_is_never_exceeded():
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal((SR * 2, 2)) * 0.4).astype(np.float32)
+    audio[rng.integers(0, len(audio), 50)] *= 8.0  # 零星的大峰值
+    audio[SR:SR + 2000] *= 5.0                     # 一段持续过载
+    limiter = LookaheadLimiter(SR)
+    out = _run(limiter, audio, [2048, 17, 4096, 333])
+    assert np.abs(out).max() <= LIMITER_CEILING * (1 + 1e-6)
+
+
+def test_latency_equals_lookahead():
+    limiter = LookaheadLimiter(SR, lookahead_ms=5.0)
+    assert limiter.delay == int(round(SR * 0.005)) - 1
+    audio = np.zeros((4096, 2), dtype=np.float32)
+    audio[1000] = (0.5, -0.25)  # 低于 ceiling：只经过延迟线
+    out = _run(limiter, audio, [512])
+    assert np.flatnonzero(out[:, 0]).tolist() == [1000 + limiter.delay]
+    np.testing.assert_array_equal(out[1000 + limiter.delay], audio[1000])
+
+
+def test_gain_is_down_before_the_peak_arrives():
+    limiter = LookaheadLimiter(SR)
+    d = limiter.delay
+    audio = np.full((8192, 2), 0.5, dtype=np.float32)
+    audio[4000] = 4.0
+    out = _run(limiter, audio, [1024])
+    assert abs(out[4000 + d, 0]) <= LIMITER_CEILING * (1 + 1e-6)
+    # 前视窗口之前还没有压低，峰值之前的音频原样延迟输出
+    np.testing.assert_array_equal(out[d:4000 + d - limiter.window], audio[:4000 - limiter.window])
+
+
+def test_bus_output_stays_aligned_with_the_timeline():
+    audio = np.random.default_rng(1).uniform(-0.5, 0.5, (SR, 2)).astype(np.float32)
+    clip = SimpleNamespace(audio_data=ClipView(audio, sr=SR), start_time=0.0, sample_rate=SR,
+                           muted=False, track_idx=0)
+    bus = TrackBus(["a"], SR, block_frames=1024)
+    mixer = MixEngine(block_frames=1024)
+    out = np.empty((1024, 2), dtype=np.float32)
+    for frame in (0, 1024, 20000, 21024):  # 顺序播放与定位后的第一块都对齐到 frame
+        bus.render(mixer, [clip], frame, out)
+        np.testing.assert_allclose(out, audio[frame:frame + 1024], atol=1e-6)
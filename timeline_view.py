@@ -0,0 +1,135 @@
+"""
+时间轴网格与标尺的视口渲染
+只绘制可见区域（加左右各一屏的余量）内的网格线、刻度和标签，图元数与时间轴总长度无关：
+- 刻度间隔按缩放（每秒像素数）选取，保证标签之间至少 MIN_LABEL_PX 像素
+- 网格线、刻度、标签放在按类型复用的图元池里，滚动时只改 coords / text，多余的隐藏而不删除
+- 轨道背景每轨只有一个矩形和一条分隔线，宽度变化时改 coords
+"""
+import math
+
+# 可选的刻度间隔（秒）
+TICK_STEPS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+MIN_LABEL_PX = 48
+
+
+def tick_step(px_per_sec, min_px=MIN_LABEL_PX):
+    """相邻主刻度至少相距 min_px 像素的最小间隔"""
+    for step in TICK_STEPS:
+        if step * px_per_sec >= min_px:
+            return step
+    return TICK_STEPS[-1]
+
+
+def tick_label(t, step):
+    if t >= 60 and step >= 1:
+        return f"{int(t // 60)}:{int(t % 60):02d}"
+    return f"{t:g}s"
+
+
+class CanvasItemPool:
+    """同一类图元的复用池：每次重绘 begin() 后依次 take()，end() 隐藏本次没用到的"""
+
+    def __init__(self, canvas, kind, **options):
+        self.canvas = canvas
+        self._create = getattr(canvas, f"create_{kind}")
+        self.options = options
+        self.items = []
+        self._configs = []  # 与 items 对齐：最近一次设置的选项，未变化时不再调用 itemconfigure
+        self._shown = 0
+        self._used = 0
+
+    def begin(self):
+        self._used = 0
+
+    def take(self, *coords, **config):
+        i = self._used
+        self._used += 1
+        if i < len(self.items):
+            item = self.items[i]
+            self.canvas.coords(item, *coords)
+            changed = {k: v for k, v in config.items() if self._configs[i].get(k) != v}
+            if i >= self._shown:
+                changed["state"] = "normal"
+            if changed:
+                self.canvas.itemconfigure(item, **changed)
+                self._configs[i].update(config)
+            return item
+        item = self._create(*coords, **self.options, **config)
+        self.items.append(item)
+        self._configs.append(dict(config))
+        return item
+
+    def end(self):
+        for item in self.items[self._used:self._shown]:
+            self.canvas.itemconfigure(item, state="hidden")
+        self._shown = self._used
+        return self._used
+
+
+class TimelineGrid:
+    """多轨时间轴的背景网格（timeline 画布）与时间标尺（ruler 画布）"""
+
+    def __init__(self, timeline, ruler, track_count, track_height, ruler_height, colors, tag="grid"):
+        self.timeline = timeline
+        self.ruler = ruler
+        self.track_count = track_count
+        self.track_height = track_height
+        self.ruler_height = ruler_height
+        self.tag = tag
+        self.height = track_count * track_height
+        self._width = None
+        self._tracks = []
+        for i in range(track_count):
+            y = i * track_height
+            bg = "#161616" if i % 2 == 0 else "#121212"
+            self._tracks.append((
+                timeline.create_rectangle(0, y, 0, y + track_height, fill=bg, outline="", tags=tag),
+                timeline.create_line(0, y + track_height, 0, y + track_height, fill=colors["border"], tags=tag)))
+        # 时间标尺底部边框（增强分隔感，避免“遮挡标尺”的观感）
+        self._ruler_border = ruler.create_line(0, ruler_height - 1, 0, ruler_height - 1, fill=colors["border"])
+        self.major = CanvasItemPool(timeline, "line", fill=colors["grid"], tags=tag)
+        self.minor = CanvasItemPool(timeline, "line", fill="#1e1e1e", dash=(2, 4), tags=tag)
+        self.ticks = CanvasItemPool(ruler, "line", fill=colors["text_dim"])
+        self.labels = CanvasItemPool(ruler, "text", fill=colors["text_dim"], font=("Segoe UI", 8), anchor="n")
+
+    def _resize(self, width):
+        if width == self._width:
+            return
+        self._width = width
+        self.timeline.configure(scrollregion=(0, 0, width, self.height))
+        # 标尺没有自己的滚动条，靠 xview_moveto 与时间轴同步，必须有相同的滚动区域
+        self.ruler.configure(scrollregion=(0, 0, width, self.ruler_height))
+        for i, (rect, line) in enumerate(self._tracks):
+            y = i * self.track_height
+            self.timeline.coords(rect, 0, y, width, y + self.track_height)
+            self.timeline.coords(line, 0, y + self.track_height, width, y + self.track_height)
+        self.ruler.coords(self._ruler_border, 0, self.ruler_height - 1, width, self.ruler_height - 1)
+
+    def redraw(self, px_per_sec, total_seconds, view_left, view_width):
+        """只重绘 [view_left - view_width, view_left + 2 * view_width) 内的刻度；返回本次使用的图元数"""
+        width = max(view_width, int(total_seconds * px_per_sec))
+        self._resize(width)
+
+        step = tick_step(px_per_sec)
+        step_px = step * px_per_sec
+        lo = max(0.0, view_left - view_width)
+        hi = min(width, view_left + 2 * view_width)
+        first = int(math.floor(lo / step_px))
+        last = int(min(math.floor(hi / step_px), math.floor(total_seconds / step + 1e-9)))
+
+        h, rh = self.height, self.ruler_height
+        for pool in (self.major, self.minor, self.ticks, self.labels):
+            pool.begin()
+        for k in range(first, last + 1):
+            x = k * step_px
+            self.major.take(x, 0, x, h)
+            self.ticks.take(x, rh - 12, x, rh - 1)
+            self.labels.take(x + 2, 2, text=tick_label(round(k * step, 3), step))
+            sub_x = x + step_px / 2
+            if sub_x < width:
+                self.minor.take(sub_x, 0, sub_x, h)
+        used = sum(pool.end() for pool in (self.major, self.minor, self.ticks, self.labels))
+
+        # 确保网格在最底层，避免覆盖音频片段（修复“分离后音轨消失”）
+        self.timeline.tag_lower(self.tag)
+        return used
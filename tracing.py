@@ -0,0 +1,201 @@
+"""
+分阶段计时与资源跟踪
+分离的每个阶段（解码、重采样、归一化、推理、导出……）记录墙钟时间、CPU 时间与进程峰值内存：
+- 结构化 JSON 日志：每个阶段一行 JSON，可边运行边 tail
+- Chrome trace 格式导出：chrome://tracing 或 https://ui.perfetto.dev 打开
+- 一行摘要：界面状态栏 / 命令行输出
+未启用时 span() 返回共享的空对象，开销只有一次属性判断。
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 摘要中显示的阶段名
+STAGE_LABELS = {
+    "decode": "解码", "resample": "重采样", "normalize": "归一化", "inference": "推理",
+    "denormalize": "反归一化", "to_numpy": "转 numpy", "basic_split": "频段分离",
+    "cache_lookup": "查缓存", "cache_store": "写缓存", "export": "导出", "scan": "预扫描",
+}
+# 包含其他阶段的外层记录（单个文件、流式窗口），不参与逐阶段汇总
+ENVELOPE_STAGES = ("file", "window")
+
+
+def peak_rss():
+    """进程峰值常驻内存（字节）；不支持的平台返回 0"""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start", "t0", "c0")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        self.c0 = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.t0
+        # CPU 时间按进程统计（推理在 torch 的线程池里），并发的阶段会重复计入
+        cpu = time.process_time() - self.c0
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        thread = threading.current_thread()
+        self.tracer._record({"type": "span", "name": self.name, "ts": self.start, "wall": wall, "cpu": cpu,
+                             "rss": peak_rss(), "pid": os.getpid(), "tid": thread.ident,
+                             "thread": thread.name, "args": self.args})
+        return False
+
+    def set(self, **args):
+        """在阶段结束前补充参数（例如写出的字节数）"""
+        self.args.update(args)
+
+
+class Tracer:
+    """收集阶段记录；enable() 之前所有调用都是空操作"""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._lock = threading.Lock()
+        self._log = None
+        self.chrome_path = None
+
+    def enable(self, log_path=None, chrome_path=None):
+        """开始记录；给出 log_path 时每条记录追加为一行 JSON，chrome_path 在 close() 时写出"""
+        if log_path and self._log is None:
+            self._log = open(log_path, "a", encoding="utf-8")
+        self.chrome_path = chrome_path or self.chrome_path
+        self.enabled = True
+
+    def close(self):
+        """停止记录，关闭日志并写出 Chrome trace"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self.chrome_path:
+            export_chrome(self.events, self.chrome_path)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def span(self, name, **args):
+        """with TRACER.span("inference", path=...):  计时一个阶段"""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, args)
+
+    def counter(self, name, **values):
+        """记录一组计数器的当前值（如播放欠载次数）"""
+        if self.enabled:
+            self._record({"type": "counter", "name": name, "ts": time.time(), "pid": os.getpid(),
+                          "tid": threading.get_ident(), "args": values})
+
+    def _record(self, event):
+        with self._lock:
+            self.events.append(event)
+            if self._log is not None:
+                self._log.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._log.flush()
+
+    def mark(self):
+        """当前记录位置，配合 since() 取出某次分离期间的记录"""
+        return len(self.events)
+
+    def since(self, mark):
+        with self._lock:
+            return self.events[mark:]
+
+    def drain(self):
+        """取出并清空本进程的记录（工作进程随结果回传给主进程）"""
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+    def extend(self, events):
+        """并入其他进程的记录"""
+        for event in events:
+            self._record(event)
+
+
+def stage_totals(events):
+    """按阶段汇总：{name: {"wall", "cpu", "count"}}，按墙钟时间从大到小"""
+    totals = {}
+    for e in events:
+        if e["type"] != "span" or e["name"] in ENVELOPE_STAGES:
+            continue
+        t = totals.setdefault(e["name"], {"wall": 0.0, "cpu": 0.0, "count": 0})
+        t["wall"] += e["wall"]
+        t["cpu"] += e["cpu"]
+        t["count"] += 1
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1]["wall"]))
+
+
+def summary_line(events, top=4):
+    """一行摘要，例如：总计 12.3s · 推理 9.8s · 导出 1.1s · 解码 0.4s | CPU 35.2s | 峰值内存 1.21 GB"""
+    spans = [e for e in events if e["type"] == "span"]
+    if not spans:
+        return ""
+    totals = stage_totals(spans)
+    wall = max(e["ts"] + e["wall"] for e in spans) - min(e["ts"] for e in spans)
+    parts = [f"总计 {wall:.1f}s"] + [f"{STAGE_LABELS.get(name, name)} {t['wall']:.1f}s"
+                                     for name, t in list(totals.items())[:top]]
+    cpu = sum(t["cpu"] for t in totals.values())
+    rss = max(e["rss"] for e in spans)
+    line = " · ".join(parts) + f" | CPU {cpu:.1f}s"
+    return line + (f" | 峰值内存 {rss / 1024 ** 3:.2f} GB" if rss else "")
+
+
+def export_chrome(events, path):
+    """写成 Chrome trace 事件格式（阶段为完整事件 X，计数器为 C）"""
+    if not events:
+        return
+    t0 = min(e["ts"] for e in events)
+    trace = []
+    threads = {}
+    for e in events:
+        ts = (e["ts"] - t0) * 1e6
+        if e["type"] == "span":
+            threads[(e["pid"], e["tid"])] = e["thread"]
+            args = dict(e["args"], cpu_ms=round(e["cpu"] * 1e3, 3), peak_rss_mb=round(e["rss"] / 2 ** 20, 1))
+            trace.append({"name": e["name"], "cat": "stage", "ph": "X", "ts": ts, "dur": e["wall"] * 1e6,
+                          "pid": e["pid"], "tid": e["tid"], "args": args})
+        else:
+            trace.append({"name": e["name"], "ph": "C", "ts": ts, "pid": e["pid"], "args": e["args"]})
+    for (pid, tid), name in threads.items():
+        trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+# 进程内共享的跟踪器
+TRACER = Tracer()
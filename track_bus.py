@@ -0,0 +1,252 @@
+"""
+轨道总线：每条轨道一个通道条（增益 / 声像 / 静音 / 独奏），汇入带前视限幅器的主总线
+- 通道条增益在混音时乘到该轨道每个片段上（线性运算，等同于先按轨道求和再乘），不需要每轨一块缓冲
+- 参数变化按块平滑：本块从旧增益线性过渡到新增益，拖动推子不会出现咔嗒声
+- 主总线限幅器逐采样计算增益，全部是整块的向量运算，没有逐采样的 Python 循环：
+  所需增益 -> 前视窗口内的滑动最小值 -> 同长度的滑动平均（起音斜坡）-> 指数释放；
+  音频延迟前视长度，增益在峰值到来之前就已降到位，输出不超过 ceiling
+- 实时播放与离线导出共用同一套图：播放按块顺序 render()；导出用 snapshot() 的固定增益并行混音，
+  限幅器按顺序处理
+"""
+import math
+import threading
+
+import numpy as np
+from scipy.ndimage import minimum_filter1d
+
+LIMITER_LOOKAHEAD_MS = 5.0
+LIMITER_RELEASE_MS = 80.0
+LIMITER_CEILING = 10 ** (-0.3 / 20)  # -0.3 dBFS
+GAIN_RANGE_DB = (-60.0, 12.0)
+_RELEASE_CHUNK = 4096  # 释放包络分段计算，k 的负幂不会溢出
+
+
+def db_to_gain(db):
+    return 10.0 ** (db / 20.0)
+
+
+class ChannelStrip:
+    """一条轨道的通道条；界面线程改参数，混音线程每块读取一次"""
+
+    def __init__(self, name, gain_db=0.0, pan=0.0, mute=False, solo=False):
+        self.name = name
+        self.gain_db = gain_db
+        self.pan = pan      # -1（左）~ 1（右），立体声片段按平衡方式处理
+        self.mute = mute
+        self.solo = solo
+
+    def stereo_gain(self):
+        """(左, 右) 增益；居中时两声道都是通道增益"""
+        g = db_to_gain(self.gain_db)
+        pan = min(1.0, max(-1.0, self.pan))
+        return g * min(1.0, 1.0 - pan), g * min(1.0, 1.0 + pan)
+
+    def to_dict(self):
+        return {"gain_db": self.gain_db, "pan": self.pan, "mute": self.mute, "solo": self.solo}
+
+
+class LookaheadLimiter:
+    """前视峰值限幅器：process() 原地处理 (frames, 2) float32 块，输出比输入延迟 delay 帧"""
+
+    def __init__(self, sr, lookahead_ms=LIMITER_LOOKAHEAD_MS, release_ms=LIMITER_RELEASE_MS,
+                 ceiling=LIMITER_CEILING):
+        self.sample_rate = sr
+        self.ceiling = float(ceiling)
+        self.window = max(1, int(round(sr * lookahead_ms / 1000)))
+        self.delay = self.window - 1
+        k = math.exp(-1.0 / max(1.0, sr * release_ms / 1000))
+        j = np.arange(1, _RELEASE_CHUNK + 1, dtype=np.float64)
+        self._kpow = k ** j      # k^(j+1)
+        self._kinv = k ** -j     # k^-(j+1)
+        self._capacity = 0
+        self.reset()
+
+    def reset(self):
+        """清空延迟线与包络（定位 / 重新开始渲染时调用）"""
+        w = self.window
+        self._x_hist = np.zeros((self.delay, 2), dtype=np.float32)
+        self._req_hist = np.ones(w - 1, dtype=np.float32)
+        self._min_hist = np.ones(w - 1, dtype=np.float64)
+        self._release = 0.0   # 当前压低量 1 - 增益
+        self._idle = True     # 历史窗口内没有超过 ceiling 的帧、也没有在释放
+        self.reduction = 1.0  # 最近一块的最小增益（电平表用）
+
+    def _ensure(self, frames):
+        if frames <= self._capacity:
+            return
+        w = self.window
+        self._capacity = frames
+        self._x_ext = np.empty((frames + self.delay, 2), dtype=np.float32)
+        self._abs = np.empty((frames, 2), dtype=np.float32)
+        self._req_ext = np.empty(frames + w - 1, dtype=np.float32)
+        self._min_out = np.empty(frames + w - 1, dtype=np.float32)
+        self._min_ext = np.empty(frames + w - 1, dtype=np.float64)
+        self._csum = np.empty(frames + w, dtype=np.float64)
+        self._gain = np.empty(frames, dtype=np.float64)
+        self._gain32 = np.empty((frames, 1), dtype=np.float32)
+
+    def process(self, block):
+        n = len(block)
+        if not n:
+            return block
+        self._ensure(n)
+        w, d = self.window, self.delay
+        x = self._x_ext[:n + d]
+        x[:d] = self._x_hist
+        x[d:] = block
+        peak = self._abs[:n]
+        np.abs(block, out=peak)
+        if self._idle and float(peak.max()) <= self.ceiling:
+            # 常见情况：增益恒为 1，只走延迟线
+            block[:] = x[:n]
+            self._x_hist[:] = x[n:]
+            self.reduction = 1.0
+            return block
+
+        # 每帧所需增益：ceiling / max(|L|, |R|, ceiling)
+        req = self._req_ext[:n + w - 1]
+        req[:w - 1] = self._req_hist
+        np.maximum(peak[:, 0], peak[:, 1], out=req[w - 1:])
+        np.maximum(req[w - 1:], self.ceiling, out=req[w - 1:])
+        np.divide(self.ceiling, req[w - 1:], out=req[w - 1:])
+
+        # 前视窗口 [t - w + 1, t] 内的最小值，再做同长度的滑动平均：
+        # 平均值里的每一项都覆盖第 t - w + 1 帧，所以不会高于该帧所需的增益
+        mins = self._min_out[:n + w - 1]
+        minimum_filter1d(req, w, output=mins, origin=(w - 1) // 2)
+        ext = self._min_ext[:n + w - 1]
+        ext[:w - 1] = self._min_hist
+        ext[w - 1:] = mins[w - 1:]
+        csum = self._csum[:n + w]
+        csum[0] = 0.0
+        np.cumsum(ext, out=csum[1:])
+        gain = self._gain[:n]
+        np.subtract(csum[w:], csum[:n], out=gain)
+        gain *= 1.0 / w
+
+        # 指数释放：u[t] = max(1 - b[t], k * u[t-1])，展开为 k^t * 累积最大值
+        np.subtract(1.0, gain, out=gain)
+        u = self._release
+        for i in range(0, n, _RELEASE_CHUNK):
+            seg = gain[i:i + _RELEASE_CHUNK]
+            m = len(seg)
+            seg *= self._kinv[:m]
+            np.maximum.accumulate(seg, out=seg)
+            np.maximum(seg, u, out=seg)
+            seg *= self._kpow[:m]
+            u = float(seg[-1])
+        self._release = u if u > 1e-8 else 0.0  # 低于 float32 在 1 附近的分辨率，视为释放完毕
+        np.subtract(1.0, gain, out=gain)
+
+        # 延迟 d 帧后乘增益
+        g32 = self._gain32[:n]
+        g32[:, 0] = gain
+        np.multiply(x[:n], g32, out=block)
+
+        self._x_hist[:] = x[n:]
+        self._req_hist[:] = req[n:]
+        self._min_hist[:] = ext[n:]
+        self._idle = self._release == 0.0 and float(self._min_hist.min(initial=1.0)) == 1.0
+        self.reduction = float(gain.min())
+        return block
+
+
+class TrackBus:
+    """全部轨道的通道条 + 主总线限幅器"""
+
+    def __init__(self, names, sr=44100, block_frames=2048, limiter=True):
+        self.strips = [ChannelStrip(name) for name in names]
+        self.block_frames = block_frames
+        self.limit = limiter
+        self.limiter = None
+        self._current = [None] * len(self.strips)  # 上一块实际使用的 (左, 右) 增益
+        self._ramps = np.empty((len(self.strips), block_frames, 2), dtype=np.float32)
+        self._ramp_t = (np.arange(1, block_frames + 1, dtype=np.float32) / block_frames)[:, None]
+        self._prime = None
+        self._next_frame = None
+        self._lock = threading.Lock()
+        self.set_sample_rate(sr)
+
+    def set_sample_rate(self, sr):
+        if self.limiter is None or self.limiter.sample_rate != sr:
+            self.limiter = LookaheadLimiter(sr) if self.limit else None
+            self._prime = np.empty((self.delay, 2), dtype=np.float32)
+            self._next_frame = None
+
+    @property
+    def delay(self):
+        return self.limiter.delay if self.limiter is not None else 0
+
+    def _targets(self):
+        soloed = any(s.solo for s in self.strips)
+        return [None if s.mute or (soloed and not s.solo) else s.stereo_gain() for s in self.strips]
+
+    def static_gains(self):
+        """不平滑的当前增益（离线导出用）；静音 / 未独奏的轨道为 None"""
+        return [None if t is None else np.array(t, dtype=np.float32) for t in self._targets()]
+
+    def block_gains(self, frames):
+        """本块每条轨道的增益：None（不发声）、(2,) 常数，或参数刚变化时 (frames, 2) 的线性过渡"""
+        gains = []
+        for i, target in enumerate(self._targets()):
+            current = self._current[i]
+            self._current[i] = target
+            if target is None and current is None:
+                gains.append(None)
+                continue
+            target = target or (0.0, 0.0)
+            if current is None:
+                current = (0.0, 0.0)
+            if current == target or frames > self.block_frames:
+                gains.append(np.array(target, dtype=np.float32))
+                continue
+            ramp = self._ramps[i, :frames]
+            t = self._ramp_t[:frames] if frames == self.block_frames else \
+                (np.arange(1, frames + 1, dtype=np.float32) / frames)[:, None]
+            for ch in range(2):
+                np.multiply(t[:, 0], target[ch] - current[ch], out=ramp[:, ch])
+                ramp[:, ch] += current[ch]
+            gains.append(ramp)
+        return gains
+
+    def reset(self):
+        """定位后调用：下一块重新预热限幅器，增益直接跳到目标值"""
+        with self._lock:
+            self._next_frame = None
+            self._current = self._targets()
+
+    def render(self, mixer, clips, frame, out):
+        """实时播放：把时间轴 [frame, frame + len(out)) 经通道条与主总线写入 out。
+        按顺序调用时限幅器状态连续；frame 跳变时先用前视长度的音频预热，输出仍与 frame 对齐"""
+        with self._lock:
+            d = self.delay
+            if frame != self._next_frame:
+                self._current = self._targets()
+                if self.limiter is not None:
+                    self.limiter.reset()
+                    if d:
+                        mixer.mix(clips, frame, d, out=self._prime, gains=self.static_gains())
+                        self.limiter.process(self._prime)
+            mixer.mix(clips, frame + d, len(out), out=out, gains=self.block_gains(len(out)))
+            if self.limiter is not None:
+                self.limiter.process(out)
+            self._next_frame = frame + len(out)
+        return out
+
+    def snapshot(self):
+        """离线导出用的副本：同样的通道条参数，独立的限幅器状态"""
+        bus = TrackBus([s.name for s in self.strips], self.limiter.sample_rate if self.limiter else 44100,
+                       self.block_frames, self.limit)
+        for mine, theirs in zip(bus.strips, self.strips):
+            mine.__dict__.update(theirs.__dict__)
+        return bus
+
+    def settings(self):
+        return [s.to_dict() for s in self.strips]
+
+    def apply_settings(self, settings):
+        for strip, item in zip(self.strips, settings or ()):
+            strip.gain_db = float(item.get("gain_db", 0.0))
+            strip.pan = float(item.get("pan", 0.0))
+            strip.mute = bool(item.get("mute", False))
+            strip.solo = bool(item.get("solo", False))
@@ -0,0 +1,68 @@
+"""
+界面更新调度器
+工作线程（播放、分离、导出）不再各自 root.after(0, ...)，而是按键 post() 最新的更新；
+界面线程按显示刷新率每帧取出一次，同一个键只执行最后一次 —— 过时的更新直接丢弃，
+Tk 事件队列里不会堆积回调，界面不会落后于音频。每帧处理更新的耗时记为 UI 帧时间。
+只适合“只关心最新值”的更新（播放头、时钟、进度）；一次性事件仍用 root.after。
+"""
+import threading
+import time
+
+UI_FPS = 60
+
+
+class UIScheduler:
+    """按帧合并的界面更新；post() 可在任意线程调用，回调总在界面线程执行"""
+
+    def __init__(self, root, fps=UI_FPS):
+        self.root = root
+        self.interval_ms = max(1, int(round(1000 / fps)))
+        self._pending = {}  # 键 -> (回调, 参数)，保持首次提交的顺序
+        self._lock = threading.Lock()
+        self._job = None
+        self.frames = 0          # 执行过更新的帧数
+        self.frame_ms = 0.0      # UI 帧时间（指数滑动平均）
+        self.frame_max_ms = 0.0
+        self.dropped = 0         # 被同键的新更新覆盖、没有执行的更新数
+
+    def start(self):
+        if self._job is None:
+            self._job = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def post(self, key, fn, *args):
+        with self._lock:
+            if key in self._pending:
+                self.dropped += 1
+            self._pending[key] = (fn, args)
+
+    def discard(self, key):
+        """丢弃尚未执行的更新（界面线程直接设置了更新的值时调用）"""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _tick(self):
+        # 先排下一帧，节拍不受本帧耗时影响
+        self._job = self.root.after(self.interval_ms, self._tick)
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+        start = time.perf_counter()
+        for fn, args in pending.values():
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"⚠ 界面更新失败: {e}")
+        ms = (time.perf_counter() - start) * 1e3
+        self.frames += 1
+        self.frame_ms = ms if self.frames == 1 else self.frame_ms * 0.9 + ms * 0.1
+        self.frame_max_ms = max(self.frame_max_ms, ms)
+
+    def stats(self):
+        return {"frames": self.frames, "frame_ms": self.frame_ms, "frame_max_ms": self.frame_max_ms,
+                "dropped": self.dropped}
@@ -0,0 +1,200 @@
+"""
+波形峰值金字塔
+第 0 层每 BASE_FRAMES 帧记录一组 min / max / RMS，往上每层把 FACTOR 个桶合并为一个。
+绘制时按“每像素帧数”选取不粗于它的最粗一层，只处理与像素数同量级的桶，
+与音频长度和缩放级别无关；不会像直接抽样那样混叠或漏掉瞬态。
+金字塔以 <音频文件>.peaks.npz 缓存在分轨旁，按文件大小与修改时间校验。
+"""
+import os
+
+import numpy as np
+
+BASE_FRAMES = 256
+FACTOR = 4
+PEAKS_SUFFIX = ".peaks.npz"
+_BUILD_BINS = 4096  # 建立时每次处理的桶数，内存只与它有关
+
+
+def peaks_path(audio_path):
+    return audio_path + PEAKS_SUFFIX
+
+
+def _as_2d(block):
+    block = np.asarray(block, dtype=np.float32)
+    return block[:, None] if block.ndim == 1 else block
+
+
+def _reduce_level(level, factor):
+    """把下一层每 factor 个桶合并为一个"""
+    mins, maxs, rms = level
+    idx = np.arange(0, len(mins), factor)
+    counts = np.diff(np.append(idx, len(mins)))[:, None]
+    return (np.minimum.reduceat(mins, idx, axis=0),
+            np.maximum.reduceat(maxs, idx, axis=0),
+            np.sqrt(np.add.reduceat(rms.astype(np.float64) ** 2, idx, axis=0) / counts).astype(np.float32))
+
+
+class PeakBuilder:
+    """增量建立第 0 层：可逐块喂入（解码中的音频），随时生成当前的金字塔"""
+
+    def __init__(self, channels, base=BASE_FRAMES):
+        self.channels = channels
+        self.base = base
+        self.frames = 0
+        self._parts = []
+        self._tail = np.zeros((0, channels), dtype=np.float32)
+
+    def feed(self, block):
+        block = _as_2d(block)
+        self.frames += len(block)
+        if len(self._tail):
+            block = np.concatenate([self._tail, block])
+        whole = len(block) // self.base * self.base
+        if whole:
+            # 先转为按声道连续，再在最内层轴上归约（比在交错布局上归约快一个数量级）
+            bins = np.ascontiguousarray(block[:whole].T).reshape(block.shape[1], -1, self.base)
+            self._parts.append((bins.min(axis=2).T, bins.max(axis=2).T,
+                                np.sqrt(np.einsum("cij,cij->ci", bins, bins) / self.base).T))
+        self._tail = block[whole:].copy()
+
+    def _level0(self):
+        if len(self._parts) > 1:
+            # 合并已完成的部分，下次只需拼接新增的桶
+            self._parts = [tuple(np.concatenate(a) for a in zip(*self._parts))]
+        parts = list(self._parts)
+        if len(self._tail):
+            t = self._tail
+            parts.append((t.min(axis=0, keepdims=True), t.max(axis=0, keepdims=True),
+                          np.sqrt(np.mean(t * t, axis=0, keepdims=True))))
+        if not parts:
+            empty = np.zeros((0, self.channels), dtype=np.float32)
+            return empty, empty, empty
+        return tuple(np.concatenate(a) for a in zip(*parts))
+
+    def pyramid(self, sr=None):
+        return PeakPyramid.from_level0(self._level0(), self.frames, sr, self.base)
+
+
+class PeakPyramid:
+    """多分辨率 min / max / RMS；levels[k] 的每个桶覆盖 base * FACTOR**k 帧"""
+
+    def __init__(self, levels, frames, sr=None, base=BASE_FRAMES, factor=FACTOR):
+        self.levels = levels
+        self.frames = frames
+        self.sample_rate = sr
+        self.base = base
+        self.factor = factor
+        top = levels[-1]
+        self.peak = float(max(np.abs(top[0]).max(initial=0.0), np.abs(top[1]).max(initial=0.0)))
+
+    @classmethod
+    def from_level0(cls, level0, frames, sr=None, base=BASE_FRAMES, factor=FACTOR):
+        levels = [level0]
+        while len(levels[-1][0]) > 1:
+            levels.append(_reduce_level(levels[-1], factor))
+        return cls(levels, frames, sr, base, factor)
+
+    @classmethod
+    def build(cls, audio, sr=None, base=BASE_FRAMES):
+        """分块扫描音频（ndarray / 内存映射 / PagedAudio 均可），向量化计算"""
+        builder = PeakBuilder(audio.shape[1] if len(audio.shape) > 1 else 1, base)
+        step = base * _BUILD_BINS
+        for start in range(0, len(audio), step):
+            builder.feed(audio[start:start + step])
+        return builder.pyramid(sr)
+
+    @property
+    def channels(self):
+        return self.levels[0][0].shape[1]
+
+    def bin_frames(self, level):
+        return self.base * self.factor ** level
+
+    def level_for(self, frames_per_pixel):
+        """不粗于每像素帧数的最粗一层"""
+        level = 0
+        while level + 1 < len(self.levels) and self.bin_frames(level + 1) <= frames_per_pixel:
+            level += 1
+        return level
+
+    def envelope(self, start, stop, columns):
+        """把 [start, stop) 帧映射到 columns 列，返回每列的 (min, max, rms)，形状 (columns, channels)"""
+        columns = max(1, int(columns))
+        level = self.level_for((stop - start) / columns)
+        mins, maxs, rms = self.levels[level]
+        out = np.zeros((3, columns, self.channels), dtype=np.float32)
+        if not len(mins):
+            return out[0], out[1], out[2]
+
+        edges = (start + np.arange(columns + 1) * ((stop - start) / columns)) // self.bin_frames(level)
+        edges = edges.astype(np.int64)
+        valid = (edges[:-1] < len(mins)) & (edges[1:] > 0)
+        if not valid.any():
+            return out[0], out[1], out[2]
+        lo = np.clip(edges[:-1][valid], 0, len(mins) - 1)
+        hi = min(len(mins), max(int(edges[-1]), int(lo[-1]) + 1))
+        # 相邻列的桶区间首尾相接，一次 reduceat 即可完成所有列
+        out[0][valid] = np.minimum.reduceat(mins[:hi], lo, axis=0)
+        out[1][valid] = np.maximum.reduceat(maxs[:hi], lo, axis=0)
+        counts = np.maximum(np.diff(np.append(lo, hi)), 1)[:, None]
+        out[2][valid] = np.sqrt(np.add.reduceat(rms[:hi].astype(np.float64) ** 2, lo, axis=0) / counts)
+        return out[0], out[1], out[2]
+
+    # --- 磁盘缓存 ---
+    def save(self, path, source_path=None):
+        """原子写入；source_path 的大小与修改时间一并记录，用于失效判断"""
+        meta = np.array([self.frames, self.sample_rate or 0, self.base, self.factor, len(self.levels)], dtype=np.int64)
+        arrays = {"meta": meta, "source": np.array(_source_stamp(source_path), dtype=np.int64)}
+        for k, (mins, maxs, rms) in enumerate(self.levels):
+            arrays[f"min{k}"], arrays[f"max{k}"], arrays[f"rms{k}"] = mins, maxs, rms
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, source_path=None):
+        """读取缓存；源文件已变化或缓存损坏时返回 None"""
+        try:
+            with np.load(path) as z:
+                if source_path and tuple(z["source"]) != _source_stamp(source_path):
+                    return None
+                frames, sr, base, factor, count = (int(v) for v in z["meta"])
+                levels = [(z[f"min{k}"], z[f"max{k}"], z[f"rms{k}"]) for k in range(count)]
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(levels, frames, sr or None, base, factor)
+
+
+def _source_stamp(path):
+    if not path:
+        return (0, 0)
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def load_cached_peaks(source_path, frames):
+    """读取 source_path 旁仍然有效、帧数一致的峰值缓存，没有时返回 None"""
+    if not source_path:
+        return None
+    cached = PeakPyramid.load(peaks_path(source_path), source_path)
+    return cached if cached is not None and cached.frames == frames else None
+
+
+def save_peaks(pyramid, source_path):
+    """写到源文件旁；目录不可写时只保留在内存"""
+    try:
+        pyramid.save(peaks_path(source_path), source_path)
+    except OSError as e:
+        print(f"⚠ 无法写入波形峰值缓存: {e}")
+
+
+def load_or_build_peaks(audio, sr=None, source_path=None):
+    """有有效的磁盘缓存就直接读取，否则计算并写到源文件旁（目录不可写时只保留在内存）"""
+    cached = load_cached_peaks(source_path, len(audio))
+    if cached is not None:
+        return cached
+    pyramid = PeakPyramid.build(audio, sr)
+    if source_path:
+        save_peaks(pyramid, source_path)
+    return pyramid